@@ -0,0 +1,291 @@
+# Author: Eric Kow
+# License: CeCILL-B (French BSD3-like)
+
+"""
+Parsing large collections of documents, with checkpoints
+
+The documents (extraction fragments under a directory, or JSON
+documents, one per line, see `irit_rst_dt.predict.Document`) are read
+lazily, in a stable order, and handed out in batches to a pool of
+worker processes, which share the models of a `Predictor` loaded
+before they are forked. Only a few batches are out at any time, and
+the parses are written out as soon as they are back (in the order of
+the documents), so the memory we use does not depend on the number of
+documents.
+
+After each batch, we save how many documents are done and how much
+of the output is theirs in a checkpoint next to the output, so that
+an interrupted run can pick up where it was (see `run`). The
+checkpoint is removed once the run is complete.
+"""
+
+from __future__ import print_function
+from collections import deque
+from os import path as fp
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+
+from .predict import (Document, distinct_batch)
+from .util import (dead_workers, worker_count)
+
+_WORKER_STATE = {}
+"""Predictor for the pool workers (set before forking them, as in
+`irit_rst_dt.schedule`)"""
+
+FRAGMENT_EXT = '.features'
+"""Extension of the file that marks a complete fragment (see
+`irit_rst_dt.extract.has_fragment`)"""
+
+REPORT_EVERY = 10000
+"""Say how far we are every so many documents"""
+
+LIVENESS_CHECK = 10
+"""How often (in seconds) we check that the pool workers are still
+there while we wait for a batch"""
+
+
+def sources(path):
+    """Where to read each of the documents at a path, in a stable order
+
+    Parameters
+    ----------
+    path: filepath
+        Directory of fragments (searched recursively), file with one
+        JSON document per line, or '-' for the same on the standard
+        input
+
+    Returns
+    -------
+    sources: iterable of (string, string)
+        ('fragment', path prefix) or ('json', line)
+    """
+    if fp.isdir(path):
+        return _fragment_sources(path)
+    stream = sys.stdin if path == '-' else open(path)
+    return (('json', line) for line in stream if line.strip())
+
+
+def _fragment_sources(root):
+    "fragments under a directory (walked in order)"
+    for dirpath, dirnames, fnames in os.walk(root, followlinks=True):
+        dirnames.sort()
+        for fname in sorted(fnames):
+            if fname.endswith(FRAGMENT_EXT):
+                yield ('fragment',
+                       fp.join(dirpath, fname[:-len(FRAGMENT_EXT)]))
+
+
+def _document(source):
+    "read a document"
+    kind, what = source
+    if kind == 'fragment':
+        return Document.from_fragment(what)
+    return Document.from_json(json.loads(what))
+
+
+def _record(source, doc, parse=None, error=None):
+    "output record for a document"
+    res = {'name': doc.name if doc is not None else None}
+    if source[0] == 'fragment':
+        res['fragment'] = source[1]
+    if error is None:
+        res['edges'] = parse
+    else:
+        res['error'] = error
+    return res
+
+
+def parse_batch(predictor, batch):
+    """Parse a batch of documents, one output record for each (a
+    document we cannot read or parse gets an error instead of its
+    edges)
+
+    Parameters
+    ----------
+    batch: [(string, string)]
+        Sources of the documents (see `sources`)
+
+    Returns
+    -------
+    records: [dict]
+    """
+    docs = []
+    records = [None] * len(batch)
+    for i, source in enumerate(batch):
+        try:
+            docs.append((i, _document(source)))
+        except Exception as oops:  # pylint: disable=broad-except
+            records[i] = _record(source, None, error=str(oops))
+    while docs:
+        # (documents with the same name go in different batches)
+        idxs = distinct_batch([d for _, d in docs], len(docs))
+        todo = [docs[j] for j in idxs]
+        taken = frozenset(idxs)
+        docs = [x for j, x in enumerate(docs) if j not in taken]
+        try:
+            parses = predictor.parse([d for _, d in todo])
+        except Exception:  # pylint: disable=broad-except
+            # one bad document: parse them one at a time to find it
+            parses = None
+        for k, (i, doc) in enumerate(todo):
+            if parses is not None:
+                records[i] = _record(batch[i], doc, parse=parses[k])
+                continue
+            try:
+                records[i] = _record(batch[i], doc,
+                                     parse=predictor.parse([doc])[0])
+            except Exception as oops:  # pylint: disable=broad-except
+                records[i] = _record(batch[i], doc, error=str(oops))
+    return records
+
+
+def _parse_worker_batch(batch):
+    "parse a batch in a pool worker"
+    return parse_batch(_WORKER_STATE['predictor'], batch)
+
+
+class Checkpoint(object):
+    """How far a run has got: the number of documents done, and the
+    size of the output for them
+
+    Parameters
+    ----------
+    path: filepath
+    """
+    def __init__(self, path):
+        self.path = path
+        self.done = 0
+        self.offset = 0
+        if fp.exists(path):
+            with open(path) as stream:
+                saved = json.load(stream)
+            self.done = saved['done']
+            self.offset = saved['offset']
+
+    def save(self, done, offset):
+        "save the progress (atomically)"
+        self.done = done
+        self.offset = offset
+        tmp_path = '{}.{}'.format(self.path, os.getpid())
+        with open(tmp_path, 'w') as stream:
+            json.dump({'done': done, 'offset': offset}, stream)
+        os.rename(tmp_path, self.path)
+
+    def remove(self):
+        "forget the progress (once the run is complete)"
+        if fp.exists(self.path):
+            os.remove(self.path)
+
+
+def checkpoint_path(output):
+    "where we save the progress of a run writing to some output"
+    return output + '.checkpoint'
+
+
+def _batches(items, size):
+    "consecutive lists of (at most) so many items"
+    items = iter(items)
+    while True:
+        batch = list(itertools.islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _pool_size(n_jobs):
+    "number of worker processes (0 for none)"
+    if n_jobs == 0:
+        return 0
+    return worker_count(n_jobs)
+
+
+def _wait(result, pids):
+    "records of a batch out in the pool, as long as no worker dies"
+    while True:
+        try:
+            return result.get(timeout=LIVENESS_CHECK)
+        except multiprocessing.TimeoutError:
+            dead = dead_workers(pids)
+            if dead:
+                sys.exit('Worker process(es) {} died while parsing a '
+                         'batch'.format(', '.join(str(p) for p in dead)))
+
+
+def run(predictor, srcs, output, batch_size=64, n_jobs=-1, resume=False,
+        verbose=True):
+    """Parse documents into an output file (one JSON record per line)
+
+    Parameters
+    ----------
+    srcs: iterable of (string, string)
+        Sources of the documents (see `sources`), in the same order
+        if we resume
+    output: filepath
+    batch_size: int
+        Number of documents in a batch
+    n_jobs: int
+        Number of worker processes (-1 for one per CPU, 0 for none)
+    resume: boolean
+        Carry on from the checkpoint of an interrupted run (otherwise,
+        or if the run was complete, start again)
+
+    Returns
+    -------
+    done: int
+        Number of documents parsed (over all runs)
+    """
+    ckpt = Checkpoint(checkpoint_path(output))
+    if not (resume and fp.exists(output)):
+        ckpt.save(0, 0)
+    srcs = itertools.islice(srcs, ckpt.done, None)
+    n_pool = _pool_size(n_jobs)
+    pool = None
+    if n_pool:
+        _WORKER_STATE.update(predictor=predictor)
+        pool = multiprocessing.Pool(n_pool)
+        pids = frozenset(p.pid for p in multiprocessing.active_children())
+    # at most a couple of batches per worker are out at any time
+    window = 2 * max(1, n_pool)
+    pending = deque()
+    done = ckpt.done
+    mode = 'r+b' if ckpt.offset else 'wb'
+    try:
+        with open(output, mode) as stream:
+            # drop whatever was written after the checkpoint
+            stream.seek(ckpt.offset)
+            stream.truncate()
+            batches = _batches(srcs, batch_size)
+            while True:
+                while len(pending) < window:
+                    batch = next(batches, None)
+                    if batch is None:
+                        break
+                    pending.append(
+                        pool.apply_async(_parse_worker_batch, (batch,))
+                        if pool is not None
+                        else parse_batch(predictor, batch))
+                if not pending:
+                    break
+                records = pending.popleft()
+                if pool is not None:
+                    records = _wait(records, pids)
+                for rec in records:
+                    stream.write((json.dumps(rec) + '\n').encode('utf-8'))
+                stream.flush()
+                done += len(records)
+                ckpt.save(done, stream.tell())
+                if verbose and\
+                        done // REPORT_EVERY > (done - len(records)) //\
+                        REPORT_EVERY:
+                    print('parsed {} documents'.format(done),
+                          file=sys.stderr)
+        ckpt.remove()
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+            _WORKER_STATE.clear()
+    return done
@@ -1,20 +1,73 @@
 """
 irit-rst-dt subcommands
+
+Subcommands are only imported when they are run (some of them need
+attelo, scikit-learn, etc. which take a while to load), so the
+names and one-line descriptions are listed here as well as in the
+subcommand modules.
 """
 
 # Author: Eric Kow
 # License: CeCILL-B (French BSD3)
 
-from . import (clean,
-               evaluate,
-               gather,
-               preview)
+import argparse
+import importlib
+import sys
 
 
 SUBCOMMANDS =\
     [
-        gather,
-        evaluate,
-        clean,
-        preview,
+        ('gather', 'gather features'),
+        ('prune', 'drop rare features from the gathered data'),
+        ('evaluate', 'run an experiment'),
+        ('clean', 'remove scratch dirs, evals with no scores'),
+        ('preview', 'show what evaluations we would run'),
+        ('profile', 'summarise where an evaluation spends its time '
+         'and memory'),
+        ('summary', 'show the scores of an evaluation so far'),
+        ('benchmark', 'time our configurations on synthetic data'),
+        ('tune', 'search learner hyperparameters by successive halving'),
+        ('serve', 'parse documents over HTTP with the combined models '
+         'of a configuration'),
+        ('parse', 'parse a collection of documents with the combined '
+         'models of a configuration'),
     ]
+"""Name and description of each subcommand (the name is also that
+of its module)"""
+
+
+def load_subcommand(name):
+    """Import the module for a subcommand
+    """
+    return importlib.import_module('.' + name, __name__)
+
+
+def mk_argparser(argv):
+    """Argument parser for the harness.
+
+    Only the subcommand named in the arguments (if any) is imported
+    and fully configured; the others just have their help line.
+    """
+    arg_parser = \
+        argparse.ArgumentParser(description='IRIT RST-DT harness')
+    subparsers = arg_parser.add_subparsers(help='sub-command help')
+    names = [n for n, _ in SUBCOMMANDS]
+    wanted = next((a for a in argv if a in names), None)
+    for name, description in SUBCOMMANDS:
+        subparser = subparsers.add_parser(name, help=description)
+        if name == wanted:
+            load_subcommand(name).config_argparser(subparser)
+    arg_parser.add_argument('--verbose', '-v',
+                            action='count',
+                            default=0)
+    return arg_parser
+
+
+def main(argv=None):
+    "harness main (subcommands are likely more interesting)"
+    argv = sys.argv[1:] if argv is None else argv
+    args = mk_argparser(argv).parse_args(argv)
+    if not hasattr(args, 'func'):
+        mk_argparser(argv).print_help()
+        sys.exit(1)
+    args.func(args)
@@ -0,0 +1,150 @@
+# Author: Eric Kow
+# License: CeCILL-B (French BSD3-like)
+
+"""time our configurations on synthetic data
+"""
+
+from __future__ import print_function
+from collections import defaultdict
+from os import path as fp
+import json
+import shutil
+import sys
+import tempfile
+
+from ..local import (EVALUATIONS)
+from ..synthetic import (MEAN_EDUS, N_FEATURES, NNZ, synthetic_mpack)
+from ..trace import (read_trace, stage, start_trace, stop_trace)
+
+NAME = 'benchmark'
+
+TEST_RATIO = 5
+"""One document in this many is used for testing"""
+
+
+def config_argparser(psr):
+    """
+    Subcommand flags.
+
+    You should create and pass in the subparser to which the flags
+    are to be added.
+    """
+    psr.add_argument("--scale", metavar='N', type=int, nargs='+',
+                     default=[20, 80],
+                     help="numbers of documents to generate "
+                     "(default: %(default)s)")
+    psr.add_argument("--mean-edus", metavar='N', type=int,
+                     default=MEAN_EDUS,
+                     help="average number of EDUs per document "
+                     "(default: %(default)s)")
+    psr.add_argument("--features", metavar='N', type=int,
+                     default=N_FEATURES,
+                     help="size of the feature space "
+                     "(default: %(default)s)")
+    psr.add_argument("--nnz", metavar='N', type=int,
+                     default=NNZ,
+                     help="average number of features per pair of EDUs "
+                     "(default: %(default)s)")
+    psr.add_argument("--seed", type=int, default=0,
+                     help="random seed for the synthetic data")
+    psr.add_argument("--config", metavar='STRING', nargs='+',
+                     help="only the configurations whose key contains "
+                     "one of these")
+    psr.add_argument("--output", metavar='FILE',
+                     help="append the timings to this file (one JSON "
+                     "record per configuration and scale)")
+    psr.set_defaults(func=main)
+
+
+def _split(mpack):
+    "training and test documents"
+    docs = sorted(mpack)
+    test = docs[::TEST_RATIO]
+    train = [d for d in docs if d not in frozenset(test)]
+    return ([mpack[d] for d in train], [mpack[d] for d in test])
+
+
+def _run(econf, train, test):
+    """Fit and run a configuration on synthetic documents, within
+    the current trace"""
+    parser = econf.parser.payload
+    with stage('fit', docs=len(train)):
+        parser.fit(train, [d.target for d in train], cache=None)
+    with stage('parse', docs=len(test)):
+        for dpack in test:
+            parser.transform(dpack)
+
+
+def _timings(records):
+    """Time spent fitting, predicting and decoding, from the trace of
+    `_run` (the learners and decoders of our configurations record
+    their own stages, see `irit_rst_dt.config.common`)"""
+    wall = defaultdict(float)
+    for rec in records:
+        wall[rec['stage']] += rec['wall']
+    return {'fit': wall['fit'],
+            'attach fit': wall['attach fit'],
+            'label fit': wall['label fit'],
+            'predict': wall['parse'] - wall['decode'],
+            'decode': wall['decode'],
+            'peak_rss_mb': max(r['peak_rss_mb'] for r in records)}
+
+
+def _benchmark(econf, n_docs, train, test, tmp_dir):
+    "timings record for a configuration at a given scale"
+    trace_file = fp.join(tmp_dir, '{}-{}.jsonl'.format(n_docs, econf.key))
+    start_trace(trace_file)
+    try:
+        _run(econf, train, test)
+    finally:
+        stop_trace()
+    record = _timings(read_trace(trace_file))
+    record.update(config=econf.key,
+                  docs=n_docs,
+                  pairs=sum(d.data.shape[0] for d in train + test))
+    return record
+
+
+def main(args):
+    """
+    Subcommand main.
+
+    You shouldn't need to call this yourself if you're using
+    `config_argparser`
+    """
+    econfs = EVALUATIONS.filter(lambda e: (args.config is None or
+                                          any(k in e.key
+                                              for k in args.config)))
+    if not econfs:
+        sys.exit("No configuration matches " + ", ".join(args.config))
+    tmp_dir = tempfile.mkdtemp(prefix='irit-rst-dt-benchmark-')
+    line = '{:<60} {:>6} {:>8} {:>8} {:>8} {:>8} {:>9}'
+    print(line.format('', 'docs', 'fit', 'predict', 'decode', 'total',
+                      'peak (MB)'))
+    try:
+        for n_docs in args.scale:
+            mpack = synthetic_mpack(n_docs,
+                                    mean_edus=args.mean_edus,
+                                    n_features=args.features,
+                                    nnz=args.nnz,
+                                    seed=args.seed)
+            train, test = _split(mpack)
+            for econf in econfs:
+                rec = _benchmark(econf, n_docs, train, test, tmp_dir)
+                total = rec['fit'] + rec['predict'] + rec['decode']
+                print(line.format(econf.key[:60], n_docs,
+                                  '{:.2f}'.format(rec['fit']),
+                                  '{:.2f}'.format(rec['predict']),
+                                  '{:.2f}'.format(rec['decode']),
+                                  '{:.2f}'.format(total),
+                                  '{:.0f}'.format(rec['peak_rss_mb'])))
+                sys.stdout.flush()
+                if args.output is not None:
+                    rec.update(mean_edus=args.mean_edus,
+                               features=args.features,
+                               nnz=args.nnz,
+                               seed=args.seed)
+                    with open(args.output, 'a') as stream:
+                        print(json.dumps(rec, sort_keys=True), file=stream)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
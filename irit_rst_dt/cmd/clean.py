@@ -10,9 +10,8 @@ from os import path as fp
 import os
 import shutil
 
-from attelo.harness.util import subdirs
-
 from ..local import LOCAL_TMP
+from ..util import subdirs
 
 NAME = 'clean'
 
@@ -35,7 +34,7 @@ def main(_):
     `config_argparser`
     """
     for data_dir in sorted(subdirs(LOCAL_TMP)):
-        if fp.basename(data_dir) == "latest":
+        if fp.basename(data_dir) in ["latest", "cache"]:
             continue
         for subdir in subdirs(data_dir):
             bname = fp.basename(subdir)
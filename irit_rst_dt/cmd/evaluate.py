@@ -10,6 +10,7 @@ from __future__ import print_function
 from attelo.harness import (RuntimeConfig, ClusterStage)
 
 from ..harness import (IritHarness)
+from ..schedule import (submit_slurm)
 
 # pylint: disable=too-few-public-methods
 
@@ -40,9 +41,10 @@ def config_argparser(psr):
                           help="resume previous interrupted evaluation")
     mode_grp.add_argument("--jumpstart", action='store_true',
                           help="copy any model files over from last "
-                          "evaluation (useful if you just want to "
-                          "evaluate recent changes to the decoders "
-                          "without losing previous scores)")
+                          "evaluation (mostly obsolete: models are now "
+                          "shared by all evaluations on the same "
+                          "features, so a new evaluation only trains "
+                          "the learners it has not seen yet)")
 
     cluster_grp = psr.add_mutually_exclusive_group()
     cluster_grp.add_argument("--start", action='store_true',
@@ -56,6 +58,43 @@ def config_argparser(psr):
     cluster_grp.add_argument("--end", action='store_true',
                              default=False,
                              help="generate report only (cluster mode)")
+    cluster_grp.add_argument("--slurm", action='store_true',
+                             default=False,
+                             help="initialise an evaluation and submit its "
+                             "tasks to SLURM, as one job per task that "
+                             "waits for the jobs of its dependencies; "
+                             "prints the job ids (cluster mode)")
+    cluster_grp.add_argument("--task", metavar='KEY',
+                             help="run only this task of the task graph "
+                             "(cluster mode, see --slurm)")
+    psr.add_argument("--slurm-script", metavar='FILE',
+                     default='cluster/evaluate.script',
+                     help="script for the SLURM jobs "
+                     "(default: %(default)s)")
+
+
+def _member_args(args):
+    """Flags to pass on to the SLURM jobs of the tasks: those of this
+    command, except for the cluster mode ones (the others
+    cannot go with `--slurm` anyway)
+    """
+    res = ['--n-jobs', str(args.n_jobs)]
+    if args.resume:
+        res.append('--resume')
+    elif args.jumpstart:
+        res.append('--jumpstart')
+    return res
+
+
+def _slurm_backend(script, script_args):
+    """Submit the tasks to SLURM, and print the ids of the jobs
+    (one per task)
+    """
+    def _backend(_, __, ___, tasks):
+        "submit"
+        for job_id in submit_slurm(tasks, script, script_args):
+            print(job_id)
+    return _backend
 
 
 def main(args):
@@ -72,9 +111,9 @@ def main(args):
     else:
         mode = None
     # cluster stage from the CLI args
-    if args.start:
+    if args.start or args.slurm:
         stage = ClusterStage.start
-    elif args.folds is not None:
+    elif args.folds is not None or args.task is not None:
         stage = ClusterStage.main
     elif args.combined_models:
         stage = ClusterStage.combined_models
@@ -83,9 +122,15 @@ def main(args):
     else:
         stage = None
 
+    # how to run the evaluation tasks
+    if args.slurm:
+        backend = _slurm_backend(args.slurm_script, _member_args(args))
+    else:
+        backend = None
+
     runcfg = RuntimeConfig(mode=mode,
                            folds=args.folds,
                            stage=stage,
                            n_jobs=args.n_jobs)
     hconf = IritHarness()
-    hconf.run(runcfg)
+    hconf.run(runcfg, backend=backend, task=args.task)
@@ -11,11 +11,14 @@ import os
 
 from attelo.harness.util import call, force_symlink
 
+from ..extract import (extract_corpora)
 from ..local import (TEST_CORPUS,
                      TRAINING_CORPUS,
                      PTB_DIR,
                      FEATURE_SET,
+                     FEATURE_HASHING,
                      CORENLP_OUT_DIR,
+                     EXTRACT_CACHE,
                      LECSIE_DATA_DIR)
 from ..util import (current_tmp, latest_tmp)
 
@@ -30,12 +33,10 @@ def config_argparser(psr):
 
     Notes
     -----
-    Could we remove intermediary layers and indirections?
-    For example, this script is a wrapper around
-    `educe.rst_dt.learning.cmd.extract`.
-    This means we need to explicitly expose some (or all?) of the
-    arguments of the latter script in the current one.
-    This does not look like a good idea.
+    Feature extraction used to be a wrapper around the
+    `rst-dt-learning extract` command (`educe.rst_dt.learning.cmd.extract`);
+    it now calls the educe extraction code in-process, see
+    `irit_rst_dt.extract`.
     """
     psr.add_argument('--skip-training',
                      action='store_true',
@@ -46,22 +47,38 @@ def config_argparser(psr):
     psr.add_argument('--fix_pseudo_rels',
                         action='store_true',
                         help='fix pseudo-relation labels')
+    psr.add_argument('--refresh-cache',
+                     action='store_true',
+                     help='extract all documents again, ignoring the '
+                     'cache (eg. after changing the educe code)')
+    psr.add_argument("--n-jobs", type=int,
+                     default=-1,
+                     help="number of jobs (-1 for max [DEFAULT], "
+                     "2+ for parallel, "
+                     "1 for sequential but using parallel infrastructure, "
+                     "0 for fully sequential)")
     psr.set_defaults(func=main)
 
 
-def extract_features(corpus, output_dir, coarse, fix_pseudo_rels,
+def extract_features(corpora, output_dir, coarse, fix_pseudo_rels,
                      vocab_path=None,
-                     label_path=None):
-    """Extract instances from a corpus, store them in files.
+                     label_path=None,
+                     refresh=False,
+                     n_jobs=-1):
+    """Extract instances from corpora, store them in files.
+
+    Run feature extraction for a list of corpora and store the
+    results in the output directory. Output file names will be
+    computed from the corpus file names.
 
-    Run feature extraction for a particular corpus and store the
-    results in the output directory. Output file name will be
-    computed from the corpus file name.
+    All corpora are extracted at the same time; the vocabulary and
+    labels are taken from the first one (the training corpus), unless
+    given.
 
     Parameters
     ----------
-    corpus: filepath
-        Path to the corpus.
+    corpora: [filepath]
+        Paths to the corpora.
     output_dir: filepath
         Path to the output folder.
     coarse: boolean, False by default
@@ -70,44 +87,30 @@ def extract_features(corpus, output_dir, coarse, fix_pseudo_rels,
         Rewrite pseudo-relations to improve consistency (WIP).
     vocab_path: filepath
         Path to a fixed vocabulary mapping, for feature extraction
-        (needed if extracting test data: the same vocabulary should be
-        used in train and test).
+        (needed if extracting test data without the training data:
+        the same vocabulary should be used in train and test; not
+        used if we hash the features, see `FEATURE_HASHING`).
     label_path: filepath
         Path to a list of labels.
+    refresh: boolean, False by default
+        Extract every document, even those that have an up to date
+        entry in the extraction cache (see `EXTRACT_CACHE`).
+    n_jobs: int
+        Number of worker processes to spread the documents over
+        (same conventions as `irit-rst-dt evaluate --n-jobs`)
     """
-    # TODO: perhaps we could just directly invoke the appropriate
-    # educe module here instead of going through the command line?
-    cmd = [
-        "rst-dt-learning", "extract",
-        corpus,
-        PTB_DIR,  # TODO make this optional and exclusive from CoreNLP
-        output_dir,
-        '--feature_set', FEATURE_SET,
-    ]
-    # NEW 2016-05-19 rewrite pseudo-relations
-    if fix_pseudo_rels:
-        cmd.extend([
-            '--fix_pseudo_rels'
-        ])
-    # NEW 2016-05-03 use coarse- or fine-grained relation labels
-    # NB "coarse" was the previous default
-    if coarse:
-        cmd.extend([
-            '--coarse'
-        ])
-    if CORENLP_OUT_DIR is not None:
-        cmd.extend([
-            '--corenlp_out_dir', CORENLP_OUT_DIR,
-        ])
-    if LECSIE_DATA_DIR is not None:
-        cmd.extend([
-            '--lecsie_data_dir', LECSIE_DATA_DIR,
-        ])
-    if vocab_path is not None:
-        cmd.extend(['--vocabulary', vocab_path])
-    if label_path is not None:
-        cmd.extend(['--labels', label_path])
-    call(cmd)
+    # TODO make PTB_DIR optional and exclusive from CoreNLP
+    extract_corpora(corpora, output_dir, PTB_DIR, FEATURE_SET,
+                    corenlp_out_dir=CORENLP_OUT_DIR,
+                    lecsie_data_dir=LECSIE_DATA_DIR,
+                    coarse=coarse,
+                    fix_pseudo_rels=fix_pseudo_rels,
+                    vocab_path=vocab_path,
+                    label_path=label_path,
+                    cache_dir=EXTRACT_CACHE,
+                    refresh=refresh,
+                    n_features=FEATURE_HASHING,
+                    n_jobs=n_jobs)
 
 
 def main(args):
@@ -117,20 +120,26 @@ def main(args):
     You shouldn't need to call this yourself if you're using
     `config_argparser`
     """
+    corpora = []
+    vocab_path = None
+    label_path = None
     if args.skip_training:
         tdir = latest_tmp()
+        train_path = fp.join(tdir, fp.basename(TRAINING_CORPUS))
+        label_path = train_path + '.relations.sparse'
+        if FEATURE_HASHING is None:
+            vocab_path = label_path + '.vocab'
     else:
         tdir = current_tmp()
-        extract_features(TRAINING_CORPUS, tdir, args.coarse,
-                         args.fix_pseudo_rels)
+        corpora.append(TRAINING_CORPUS)
     if TEST_CORPUS is not None:
-        train_path = fp.join(tdir, fp.basename(TRAINING_CORPUS))
-        label_path = train_path + '.relations.sparse'
-        vocab_path = label_path + '.vocab'
-        extract_features(TEST_CORPUS, tdir, args.coarse,
-                         args.fix_pseudo_rels,
-                         vocab_path=vocab_path,
-                         label_path=label_path)
+        corpora.append(TEST_CORPUS)
+    extract_features(corpora, tdir, args.coarse,
+                     args.fix_pseudo_rels,
+                     vocab_path=vocab_path,
+                     label_path=label_path,
+                     refresh=args.refresh_cache,
+                     n_jobs=args.n_jobs)
     with open(os.path.join(tdir, "versions-gather.txt"), "w") as stream:
         call(["pip", "freeze"], stdout=stream)
     if not args.skip_training:
@@ -0,0 +1,77 @@
+# Author: Eric Kow
+# License: CeCILL-B (French BSD3-like)
+
+"""parse a collection of documents with the combined models of a
+configuration
+"""
+
+from __future__ import print_function
+from os import path as fp
+import sys
+
+NAME = 'parse'
+
+
+def config_argparser(psr):
+    """
+    Subcommand flags.
+
+    You should create and pass in the subparser to which the flags
+    are to be added.
+    """
+    psr.add_argument("config", metavar="KEY",
+                     help="configuration to parse with (its combined "
+                     "models must have been fitted by `evaluate`)")
+    psr.add_argument("input", metavar="INPUT",
+                     help="directory of extraction fragments, or file "
+                     "with one JSON document per line ('-' for the "
+                     "standard input)")
+    psr.add_argument("output", metavar="FILE",
+                     help="where to write the parses (one JSON record "
+                     "per document)")
+    psr.add_argument("--resume", action='store_true',
+                     help="carry on from where an interrupted run "
+                     "writing to the same output stopped (the input "
+                     "must be the same)")
+    psr.add_argument("--batch-size", metavar='N', type=int, default=64,
+                     help="documents per batch (default: %(default)s)")
+    psr.add_argument("--n-jobs", metavar='N', type=int, default=-1,
+                     help="number of worker processes (-1: one per "
+                     "CPU, 0: none; default: %(default)s)")
+    psr.set_defaults(func=main)
+
+
+def main(args):
+    """
+    Subcommand main.
+
+    You shouldn't need to call this yourself if you're using
+    `config_argparser`
+    """
+    from ..batch import (checkpoint_path, run, sources)
+    from ..harness import (IritHarness)
+    from ..predict import (Predictor)
+
+    if args.batch_size < 1:
+        sys.exit("--batch-size must be at least 1")
+    if args.input != '-' and not fp.exists(args.input):
+        sys.exit("No such file or directory: " + args.input)
+    # (the checkpoint goes once a run is complete, so a complete run
+    # can be overwritten)
+    if not args.resume and fp.exists(checkpoint_path(args.output)):
+        sys.exit("There is already an interrupted run writing to "
+                 "{}.\nPlease use --resume to carry on with it, or "
+                 "remove {} to start again".format(
+                     args.output, checkpoint_path(args.output)))
+    hconf = IritHarness()
+    hconf.load_latest()
+    predictor = Predictor(hconf, args.config)
+    try:
+        done = run(predictor, sources(args.input), args.output,
+                   batch_size=args.batch_size,
+                   n_jobs=args.n_jobs,
+                   resume=args.resume)
+    finally:
+        predictor.close()
+    print('parsed {} documents into {}'.format(done, args.output),
+          file=sys.stderr)
@@ -6,7 +6,12 @@
 
 from __future__ import print_function
 
-from ..harness import (IritHarness)
+from os import path as fp
+
+from ..local import (EVALUATIONS,
+                     TEST_CORPUS,
+                     TEST_EVALUATION_KEY,
+                     TRAINING_CORPUS)
 
 NAME = 'preview'
 
@@ -20,7 +25,8 @@ def config_argparser(psr):
     """
     psr.add_argument("--verbose",
                      default=False, action="store_true",
-                     help="print details for all evaluations")
+                     help="print details for all evaluations "
+                     "(this builds them, so it is slower)")
     psr.set_defaults(func=main)
 
 
@@ -31,19 +37,23 @@ def main(args):
     You shouldn't need to call this yourself if you're using
     `config_argparser`
     """
-    hconf = IritHarness()
+    # we only look at the declarations of the evaluations, unless we
+    # really want to see the details
+    keys = EVALUATIONS.keys()
     if args.verbose:
-        for econf in hconf.evaluations:
+        for econf in EVALUATIONS:
             print(econf)
             print()
     print("Evaluation configs")
     print("------------------")
-    print("\n".join(econf.key for econf in hconf.evaluations))
+    print("\n".join(keys))
     print()
-    print("TRAINING:", hconf.dataset)
-    tconf = "(not enabled)" if hconf.test_evaluation is None\
-        else "(config:{})".format(hconf.test_evaluation.key)
-    print("TEST:", hconf.testset, tconf)
+    print("TRAINING:", fp.basename(TRAINING_CORPUS))
+    testset = fp.basename(TEST_CORPUS) if TEST_CORPUS is not None else None
+    tconf = "(not enabled)"\
+        if testset is None or TEST_EVALUATION_KEY not in keys\
+        else "(config:{})".format(TEST_EVALUATION_KEY)
+    print("TEST:", testset, tconf)
     if not args.verbose:
         print()
         print("Use --verbose for more details")
@@ -0,0 +1,99 @@
+# Author: Eric Kow
+# License: CeCILL-B (French BSD3-like)
+
+"""summarise where an evaluation spends its time and memory
+"""
+
+from __future__ import print_function
+from collections import defaultdict
+from os import path as fp
+import sys
+
+from ..trace import (TRACE_FILE, read_trace)
+from ..util import (latest_tmp)
+
+NAME = 'profile'
+
+
+def config_argparser(psr):
+    """
+    Subcommand flags.
+
+    You should create and pass in the subparser to which the flags
+    are to be added.
+    """
+    psr.add_argument("trace", nargs='?',
+                     default=fp.join(latest_tmp(), 'eval-current',
+                                     TRACE_FILE),
+                     metavar="FILE",
+                     help="trace to summarise (default: that of the "
+                     "latest evaluation)")
+    psr.add_argument("--top", type=int, default=10,
+                     metavar="N",
+                     help="number of hot spots to show")
+    psr.set_defaults(func=main)
+
+
+def _summary(records, key):
+    """Group records by some key, and return a list of
+    (key, count, total wall, max wall, total cpu, peak memory
+    during a stage, see `irit_rst_dt.trace.stage`)
+    by decreasing total wall time"""
+    groups = defaultdict(list)
+    for rec in records:
+        groups[key(rec)].append(rec)
+    rows = [(k,
+             len(recs),
+             sum(r['wall'] for r in recs),
+             max(r['wall'] for r in recs),
+             sum(r['cpu'] for r in recs),
+             max(r['peak_rss_mb'] for r in recs))
+            for k, recs in groups.items()]
+    return sorted(rows, key=lambda x: -x[2])
+
+
+def _show(title, rows):
+    "print a summary table"
+    print(title)
+    print('-' * len(title))
+    print('{:<60} {:>6} {:>10} {:>10} {:>10} {:>10}'.format(
+        '', 'count', 'wall (s)', 'max (s)', 'cpu (s)', 'peak (MB)'))
+    for key, count, wall, max_wall, cpu, rss in rows:
+        print('{:<60} {:>6} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.0f}'.format(
+            key[:60], count, wall, max_wall, cpu, rss))
+    print()
+
+
+def main(args):
+    """
+    Subcommand main.
+
+    You shouldn't need to call this yourself if you're using
+    `config_argparser`
+    """
+    if not fp.exists(args.trace):
+        sys.exit("No trace in {} (is there an evaluation?)".format(
+            args.trace))
+    records = read_trace(args.trace)
+    if not records:
+        sys.exit("Empty trace: " + args.trace)
+    # task records contain the stages they run, so we separate them
+    # to avoid counting the same time twice in a table
+    tasks = [r for r in records if r['stage'].startswith('task:')]
+    stages = [r for r in records if not r['stage'].startswith('task:')]
+
+    _show('Stages', _summary(stages, lambda r: r['stage']))
+    _show('Tasks', _summary(tasks, lambda r: r['stage']))
+    hot = _summary(stages,
+                   lambda r: ' '.join([r['stage'],
+                                       r.get('config', '-'),
+                                       'fold:{}'.format(r.get('fold',
+                                                              '-'))]))
+    _show('Hot spots (stage, config, fold)', hot[:args.top])
+    _show('Folds', _summary(tasks,
+                            lambda r: 'fold:{}'.format(r.get('fold',
+                                                             '-'))))
+    start = min(r['start'] for r in records)
+    end = max(r['start'] + r['wall'] for r in records)
+    print('Elapsed: {:.1f}s over {} process(es)'.format(
+        end - start, len(frozenset(r['pid'] for r in records))))
@@ -0,0 +1,68 @@
+# Author: Eric Kow
+# License: CeCILL-B (French BSD3-like)
+
+"""drop rare features from the gathered data
+"""
+
+from __future__ import print_function
+from os import path as fp
+import sys
+
+from ..local import (PRUNE_MAX_FEATURES,
+                     PRUNE_MIN_DF,
+                     TEST_CORPUS,
+                     TRAINING_CORPUS)
+from ..util import (exit_ungathered, latest_tmp)
+
+NAME = 'prune'
+
+
+def config_argparser(psr):
+    """
+    Subcommand flags.
+
+    You should create and pass in the subparser to which the flags
+    are to be added.
+    """
+    psr.set_defaults(func=main)
+
+
+def main(_):
+    """
+    Subcommand main.
+
+    You shouldn't need to call this yourself if you're using
+    `config_argparser`
+    """
+    from educe.learning.vocabulary_format import load_vocabulary
+    from ..prune import (frequent_columns, pruned_path, rewrites,
+                         write_pruned)
+    from ..store import (has_store)
+
+    if not rewrites(PRUNE_MIN_DF):
+        if PRUNE_MAX_FEATURES is not None:
+            sys.exit("Nothing to do: PRUNE_MAX_FEATURES alone is applied "
+                     "to the training data of each fold, evaluate can "
+                     "use the gathered features as they are")
+        sys.exit("Nothing to do: set PRUNE_MIN_DF (above 1, and/or "
+                 "PRUNE_MAX_FEATURES) in local.py first")
+    min_df = PRUNE_MIN_DF
+    data_dir = latest_tmp()
+    corpora = [TRAINING_CORPUS]
+    if TEST_CORPUS is not None:
+        corpora.append(TEST_CORPUS)
+    core_paths = [fp.join(data_dir,
+                          fp.basename(c) + '.relations.sparse')
+                  for c in corpora]
+    if not all(has_store(p) for p in core_paths):
+        exit_ungathered()
+    # the columns are picked on the training corpus, and the test
+    # corpus (which shares its vocabulary) gets the same ones
+    n_features = len(load_vocabulary(core_paths[0] + '.vocab'))
+    columns = frequent_columns(core_paths[0], n_features, min_df)
+    print('keeping {} of {} features (in {}+ instances)'.format(
+        columns.sum(), n_features, min_df), file=sys.stderr)
+    for core_path in core_paths:
+        out_path = pruned_path(core_path, min_df)
+        print('writing', out_path, file=sys.stderr)
+        write_pruned(core_path, out_path, columns)
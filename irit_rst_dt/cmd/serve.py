@@ -0,0 +1,70 @@
+# Author: Eric Kow
+# License: CeCILL-B (French BSD3-like)
+
+"""parse documents over HTTP with the combined models of a
+configuration
+"""
+
+from __future__ import print_function
+import sys
+
+NAME = 'serve'
+
+
+def config_argparser(psr):
+    """
+    Subcommand flags.
+
+    You should create and pass in the subparser to which the flags
+    are to be added.
+    """
+    psr.add_argument("config", metavar="KEY",
+                     help="configuration to parse with (its combined "
+                     "models must have been fitted by `evaluate`)")
+    psr.add_argument("--host", default='127.0.0.1',
+                     help="address to listen on (default: %(default)s)")
+    psr.add_argument("--port", type=int, default=8000,
+                     help="port to listen on (default: %(default)s)")
+    psr.add_argument("--batch-size", metavar='N', type=int, default=16,
+                     help="most documents parsed at once "
+                     "(default: %(default)s)")
+    psr.add_argument("--batch-wait", metavar='MS', type=float, default=5.,
+                     help="how long to wait for more documents once a "
+                     "batch has its first one (default: %(default)s)")
+    psr.add_argument("--stats-every", metavar='N', type=int, default=1000,
+                     help="print latency statistics every N requests "
+                     "(0: only on exit; default: %(default)s)")
+    psr.set_defaults(func=main)
+
+
+def main(args):
+    """
+    Subcommand main.
+
+    You shouldn't need to call this yourself if you're using
+    `config_argparser`
+    """
+    from ..harness import (IritHarness)
+    from ..predict import (Predictor)
+    from ..server import (Batcher, ParseServer)
+
+    if args.batch_size < 1:
+        sys.exit("--batch-size must be at least 1")
+    hconf = IritHarness()
+    hconf.load_latest()
+    predictor = Predictor(hconf, args.config)
+    batcher = Batcher(predictor,
+                      batch_size=args.batch_size,
+                      batch_wait=args.batch_wait / 1000.)
+    server = ParseServer((args.host, args.port), batcher,
+                         stats_every=args.stats_every)
+    print('parsing with {} on http://{}:{}/parse'.format(
+        args.config, args.host, args.port), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        predictor.close()
+        print(server.stats.report(), file=sys.stderr)
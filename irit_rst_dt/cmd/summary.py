@@ -0,0 +1,43 @@
+# Author: Eric Kow
+# License: CeCILL-B (French BSD3-like)
+
+"""show the scores of an evaluation so far
+"""
+
+from __future__ import print_function
+from os import path as fp
+import sys
+
+from ..counts import (COUNTS_FILE, summarise)
+from ..util import (latest_tmp)
+
+NAME = 'summary'
+
+
+def config_argparser(psr):
+    """
+    Subcommand flags.
+
+    You should create and pass in the subparser to which the flags
+    are to be added.
+    """
+    psr.add_argument("eval_dir", nargs='?',
+                     default=fp.join(latest_tmp(), 'eval-current'),
+                     metavar="DIR",
+                     help="evaluation to summarise (default: the "
+                     "latest one)")
+    psr.set_defaults(func=main)
+
+
+def main(args):
+    """
+    Subcommand main.
+
+    You shouldn't need to call this yourself if you're using
+    `config_argparser`
+    """
+    if not fp.exists(fp.join(args.eval_dir, COUNTS_FILE)):
+        sys.exit("No count records in {} (is there an evaluation, "
+                 "and has it decoded anything yet?)".format(args.eval_dir))
+    summary = summarise(args.eval_dir)
+    print(summary.report())
@@ -0,0 +1,172 @@
+# Author: Eric Kow
+# License: CeCILL-B (French BSD3-like)
+
+"""search learner hyperparameters by successive halving
+"""
+
+from __future__ import print_function
+from os import path as fp
+import json
+import random
+import sys
+
+from ..local import (FIXED_FOLD_FILE,
+                     TUNABLE_LEARNERS,
+                     tuning_evaluation)
+from ..registry import (LearnerSpec, with_params)
+from ..util import (latest_tmp)
+
+NAME = 'tune'
+
+
+def config_argparser(psr):
+    """
+    Subcommand flags.
+
+    You should create and pass in the subparser to which the flags
+    are to be added.
+    """
+    psr.add_argument("learner", choices=sorted(TUNABLE_LEARNERS),
+                     help="learner whose hyperparameters we search")
+    psr.add_argument("--param", metavar=('NAME', 'VALUE'), nargs='+',
+                     action='append', default=[],
+                     help="a hyperparameter and the values to try for "
+                     "it (eg. --param C 0.1 1 10); repeat for a grid")
+    psr.add_argument("--eta", type=int, default=2,
+                     help="keep 1/eta of the configurations each round, "
+                     "and multiply the budget by eta (at least 2; "
+                     "default: %(default)s)")
+    psr.add_argument("--min-folds", metavar='N', type=int, default=1,
+                     help="folds used in the first round "
+                     "(default: %(default)s)")
+    psr.add_argument("--min-docs", metavar='FRACTION', type=float,
+                     default=0.25,
+                     help="fraction of the training documents used "
+                     "in the first round (default: %(default)s)")
+    psr.add_argument("--survivors", metavar='N', type=int, default=1,
+                     help="stop halving when this many are left "
+                     "(default: %(default)s)")
+    psr.add_argument("--margin", metavar='F1', type=float, default=0.01,
+                     help="also keep configurations this close to the "
+                     "cut, until the full budget (default: %(default)s)")
+    psr.add_argument("--labelled", action='store_true',
+                     help="score labelled edges (default: attachments)")
+    psr.add_argument("--n-jobs", metavar='N', type=int, default=-1,
+                     help="number of worker processes (-1: one per "
+                     "CPU, 0: none; default: %(default)s)")
+    psr.add_argument("--seed", type=int,
+                     help="make new folds with this random seed "
+                     "(default: the folds of the latest evaluation if "
+                     "there is one, else new folds with seed 0)")
+    psr.add_argument("--output", metavar='FILE',
+                     help="append the scores to this file (one JSON "
+                     "record per configuration and round)")
+    psr.set_defaults(func=main)
+
+
+def _grid(args):
+    "the hyperparameters to try, as learner declarations"
+    from ..tune import (param_grid, parse_value)
+    params = []
+    for param in args.param:
+        if len(param) < 2:
+            sys.exit('--param {}: no values to try'.format(param[0]))
+        params.append((param[0], [parse_value(v) for v in param[1:]]))
+    lspec = TUNABLE_LEARNERS[args.learner]
+    return [(p, LearnerSpec(attach=with_params(lspec.attach, **p),
+                            label=with_params(lspec.label, **p)))
+            for p in param_grid(params)]
+
+
+def _training_harness():
+    "a harness on the latest gathered data (pruned, if we prune)"
+    from ..harness import (IritHarness)
+    hconf = IritHarness()
+    hconf.load_gathered()
+    return hconf
+
+
+def _folds(mpack, seed):
+    """the fixed folds if there are some, else the folds of the latest
+    evaluation (unless we ask for a seed), else new folds: the same
+    on every run"""
+    from attelo.fold import (make_n_fold)
+    from attelo.io import (load_fold_dict)
+    if FIXED_FOLD_FILE is not None:
+        return load_fold_dict(FIXED_FOLD_FILE)
+    if seed is None and fp.exists(fp.join(latest_tmp(), 'eval-current')):
+        from ..harness import (IritHarness)
+        hconf = IritHarness()
+        hconf.load_latest()
+        if fp.exists(hconf.fold_file):
+            print('using the folds of the latest evaluation',
+                  file=sys.stderr)
+            return load_fold_dict(hconf.fold_file)
+    return make_n_fold(mpack, 10, random.Random(seed or 0))
+
+
+def _reporter(especs, output):
+    "print (and save) each round of the search"
+    params = dict((e.key, p) for p, e in especs)
+
+    def _report(rung):
+        "print a round"
+        print('\n{} fold(s), {:.0%} of the training documents'.format(
+            rung.folds, rung.fraction))
+        for key in sorted(rung.scores, key=lambda k: -rung.scores[k]):
+            print('{} {:.4f} {}'.format('*' if key in rung.kept else ' ',
+                                        rung.scores[key], key))
+        if output is None:
+            return
+        with open(output, 'a') as stream:
+            for key in sorted(rung.scores):
+                print(json.dumps({'key': key,
+                                  'params': params[key],
+                                  'folds': rung.folds,
+                                  'fraction': rung.fraction,
+                                  'f1': rung.scores[key],
+                                  'kept': key in rung.kept}),
+                      file=stream)
+    return _report
+
+
+def main(args):
+    """
+    Subcommand main.
+
+    You shouldn't need to call this yourself if you're using
+    `config_argparser`
+    """
+    from ..tune import (Tuner, successive_halving)
+
+    if args.eta < 2:
+        sys.exit("--eta must be at least 2 (we keep 1/eta of the "
+                 "configurations each round)")
+    if args.survivors < 1:
+        sys.exit("--survivors must be at least 1")
+    grid = _grid(args)
+    especs = [(p, tuning_evaluation(l)) for p, l in grid]
+    hconf = _training_harness()
+    mpack = hconf.load_multipack(False)
+    folds = _folds(mpack, args.seed)
+    tuner = Tuner([e for _, e in especs], mpack, folds,
+                  labelled=args.labelled,
+                  prepare=hconf.prune_training,
+                  n_jobs=args.n_jobs)
+    rungs = successive_halving(tuner,
+                               eta=args.eta,
+                               min_folds=args.min_folds,
+                               min_fraction=args.min_docs,
+                               survivors=args.survivors,
+                               margin=args.margin,
+                               report=_reporter(especs, args.output))
+    print('\nTo evaluate the survivors, add to _LOCAL_LEARNERS:')
+    params = dict((e.key, p) for p, e in especs)
+    lspec = TUNABLE_LEARNERS[args.learner]
+    for key in rungs[-1].kept:
+        kwargs = ''.join(', {}={!r}'.format(k, v)
+                         for k, v in sorted(params[key].items()))
+        print('    LearnerSpec(attach=with_params({}{}),\n'
+              '                label=with_params({}{})),'.format(
+                  lspec.attach.__name__, kwargs,
+                  lspec.label.__name__, kwargs))
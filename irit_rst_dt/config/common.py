@@ -1,114 +1,101 @@
 """Commonly used configuration options"""
 
-from collections import namedtuple
-import six
-# from attelo.decoding.astar import (AstarArgs,
-#                                    AstarDecoder,
-#                                    Heuristic,
-#                                    RfcConstraint)
-from attelo.decoding.baseline import (LastBaseline,
-                                      LocalBaseline)
-from attelo.harness.config import (EvaluationConfig,
-                                   LearnerConfig,
-                                   Keyed)
-from attelo.learning.oracle import (AttachOracle, LabelOracle)
-from attelo.parser.full import (JointPipeline,
-                                PostlabelPipeline)
-
-
-def combined_key(*variants):
-    """return a key from a list of objects that have a
-    `key` field each"""
-    return '-'.join(v if isinstance(v, six.string_types) else v.key
-                    for v in variants)
-
-
-Settings = namedtuple('Settings',
-                      ['key', 'intra', 'oracle', 'children'])
-"""
-Note that the existence of a `key` field means you can feed
-this into `combined_key` if you want
-
-The settings are used for config management only, for example,
-if we want to filter in/out configurations that involve an
-oracle.
-
-Parameters
-----------
-intra: bool
-    If this config uses intra/inter decoding
-
-oracle: bool
-    If parser should be considered oracle-based
-
-children: container(Settings)
-    Any nested settings (eg. if intra/inter, this would be the
-    the settings of the intra and inter decoders)
-"""
+# Note that we only import attelo where we build things, so that
+# declaring configurations (see `irit_rst_dt.registry`) stays cheap
+
+from functools import partial
+
+from ..registry import (JOINT_SETTINGS, POST_SETTINGS,
+                        LearnerSpec, KeyedSpec,
+                        core_settings, declared, pipeline_keys)
+from ..trace import (Traced)
 
 # ---------------------------------------------------------------------
 # oracles
 # ---------------------------------------------------------------------
 
 
+@declared('oracle')
 def attach_learner_oracle():
     "return a keyed instance of the oracle (virtual) learner"
+    from attelo.harness.config import (Keyed)
+    from attelo.learning.oracle import (AttachOracle)
     return Keyed('oracle', AttachOracle())
 
 
+@declared('oracle')
 def label_learner_oracle():
     "return a keyed instance of the oracle (virtual) learner"
+    from attelo.harness.config import (Keyed)
+    from attelo.learning.oracle import (LabelOracle)
     return Keyed('oracle', LabelOracle())
 
 
-ORACLE = LearnerConfig(attach=attach_learner_oracle(),
-                       label=label_learner_oracle())
+ORACLE = LearnerSpec(attach=attach_learner_oracle,
+                     label=label_learner_oracle)
 
 
 # WIP oracles tailored for inter-sentential parsing
+@declared('oracle')
 def attach_learner_oracle_inter():
     "return a keyed instance of the oracle (virtual) learner for inter"
+    from attelo.harness.config import (Keyed)
+    from attelo.learning.oracle import (AttachOracle)
     return Keyed('oracle', AttachOracle())
 
 
-ORACLE_INTER = LearnerConfig(attach=attach_learner_oracle_inter(),
-                             label=label_learner_oracle())
+ORACLE_INTER = LearnerSpec(attach=attach_learner_oracle_inter,
+                           label=label_learner_oracle)
 
 # ---------------------------------------------------------------------
 # baselines
 # ---------------------------------------------------------------------
 
 
+def _last_baseline():
+    "attach-to-last decoder"
+    from attelo.decoding.baseline import (LastBaseline)
+    return LastBaseline()
+
+
+def _local_baseline(threshold):
+    "local baseline decoder"
+    from attelo.decoding.baseline import (LocalBaseline)
+    return LocalBaseline(threshold, True)
+
+
 def decoder_last():
     "our instantiation of the attach-to-last decoder"
-    return Keyed('last', LastBaseline())
+    return KeyedSpec('last', _last_baseline)
 
 
 def decoder_local(threshold):
     "our instantiation of the local basline decoder"
-    return Keyed('local', LocalBaseline(threshold, True))
+    return KeyedSpec('local', partial(_local_baseline, threshold))
 
 # ---------------------------------------------------------------------
 # pipelines
 # ---------------------------------------------------------------------
 
 
-def _core_settings(key, klearner):
-    "settings for basic pipelines"
-    return Settings(key=key,
-                    intra=False,
-                    oracle='oracle' in klearner.key,
-                    children=None)
+def _traced_pipeline_args(klearner, kdecoder):
+    """learners and decoder for a pipeline, wrapped so that their
+    fitting and decoding show up in evaluation traces (see
+    `irit_rst_dt.trace`)"""
+    return {'learner_attach': Traced(klearner.attach.payload,
+                                     'fit', 'attach fit'),
+            'learner_label': Traced(klearner.label.payload,
+                                    'fit', 'label fit'),
+            'decoder': Traced(kdecoder.payload, 'transform', 'decode')}
 
 
 def mk_joint(klearner, kdecoder):
     "return a joint decoding parser config"
-    settings = _core_settings('AD.L-jnt', klearner)
-    parser_key = combined_key(settings, kdecoder)
-    key = combined_key(klearner, parser_key)
-    parser = JointPipeline(learner_attach=klearner.attach.payload,
-                           learner_label=klearner.label.payload,
-                           decoder=kdecoder.payload)
+    from attelo.harness.config import (EvaluationConfig, Keyed)
+    from ..scores import (JointPipeline)
+    settings = core_settings(JOINT_SETTINGS, klearner)
+    parser_key, key = pipeline_keys(settings, klearner, kdecoder)
+    parser = JointPipeline(**_traced_pipeline_args(klearner, kdecoder))
     return EvaluationConfig(key=key,
                             settings=settings,
                             learner=klearner,
@@ -117,12 +104,11 @@ def mk_joint(klearner, kdecoder):
 
 def mk_post(klearner, kdecoder):
     "return a post label parser"
-    settings = _core_settings('AD.L-pst', klearner)
-    parser_key = combined_key(settings, kdecoder)
-    key = combined_key(klearner, parser_key)
-    parser = PostlabelPipeline(learner_attach=klearner.attach.payload,
-                               learner_label=klearner.label.payload,
-                               decoder=kdecoder.payload)
+    from attelo.harness.config import (EvaluationConfig, Keyed)
+    from ..scores import (PostlabelPipeline)
+    settings = core_settings(POST_SETTINGS, klearner)
+    parser_key, key = pipeline_keys(settings, klearner, kdecoder)
+    parser = PostlabelPipeline(**_traced_pipeline_args(klearner, kdecoder))
     return EvaluationConfig(key=key,
                             settings=settings,
                             learner=klearner,
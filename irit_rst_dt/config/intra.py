@@ -2,7 +2,8 @@
 
 from attelo.harness.config import (EvaluationConfig,
                                    Keyed)
-from .common import (Settings, combined_key)
+from ..registry import (intra_keys, intra_settings, primary_member)
+from ..scores import (CachedParses)
 
 
 def combine_intra(econfs, kconf, primary='intra', verbose=False):
@@ -24,31 +25,23 @@ def combine_intra(econfs, kconf, primary='intra', verbose=False):
     econf : EvaluationConfig
         Evaluation configuration for the IntraInterParser.
     """
-    if primary == 'intra':
-        econf = econfs.intra
-    elif primary == 'inter':
-        econf = econfs.inter
-    else:
-        raise ValueError("'primary' should be one of intra/inter: " + primary)
+    econf = primary_member(econfs, primary)
 
     parsers = econfs.fmap(lambda e: e.parser.payload)
-    subsettings = econfs.fmap(lambda e: e.settings)
+    # configurations sharing an intra parser (models and decoder)
+    # share its parses of the sentences, see `irit_rst_dt.scores`
+    parsers = parsers._replace(intra=CachedParses(parsers.intra,
+                                                  ['attach', 'label']))
     learners = econfs.fmap(lambda e: e.learner)
-    settings = Settings(key=combined_key(kconf, econf.settings),
-                        intra=True,
-                        oracle=econf.settings.oracle,
-                        children=subsettings)
+    settings = intra_settings(kconf, econf.settings,
+                              econfs.fmap(lambda e: e.settings))
+    parser_key, key = intra_keys(kconf, econf.parser, learners)
     iiparser_type, sel_inter = kconf.payload
-    kparser = Keyed(combined_key(kconf, econf.parser),
+    kparser = Keyed(parser_key,
                     iiparser_type(parsers,
                                   sel_inter=sel_inter,
                                   verbose=verbose))
-    if learners.intra.key == learners.inter.key:
-        learner_key = learners.intra.key
-    else:
-        learner_key = '{}S_D{}'.format(learners.intra.key,
-                                       learners.inter.key)
-    return EvaluationConfig(key=combined_key(learner_key, kparser),
+    return EvaluationConfig(key=key,
                             settings=settings,
                             learner=learners,
                             parser=kparser)
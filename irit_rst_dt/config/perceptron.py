@@ -1,17 +1,13 @@
 """Configuration helpers for using perceptron based learners
 """
 
-# import numpy as np
-from sklearn import linear_model as sk
+# Note that we only import scikit-learn and attelo where we build
+# learners, so that declaring configurations stays cheap (see
+# `irit_rst_dt.registry`)
 
-from attelo.harness.config import (Keyed)
+import sys
 
-from attelo.learning.perceptron import (Perceptron,
-                                        PassiveAggressive,
-                                        StructuredPerceptron,
-                                        StructuredPassiveAggressive)
-from attelo.learning.local import (SklearnAttachClassifier,
-                                   SklearnLabelClassifier)
+from ..registry import (declared, hyperparameters)
 
 
 VERBOSE = 2  # verbosity level
@@ -34,39 +30,69 @@ STRUC_AVG = True  # NB: ibid
 STRUC_USE_PROB = False  # NB: ibid
 # parameter for structured passive-aggressive
 STRUC_C = 1.0  # was: np.inf
+# train the structured learners on this many shards of the documents
+# in parallel, mixing their weights after each epoch (see
+# irit_rst_dt.structured); None for attelo's serial learners. These
+# learners only have the "dtree" cost, and no STRUC_USE_PROB
+STRUC_SHARDS = None
+STRUC_N_JOBS = -1  # worker processes (-1: one per CPU, see README)
 
 # ---------------------------------------------------------------------
 # scikit
 # ---------------------------------------------------------------------
 
 
-def attach_learner_perc():
+@declared('perc', proba=False)
+def attach_learner_perc(**params):
     "return a keyed instance of perceptron learner"
-    learner = sk.Perceptron(n_iter=LOCAL_N_ITER,
-                            class_weight=LOCAL_CLASS_WEIGHT)
+    from attelo.harness.config import (Keyed)
+    from attelo.learning.local import (SklearnAttachClassifier)
+    from sklearn import linear_model as sk
+    learner = sk.Perceptron(**hyperparameters(
+        params,
+        n_iter=LOCAL_N_ITER,
+        class_weight=LOCAL_CLASS_WEIGHT))
     return Keyed('perc', SklearnAttachClassifier(learner))
 
 
-def label_learner_perc():
+@declared('perc', proba=False)
+def label_learner_perc(**params):
     "return a keyed instance of perceptron learner"
-    learner = sk.Perceptron(n_iter=LOCAL_N_ITER,
-                            class_weight=LOCAL_CLASS_WEIGHT)
+    from attelo.harness.config import (Keyed)
+    from attelo.learning.local import (SklearnLabelClassifier)
+    from sklearn import linear_model as sk
+    learner = sk.Perceptron(**hyperparameters(
+        params,
+        n_iter=LOCAL_N_ITER,
+        class_weight=LOCAL_CLASS_WEIGHT))
     return Keyed('perc', SklearnLabelClassifier(learner))
 
 
-def attach_learner_pa():
+@declared('pa', proba=False)
+def attach_learner_pa(**params):
     "return a keyed instance of passive aggressive learner"
-    learner = sk.PassiveAggressiveClassifier(C=LOCAL_C,
-                                             n_iter=LOCAL_N_ITER,
-                                             class_weight=LOCAL_CLASS_WEIGHT)
+    from attelo.harness.config import (Keyed)
+    from attelo.learning.local import (SklearnAttachClassifier)
+    from sklearn import linear_model as sk
+    learner = sk.PassiveAggressiveClassifier(**hyperparameters(
+        params,
+        C=LOCAL_C,
+        n_iter=LOCAL_N_ITER,
+        class_weight=LOCAL_CLASS_WEIGHT))
     return Keyed('pa', SklearnAttachClassifier(learner))
 
 
-def label_learner_pa():
+@declared('pa', proba=False)
+def label_learner_pa(**params):
     "return a keyed instance of passive aggressive learner"
-    learner = sk.PassiveAggressiveClassifier(C=LOCAL_C,
-                                             n_iter=LOCAL_N_ITER,
-                                             class_weight=LOCAL_CLASS_WEIGHT)
+    from attelo.harness.config import (Keyed)
+    from attelo.learning.local import (SklearnLabelClassifier)
+    from sklearn import linear_model as sk
+    learner = sk.PassiveAggressiveClassifier(**hyperparameters(
+        params,
+        C=LOCAL_C,
+        n_iter=LOCAL_N_ITER,
+        class_weight=LOCAL_CLASS_WEIGHT))
     return Keyed('pa', SklearnLabelClassifier(learner))
 
 
@@ -74,67 +100,125 @@ def label_learner_pa():
 # dp
 # ---------------------------------------------------------------------
 
-def attach_learner_dp_perc():
+@declared('dp-perc', proba=LOCAL_USE_PROB)
+def attach_learner_dp_perc(**params):
     "return a keyed instance of perceptron learner"
+    from attelo.harness.config import (Keyed)
+    from attelo.learning.local import (SklearnAttachClassifier)
+    from attelo.learning.perceptron import (Perceptron)
     return Keyed('dp-perc',
                  SklearnAttachClassifier(
-                     Perceptron(n_iter=LOCAL_N_ITER,
-                                verbose=VERBOSE,
-                                average=LOCAL_AVG,
-                                use_prob=LOCAL_USE_PROB)))
+                     Perceptron(**hyperparameters(
+                         params,
+                         n_iter=LOCAL_N_ITER,
+                         verbose=VERBOSE,
+                         average=LOCAL_AVG,
+                         use_prob=LOCAL_USE_PROB))))
 
 
-def label_learner_dp_perc():
+@declared('dp-perc', proba=LOCAL_USE_PROB)
+def label_learner_dp_perc(**params):
     "return a keyed instance of perceptron learner"
+    from attelo.harness.config import (Keyed)
+    from attelo.learning.local import (SklearnLabelClassifier)
+    from attelo.learning.perceptron import (Perceptron)
     return Keyed('dp-perc',
                  SklearnLabelClassifier(
-                     Perceptron(n_iter=LOCAL_N_ITER,
-                                verbose=VERBOSE,
-                                average=LOCAL_AVG,
-                                use_prob=LOCAL_USE_PROB)))
+                     Perceptron(**hyperparameters(
+                         params,
+                         n_iter=LOCAL_N_ITER,
+                         verbose=VERBOSE,
+                         average=LOCAL_AVG,
+                         use_prob=LOCAL_USE_PROB))))
 
 
-def attach_learner_dp_pa():
+@declared('dp-pa', proba=LOCAL_USE_PROB)
+def attach_learner_dp_pa(**params):
     "return a keyed instance of passive aggressive learner"
+    from attelo.harness.config import (Keyed)
+    from attelo.learning.local import (SklearnAttachClassifier)
+    from attelo.learning.perceptron import (PassiveAggressive)
     return Keyed('dp-pa',
                  SklearnAttachClassifier(
-                     PassiveAggressive(C=LOCAL_C,
-                                       n_iter=LOCAL_N_ITER,
-                                       verbose=VERBOSE,
-                                       average=LOCAL_AVG,
-                                       use_prob=LOCAL_USE_PROB)))
+                     PassiveAggressive(**hyperparameters(
+                         params,
+                         C=LOCAL_C,
+                         n_iter=LOCAL_N_ITER,
+                         verbose=VERBOSE,
+                         average=LOCAL_AVG,
+                         use_prob=LOCAL_USE_PROB))))
 
 
-def label_learner_dp_pa():
+@declared('dp-pa', proba=LOCAL_USE_PROB)
+def label_learner_dp_pa(**params):
     "return a keyed instance of passive aggressive learner"
+    from attelo.harness.config import (Keyed)
+    from attelo.learning.local import (SklearnLabelClassifier)
+    from attelo.learning.perceptron import (PassiveAggressive)
     return Keyed('dp-pa',
                  SklearnLabelClassifier(
-                     PassiveAggressive(C=LOCAL_C,
-                                       n_iter=LOCAL_N_ITER,
-                                       verbose=VERBOSE,
-                                       average=LOCAL_AVG,
-                                       use_prob=LOCAL_USE_PROB)))
-
-
-def attach_learner_dp_struct_perc(decoder):
+                     PassiveAggressive(**hyperparameters(
+                         params,
+                         C=LOCAL_C,
+                         n_iter=LOCAL_N_ITER,
+                         verbose=VERBOSE,
+                         average=LOCAL_AVG,
+                         use_prob=LOCAL_USE_PROB))))
+
+
+def _mixed_structured_learner(decoder, params, **defaults):
+    """structured learner trained on STRUC_SHARDS shards (refusing the
+    settings it does not have)"""
+    from ..structured import (MixedStructuredLearner)
+    if STRUC_COST != "dtree" or STRUC_USE_PROB:
+        sys.exit("The structured learners trained on STRUC_SHARDS "
+                 "shards only have the 'dtree' cost, without "
+                 "STRUC_USE_PROB.\nPlease set STRUC_SHARDS to None to "
+                 "use attelo's learners")
+    return MixedStructuredLearner(decoder, **hyperparameters(
+        params,
+        n_iter=STRUC_N_ITER,
+        verbose=VERBOSE,
+        average=STRUC_AVG,
+        n_shards=STRUC_SHARDS,
+        n_jobs=STRUC_N_JOBS,
+        **defaults))
+
+
+@declared('dp-struct-perc', proba=STRUC_USE_PROB)
+def attach_learner_dp_struct_perc(decoder, **params):
     "structured perceptron learning"
-    learner = StructuredPerceptron(decoder,
-                                   n_iter=STRUC_N_ITER,
-                                   verbose=VERBOSE,
-                                   cost=STRUC_COST,
-                                   average=STRUC_AVG,
-                                   use_prob=STRUC_USE_PROB)
+    from attelo.harness.config import (Keyed)
+    if STRUC_SHARDS is not None:
+        learner = _mixed_structured_learner(decoder, params)
+        return Keyed('dp-struct-perc', learner)
+    from attelo.learning.perceptron import (StructuredPerceptron)
+    learner = StructuredPerceptron(decoder, **hyperparameters(
+        params,
+        n_iter=STRUC_N_ITER,
+        verbose=VERBOSE,
+        cost=STRUC_COST,
+        average=STRUC_AVG,
+        use_prob=STRUC_USE_PROB))
     return Keyed('dp-struct-perc', learner)
 
 
-def attach_learner_dp_struct_pa(decoder):
+@declared('dp-struct-pa', proba=STRUC_USE_PROB)
+def attach_learner_dp_struct_pa(decoder, **params):
     "structured passive-aggressive learning"
-    learner = StructuredPassiveAggressive(decoder,
-                                          C=STRUC_C,
-                                          n_iter=STRUC_N_ITER,
-                                          verbose=VERBOSE,
-                                          loss=STRUC_LOSS,
-                                          cost=STRUC_COST,
-                                          average=STRUC_AVG,
-                                          use_prob=STRUC_USE_PROB)
+    from attelo.harness.config import (Keyed)
+    if STRUC_SHARDS is not None:
+        learner = _mixed_structured_learner(decoder, params, C=STRUC_C,
+                                            loss=STRUC_LOSS)
+        return Keyed('dp-struct-pa', learner)
+    from attelo.learning.perceptron import (StructuredPassiveAggressive)
+    learner = StructuredPassiveAggressive(decoder, **hyperparameters(
+        params,
+        C=STRUC_C,
+        n_iter=STRUC_N_ITER,
+        verbose=VERBOSE,
+        loss=STRUC_LOSS,
+        cost=STRUC_COST,
+        average=STRUC_AVG,
+        use_prob=STRUC_USE_PROB))
     return Keyed('dp-struct-pa', learner)
@@ -0,0 +1,219 @@
+# Author: Eric Kow
+# License: CeCILL-B (French BSD3-like)
+
+"""
+Streaming edge counts
+
+The fold reports only appear once a fold is done, and the
+cross-validation report once all of them are (and it reads every
+output file again). So as soon as a configuration is done decoding
+a fold, we also append a record of its edge counts to
+`counts.jsonl` in the evaluation directory (see `fold_record`).
+
+The `Summary` of these records (the micro-averaged scores of each
+configuration on the folds done so far) is saved next to them along
+with how far into the records it has read, so bringing it up to date
+(eg. with `irit-rst-dt summary` during an evaluation) only reads the
+new records. A later record for the same fold and configuration
+(eg. after `--resume`) replaces the earlier one.
+
+This module should only import lightweight modules.
+"""
+
+from __future__ import division, print_function
+from collections import namedtuple
+from os import path as fp
+import json
+import os
+
+COUNTS_FILE = 'counts.jsonl'
+"""Count records, in the evaluation directory"""
+
+SUMMARY_FILE = 'counts-summary.json'
+"""Summary of the count records (ditto)"""
+
+SUMMARY_REPORT = 'reports-summary.txt'
+"""Report on the summary, written at the end of an evaluation"""
+
+
+class EdgeCounts(namedtuple('EdgeCounts',
+                            ['correct', 'predicted', 'gold'])):
+    """Number of correct, predicted and gold edges"""
+    def __add__(self, other):
+        return EdgeCounts(*[x + y for x, y in zip(self, other)])
+
+    def __sub__(self, other):
+        return EdgeCounts(*[x - y for x, y in zip(self, other)])
+
+    @property
+    def precision(self):
+        "edge precision"
+        return self.correct / self.predicted if self.predicted else 0.
+
+    @property
+    def recall(self):
+        "edge recall"
+        return self.correct / self.gold if self.gold else 0.
+
+    @property
+    def f1(self):
+        "edge F1"
+        total = self.predicted + self.gold
+        return 2 * self.correct / total if total else 0.
+
+
+NO_EDGES = EdgeCounts(0, 0, 0)
+
+
+def fold_record(hconf, dconf, econf, fold):
+    """Count record for a configuration on a fold: its attachment
+    and labelled edge counts, read from its output file
+    """
+    from attelo.io import (load_predictions)
+    from attelo.table import (UNRELATED)
+    from .views import (select_testing)
+
+    subpack = select_testing(dconf.pack, dconf.folds, fold)
+    gold = set()
+    for dpack in subpack.values():
+        unrelated = dpack.label_number(UNRELATED)
+        gold.update((src.id, tgt.id, dpack.labels[lbl])
+                    for (src, tgt), lbl in zip(dpack.pairings,
+                                               dpack.target)
+                    if lbl != unrelated)
+    predicted = set(tuple(x) for x in
+                    load_predictions(hconf.decode_output_path(econf,
+                                                              fold))
+                    if x[2] != UNRELATED)
+    gold_attach = set((s, t) for s, t, _ in gold)
+    pred_attach = set((s, t) for s, t, _ in predicted)
+    return {'fold': fold,
+            'config': econf.key,
+            'docs': len(subpack),
+            'attach': list(EdgeCounts(len(gold_attach & pred_attach),
+                                      len(pred_attach),
+                                      len(gold_attach))),
+            'label': list(EdgeCounts(len(gold & predicted),
+                                     len(predicted),
+                                     len(gold)))}
+
+
+def append_record(eval_dir, record):
+    """Append a count record (in a single write, so that the records
+    of workers running at the same time do not get mixed up)
+    """
+    line = (json.dumps(record, sort_keys=True) + '\n').encode('utf-8')
+    fdesc = os.open(fp.join(eval_dir, COUNTS_FILE),
+                    os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fdesc, line)
+    finally:
+        os.close(fdesc)
+
+
+class Summary(object):
+    """Edge counts of each configuration, summed over the folds it is
+    done with
+
+    Parameters
+    ----------
+    offset: int
+        How far (in bytes) into the count records we have read
+    folds: dict(string, dict)
+        Latest record for each fold and configuration
+    totals: dict(string, dict(string, EdgeCounts))
+        Attachment and labelled counts of each configuration
+    """
+    def __init__(self, offset=0, folds=None, totals=None):
+        self.offset = offset
+        self.folds = folds or {}
+        self.totals = totals or {}
+
+    @classmethod
+    def load(cls, eval_dir):
+        "the saved summary of an evaluation (or an empty one)"
+        path = fp.join(eval_dir, SUMMARY_FILE)
+        if not fp.exists(path):
+            return cls()
+        with open(path) as stream:
+            saved = json.load(stream)
+        totals = dict((c, dict((k, EdgeCounts(*v)) for k, v in t.items()))
+                      for c, t in saved['totals'].items())
+        return cls(saved['offset'], saved['folds'], totals)
+
+    def save(self, eval_dir):
+        "save the summary (atomically)"
+        path = fp.join(eval_dir, SUMMARY_FILE)
+        tmp_path = '{}.{}'.format(path, os.getpid())
+        with open(tmp_path, 'w') as stream:
+            json.dump({'offset': self.offset,
+                       'folds': self.folds,
+                       'totals': self.totals}, stream)
+        os.rename(tmp_path, path)
+
+    def add(self, record):
+        "take a new record into account"
+        key = '{}:{}'.format(record['fold'], record['config'])
+        totals = self.totals.setdefault(
+            record['config'], {'attach': NO_EDGES, 'label': NO_EDGES})
+        old = self.folds.get(key)
+        for kind in ['attach', 'label']:
+            totals[kind] += EdgeCounts(*record[kind])
+            if old is not None:
+                totals[kind] -= EdgeCounts(*old[kind])
+        self.folds[key] = record
+
+    def update(self, eval_dir):
+        """Read the records appended since we last looked
+
+        Returns
+        -------
+        n_new: int
+            Number of new records
+        """
+        path = fp.join(eval_dir, COUNTS_FILE)
+        if not fp.exists(path):
+            return 0
+        n_new = 0
+        with open(path, 'rb') as stream:
+            stream.seek(self.offset)
+            for line in stream:
+                if not line.endswith(b'\n'):
+                    break  # still being written
+                self.add(json.loads(line.decode('utf-8')))
+                self.offset += len(line)
+                n_new += 1
+        return n_new
+
+    def n_folds(self, config):
+        "number of folds a configuration is done with"
+        return sum(1 for r in self.folds.values() if r['config'] == config)
+
+    def report(self):
+        "the summary as a table"
+        lines = ['{:<60} {:>5} {:>7} {:>7} {:>7} {:>7}'.format(
+            'config', 'folds', 'att P', 'att R', 'att F1', 'lbl F1')]
+        for config in sorted(self.totals,
+                             key=lambda c: -self.totals[c]['label'].f1):
+            attach = self.totals[config]['attach']
+            label = self.totals[config]['label']
+            lines.append('{:<60} {:>5} {:>7.4f} {:>7.4f} {:>7.4f} '
+                         '{:>7.4f}'.format(config[:60],
+                                           self.n_folds(config),
+                                           attach.precision,
+                                           attach.recall, attach.f1,
+                                           label.f1))
+        return '\n'.join(lines)
+
+
+def summarise(eval_dir):
+    """Bring the summary of an evaluation up to date (and save it)
+
+    Returns
+    -------
+    summary: Summary
+    """
+    summary = Summary.load(eval_dir)
+    if summary.update(eval_dir):
+        summary.save(eval_dir)
+    return summary
@@ -0,0 +1,211 @@
+# Author: Eric Kow
+# License: CeCILL-B (French BSD3-like)
+
+"""
+Vectorised Eisner decoder
+
+Eisner's algorithm is cubic in the number of EDUs, and on the longer
+documents it takes most of the decoding time (and of each epoch of
+the structured learners, which decode every training document). This
+is a drop-in replacement for `attelo.decoding.eisner.EisnerDecoder`
+(same options, same trees) that fills in the chart one span width at
+a time, taking the best split point of all the spans of that width
+with numpy rather than looping over them in Python.
+
+Ties between split points go to the leftmost one.
+"""
+
+from __future__ import print_function
+
+from attelo.decoding.eisner import (EisnerDecoder as AtteloEisnerDecoder)
+from attelo.decoding.util import (convert_prediction,
+                                  simple_candidates)
+from attelo.edu import (FAKE_ROOT_ID)
+import numpy as np
+
+# direction of a span in the chart: its head is on the left (and
+# its dependents to the right) or the other way round
+_LEFT = 0
+_RIGHT = 1
+
+# kinds of span in the chart (for backtracking)
+_COMPLETE = 0
+_INCOMPLETE = 1
+
+
+def _chart(scores):
+    """Fill in the Eisner chart for a score matrix (see `eisner`)
+
+    Returns
+    -------
+    complete, incomplete: array of float, shape (2, n, n)
+        Best score of the complete/incomplete spans `[s, t]` in each
+        direction (`_LEFT`: headed by `t`, `_RIGHT`: headed by `s`)
+    complete_split, incomplete_split: array of int, shape (2, n, n)
+        Split points of these spans
+    """
+    size = scores.shape[0]
+    complete = np.full((2, size, size), -np.inf)
+    incomplete = np.full((2, size, size), -np.inf)
+    complete_split = np.zeros((2, size, size), dtype=np.intp)
+    incomplete_split = np.zeros((2, size, size), dtype=np.intp)
+    diag = np.arange(size)
+    complete[:, diag, diag] = 0.
+    for width in range(1, size):
+        starts = np.arange(size - width)
+        ends = starts + width
+        rows = np.arange(len(starts))
+        # split points r in [s, t) of each span [s, t] of this width
+        splits = starts[:, np.newaxis] + np.arange(width)
+        col_s = starts[:, np.newaxis]
+        col_t = ends[:, np.newaxis]
+
+        # incomplete: [s, r] -> + <- [r + 1, t], plus the arc s-t
+        both = (complete[_RIGHT, col_s, splits] +
+                complete[_LEFT, splits + 1, col_t])
+        best = both.argmax(axis=1)
+        inside = both[rows, best]
+        incomplete[_LEFT, starts, ends] = inside + scores[ends, starts]
+        incomplete[_RIGHT, starts, ends] = inside + scores[starts, ends]
+        incomplete_split[:, starts, ends] = splits[rows, best]
+
+        # complete, headed by t: [s, r] <- + incomplete <- [r, t]
+        left = (complete[_LEFT, col_s, splits] +
+                incomplete[_LEFT, splits, col_t])
+        best = left.argmax(axis=1)
+        complete[_LEFT, starts, ends] = left[rows, best]
+        complete_split[_LEFT, starts, ends] = splits[rows, best]
+
+        # complete, headed by s: incomplete [s, r] -> + -> [r, t]
+        # with r in (s, t]
+        right = (incomplete[_RIGHT, col_s, splits + 1] +
+                 complete[_RIGHT, splits + 1, col_t])
+        best = right.argmax(axis=1)
+        complete[_RIGHT, starts, ends] = right[rows, best]
+        complete_split[_RIGHT, starts, ends] = splits[rows, best] + 1
+    return complete, incomplete, complete_split, incomplete_split
+
+
+def eisner(scores, unique_real_root=True):
+    """Best projective dependency tree for a matrix of arc scores.
+
+    Parameters
+    ----------
+    scores: array of float, shape (n, n)
+        `scores[h, d]` is the score of attaching `d` to `h`, or `-inf`
+        if we cannot; node 0 is the (fake) root, and nothing may be
+        attached to it
+    unique_real_root: boolean, optional
+        If True, the root has exactly one dependent
+
+    Returns
+    -------
+    heads: array of int, shape (n,)
+        Head of each node (-1 for the root)
+    """
+    size = scores.shape[0]
+    heads = np.full(size, -1, dtype=np.intp)
+    if size < 2:
+        return heads
+    complete, incomplete, complete_split, incomplete_split =\
+        _chart(scores)
+
+    last = size - 1
+    if unique_real_root:
+        # the root takes a single real EDU r, which heads everything
+        # else ([1, r] <- and -> [r, last])
+        reals = np.arange(1, size)
+        totals = (scores[0, reals] +
+                  complete[_LEFT, 1, reals] +
+                  complete[_RIGHT, reals, last])
+        head = reals[totals.argmax()]
+        heads[head] = 0
+        stack = [(_COMPLETE, _LEFT, 1, head),
+                 (_COMPLETE, _RIGHT, head, last)]
+    else:
+        stack = [(_COMPLETE, _RIGHT, 0, last)]
+
+    while stack:
+        kind, direction, start, end = stack.pop()
+        if start == end:
+            continue
+        if kind == _INCOMPLETE:
+            split = incomplete_split[direction, start, end]
+            if direction == _RIGHT:
+                heads[end] = start
+            else:
+                heads[start] = end
+            stack.append((_COMPLETE, _RIGHT, start, split))
+            stack.append((_COMPLETE, _LEFT, split + 1, end))
+        elif direction == _LEFT:
+            split = complete_split[_LEFT, start, end]
+            stack.append((_COMPLETE, _LEFT, start, split))
+            stack.append((_INCOMPLETE, _LEFT, split, end))
+        else:
+            split = complete_split[_RIGHT, start, end]
+            stack.append((_INCOMPLETE, _RIGHT, start, split))
+            stack.append((_COMPLETE, _RIGHT, split, end))
+    return heads
+
+
+def _score_matrix(dpack, use_prob):
+    """Arc scores and best labels of a (single document) datapack,
+    with the fake root as node 0 and the EDUs in document order
+
+    Returns
+    -------
+    ids: [string]
+        EDU id of each node
+    scores: array of float, shape (n, n)
+    labels: array of object, shape (n, n)
+    """
+    edus = sorted((e for e in dpack.edus if e.id != FAKE_ROOT_ID),
+                  key=lambda e: (e.start, e.end))
+    ids = [FAKE_ROOT_ID] + [e.id for e in edus]
+    index = dict((x, i) for i, x in enumerate(ids))
+    cands = simple_candidates(dpack)
+    srcs = np.array([index[c[0].id] for c in cands], dtype=np.intp)
+    tgts = np.array([index[c[1].id] for c in cands], dtype=np.intp)
+    weights = np.array([c[2] for c in cands], dtype=np.float64)
+    if use_prob:
+        with np.errstate(divide='ignore'):
+            weights = np.log(weights)
+    scores = np.full((len(ids), len(ids)), -np.inf)
+    labels = np.empty((len(ids), len(ids)), dtype=object)
+    if len(cands):
+        scores[srcs, tgts] = weights
+        labels[srcs, tgts] = [c[3] for c in cands]
+    scores[:, 0] = -np.inf
+    return ids, scores, labels
+
+
+class EisnerDecoder(AtteloEisnerDecoder):
+    """Vectorised `attelo.decoding.eisner.EisnerDecoder`
+
+    Parameters
+    ----------
+    unique_real_root: boolean, optional
+        If True, each output tree has a single real root (a unique
+        child of the fake root)
+    use_prob: boolean, optional
+        If True, the attachment scores are probabilities, which we
+        use in log space
+    """
+    def __init__(self, unique_real_root=True, use_prob=True):
+        super(EisnerDecoder, self).__init__(
+            unique_real_root=unique_real_root,
+            use_prob=use_prob)
+        self._unique_real_root = unique_real_root
+        self._use_prob = use_prob
+
+    def decode(self, dpack, nonfixed_pairs=None):
+        if nonfixed_pairs is not None:
+            # partially fixed trees (intra/inter parsing) are rare
+            # enough that we leave them to attelo
+            return super(EisnerDecoder, self).decode(
+                dpack, nonfixed_pairs=nonfixed_pairs)
+        ids, scores, labels = _score_matrix(dpack, self._use_prob)
+        heads = eisner(scores, unique_real_root=self._unique_real_root)
+        prediction = [(ids[h], ids[d], labels[h, d])
+                      for d, h in enumerate(heads) if h >= 0]
+        return convert_prediction(dpack, prediction)
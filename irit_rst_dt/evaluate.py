@@ -0,0 +1,160 @@
+# Author: Eric Kow
+# License: CeCILL-B (French BSD3-like)
+
+"""
+Cross-validation loop over the corpus
+
+This follows `attelo.harness.evaluate.evaluate_corpus` (and reuses
+its learning, decoding and reporting steps), but loads datapacks
+through the harness (`IritHarness.load_multipack`) so that we can
+use our own feature stores, and runs the evaluation as a graph of
+tasks (see `irit_rst_dt.schedule`) rather than fold by fold.
+
+The time and memory taken by each stage of the evaluation is traced
+to `trace.jsonl` in the evaluation directory (see `irit_rst_dt.trace`
+and the `profile` subcommand), and the edge counts of each
+configuration on each fold to `counts.jsonl` as soon as it is decoded
+(see `irit_rst_dt.counts` and the `summary` subcommand).
+"""
+
+from __future__ import print_function
+from os import path as fp
+import sys
+
+from attelo.harness import (ClusterStage)
+from attelo.harness.config import (DataConfig)
+from attelo.harness.report import (mk_global_report)
+from attelo.io import (load_fold_dict)
+
+from .counts import (SUMMARY_REPORT, summarise)
+from .schedule import (build_graph, run_local, run_sequential,
+                        slurm_task)
+from .trace import (TRACE_FILE, stage, start_trace)
+from .util import (worker_count)
+
+STRIPPED_TASKS = frozenset(['collect', 'report'])
+"""Kinds of task that only need the targets of the training data (see
+`irit_rst_dt.schedule.Task`)"""
+
+
+def _corpus_banner(hconf):
+    "Which corpus are we working on?"
+    return "\n".join(["==========" * 6,
+                      hconf.dataset,
+                      "==========" * 6])
+
+
+def _load_data(hconf, test_data=False, stripped=None):
+    """Load the (training or test) data for the current stage.
+
+    The stages that do not need features (starting, reporting) read
+    the stripped data if there is some, as does anything we tell to
+    (`stripped`).
+    """
+    if stripped is None:
+        stripped = hconf.runcfg.stage in [ClusterStage.start,
+                                          ClusterStage.end]
+    with stage('datapack load', test=test_data):
+        mpack = hconf.load_multipack(test_data, stripped=stripped)
+    if test_data:
+        return DataConfig(pack=mpack, folds=None)
+    if hconf.runcfg.stage in [None, ClusterStage.start] and\
+            not (hconf.runcfg.mode == 'resume' and
+                 fp.exists(hconf.fold_file)):
+        folds = hconf.create_folds(mpack)
+    else:
+        folds = load_fold_dict(hconf.fold_file)
+    return DataConfig(pack=mpack, folds=folds)
+
+
+def _graph(hconf, dconf, workers=1):
+    """The tasks to run for the cluster stage of the runtime
+    configuration (see `irit_rst_dt.schedule`)
+
+    The graph must be the same for all the stages of a cluster run,
+    so only local runs (where we know how many workers share the
+    tasks) say how many `workers` there are.
+    """
+    cstage = hconf.runcfg.stage
+    if cstage == ClusterStage.combined_models:
+        return build_graph(hconf, [], combined=True, workers=workers)
+    elif cstage == ClusterStage.main and hconf.runcfg.folds is not None:
+        return build_graph(hconf, hconf.runcfg.folds, combined=False,
+                           workers=workers)
+    else:
+        folds = sorted(frozenset(dconf.folds.values()))
+        return build_graph(hconf, folds, combined=True, workers=workers)
+
+
+def _run_one(hconf, key):
+    """Run a single task of the graph (in a SLURM job, see
+    `irit_rst_dt.schedule.submit_slurm`), loading only the data its
+    kind of task needs: the test data only to test, and the stripped
+    training data to put decoding shares together or report
+    """
+    folds = load_fold_dict(hconf.fold_file)
+    tasks = _graph(hconf, DataConfig(pack=None, folds=folds))
+    task = slurm_task(tasks, key)
+    dconf = _load_data(hconf, stripped=task.kind in STRIPPED_TASKS)
+    test_dconf = (_load_data(hconf, test_data=True)
+                  if task.kind == 'test' else None)
+    run_sequential(hconf, dconf, test_dconf, [task])
+
+
+def _write_summary(hconf):
+    """Write the summary of the count records (which only reads the
+    records we have not summarised yet)
+    """
+    summary = summarise(hconf.eval_dir)
+    with open(fp.join(hconf.eval_dir, SUMMARY_REPORT), 'w') as stream:
+        print(summary.report(), file=stream)
+
+
+def evaluate_corpus(hconf, backend=None, task=None):
+    """Run evaluation on a corpus (or the part of it corresponding
+    to the cluster stage of the runtime configuration)
+
+    Parameters
+    ----------
+    backend: function(hconf, dconf, test_dconf, tasks), optional
+        How to run the tasks of the evaluation (see
+        `irit_rst_dt.schedule`). Defaults to `run_local` with the
+        number of jobs from the runtime configuration. If a backend
+        is given for the start stage, it receives the tasks for the
+        whole evaluation (but no data), eg. to submit them to a
+        cluster.
+    task: string, optional
+        Key of the only task to run (main stage), eg. in the SLURM
+        job for that task
+    """
+    print(_corpus_banner(hconf), file=sys.stderr)
+    start_trace(fp.join(hconf.eval_dir, TRACE_FILE))
+    if task is not None:
+        _run_one(hconf, task)
+        return
+    # (not `stage`, which is what we trace the stages with)
+    cstage = hconf.runcfg.stage
+    dconf = _load_data(hconf)
+
+    if cstage == ClusterStage.start:
+        if backend is not None:
+            backend(hconf, None, None, _graph(hconf, dconf))
+        return
+
+    if cstage in [None, ClusterStage.main, ClusterStage.combined_models]:
+        workers = (worker_count(hconf.runcfg.n_jobs) if backend is None
+                   else 1)
+        tasks = _graph(hconf, dconf, workers=workers)
+        test_dconf = (_load_data(hconf, test_data=True)
+                      if any(t.kind == 'test' for t in tasks) else None)
+        if backend is None:
+            run_local(hconf, dconf, test_dconf, tasks,
+                      hconf.runcfg.n_jobs)
+        else:
+            backend(hconf, dconf, test_dconf, tasks)
+
+    if cstage in [None, ClusterStage.end]:
+        with stage('summary'):
+            _write_summary(hconf)
+        with stage('report'):
+            mk_global_report(hconf, dconf)
@@ -0,0 +1,596 @@
+# Author: Eric Kow
+# License: CeCILL-B (French BSD3-like)
+
+"""
+In-process feature extraction, spread over documents
+
+This replaces calls to `rst-dt-learning extract`, which handles
+every document of a corpus in sequence on a single core. Here each
+document is extracted separately (possibly in a pool of worker
+processes) into a fragment that records its instances by feature
+*name*. Fragments are then merged into the usual attelo input files
+(`relations.sparse`, `.pairings`, `.edu_input`, `.vocab`), fitting
+the vocabulary over the whole corpus as the educe command would, or
+hashing the feature names into a fixed number of columns (see
+`FeatureHasher`).
+"""
+
+from __future__ import print_function
+from collections import Counter
+from os import path as fp
+import argparse
+import hashlib
+import itertools
+import os
+import shutil
+import sys
+import zlib
+
+import joblib
+from joblib import (Parallel, delayed)
+import six
+
+from .store import (CsrWriter)
+
+MIN_DF = 5
+"""Minimum number of instances a feature must occur in to make it
+into the vocabulary (same threshold as `rst-dt-learning extract`)"""
+
+SPLIT_FEAT_SPACE = 'dir_sent'
+"""How educe splits the feature space (same as
+`rst-dt-learning extract`)"""
+
+# ---------------------------------------------------------------------
+# per-document extraction (worker side)
+# ---------------------------------------------------------------------
+
+_READERS = {}
+"""Corpus and syntax readers, per worker process"""
+
+
+def _instance_generator(doc):
+    "EDU pairs to extract features for"
+    return doc.all_edu_pairs()
+
+
+def _get_readers(corpus, ptb_dir, corenlp_out_dir,
+                 coarse, fix_pseudo_rels):
+    """Return (and cache within the current process) the readers
+    needed to load documents from this corpus
+    """
+    key = (corpus, ptb_dir, corenlp_out_dir, coarse, fix_pseudo_rels)
+    if key not in _READERS:
+        from educe.rst_dt.corpus import RstDtParser
+        from educe.rst_dt.ptb import PtbParser
+        # no document filters: the equivalent of not passing any of
+        # the educe corpus filtering flags
+        filters = argparse.Namespace(doc=None, subdoc=None,
+                                     annotator=None, stage=None)
+        rst_reader = RstDtParser(corpus, filters,
+                                 coarse_rels=coarse,
+                                 fix_pseudo_rels=fix_pseudo_rels,
+                                 exclude_file_docs=(corenlp_out_dir
+                                                    is not None))
+        ptb_parser = PtbParser(ptb_dir)
+        if corenlp_out_dir is not None:
+            from educe.rst_dt.corenlp import CoreNlpParser
+            corenlp_parser = CoreNlpParser(corenlp_out_dir)
+        else:
+            corenlp_parser = None
+        _READERS[key] = (rst_reader, ptb_parser, corenlp_parser)
+    return _READERS[key]
+
+
+def list_documents(corpus, ptb_dir, corenlp_out_dir, coarse,
+                   fix_pseudo_rels):
+    """Return the documents of a corpus, in a stable order
+    """
+    rst_reader, _, _ = _get_readers(corpus, ptb_dir, corenlp_out_dir,
+                                    coarse, fix_pseudo_rels)
+    return sorted(rst_reader.corpus)
+
+
+def _open_plus(doc_key, readers):
+    """Open and fully load a document (as `rst-dt-learning extract`
+    would)
+    """
+    rst_reader, ptb_parser, corenlp_parser = readers
+    doc = rst_reader.decode(doc_key)
+    doc = ptb_parser.tokenize(doc)
+    doc = ptb_parser.parse(doc)
+    if corenlp_parser is not None:
+        doc = corenlp_parser.tokenize(doc)
+        doc = corenlp_parser.parse(doc)
+    doc = rst_reader.segment(doc)
+    doc = rst_reader.parse(doc)
+    doc = doc.align_with_doc_structure()
+    # aligning with trees first enables proper sentence segmentation
+    doc = doc.align_with_trees()
+    doc = doc.align_with_tokens()
+    # fallback tokenization if there is no PTB gold or silver
+    doc = doc.align_with_raw_words()
+    return doc
+
+
+def fragment_path(frag_dir, doc_key):
+    """Path prefix for the fragment of a given document.
+
+    The fragment consists of `<prefix>.features` (rows and targets
+    by name), `<prefix>.edu_input` and `<prefix>.pairings`.
+    """
+    return fp.join(frag_dir, doc_key.doc)
+
+
+def has_fragment(frag_prefix):
+    "True if a complete fragment exists at this path prefix"
+    return fp.exists(frag_prefix + '.features')
+
+
+def extract_document(doc_key, frag_prefix, corpus, ptb_dir, feature_set,
+                     corenlp_out_dir=None, lecsie_data_dir=None,
+                     coarse=False, fix_pseudo_rels=False):
+    """Extract the instances of a single document into a fragment.
+
+    Parameters
+    ----------
+    doc_key: educe.corpus.FileId
+        Document to extract.
+    frag_prefix: filepath
+        Path prefix for the fragment files (see `fragment_path`).
+    corpus: filepath
+        Path to the corpus the document belongs to.
+    ptb_dir: filepath
+        Path to the Penn Treebank.
+    feature_set: string
+        Feature set, one of 'dev', 'eyk', 'li2014'.
+    corenlp_out_dir: filepath, optional
+        Path to the CoreNLP parses.
+    lecsie_data_dir: filepath, optional
+        Path to the LECSIE features.
+    coarse: boolean, False by default
+        Use coarse-grained relation labels.
+    fix_pseudo_rels: boolean, False by default
+        Rewrite pseudo-relations to improve consistency (WIP).
+    """
+    from educe.learning.edu_input_format import (dump_edu_input_file,
+                                                 dump_pairings_file)
+    from educe.rst_dt.learning.doc_vectorizer import (
+        DocumentCountVectorizer, DocumentLabelExtractor)
+
+    readers = _get_readers(corpus, ptb_dir, corenlp_out_dir,
+                           coarse, fix_pseudo_rels)
+    doc = _open_plus(doc_key, readers)
+    # keep every feature: the vocabulary is fitted over the corpus
+    # when fragments get merged
+    vzer = DocumentCountVectorizer(_instance_generator,
+                                   feature_set,
+                                   lecsie_data_dir=lecsie_data_dir,
+                                   min_df=1,
+                                   split_feat_space=SPLIT_FEAT_SPACE)
+    x_gen = vzer.fit_transform([doc])
+    feat_names = dict((j, f) for f, j in vzer.vocabulary_.items())
+    rows = [[(feat_names[j], v) for j, v in x] for x in x_gen]
+
+    labtor = DocumentLabelExtractor(_instance_generator)
+    labtor.fit([doc])
+    lbl_names = dict((i, l) for l, i in labtor.labelset_.items())
+    targets = [lbl_names[y] for y in labtor.transform([doc])]
+
+    frag_dir = fp.dirname(frag_prefix)
+    if not fp.exists(frag_dir):
+        os.makedirs(frag_dir)
+    dump_edu_input_file([doc], frag_prefix + '.edu_input')
+    dump_pairings_file([_instance_generator(doc)],
+                       frag_prefix + '.pairings')
+    # features last: their presence marks a complete fragment
+    tmp_path = frag_prefix + '.features.tmp'
+    joblib.dump({'rows': rows,
+                 'targets': targets,
+                 'labelset': labtor.labelset_},
+                tmp_path)
+    os.rename(tmp_path, frag_prefix + '.features')
+
+
+# ---------------------------------------------------------------------
+# merging (parent side)
+# ---------------------------------------------------------------------
+
+
+def _load_fragment(frag_prefix):
+    "Read back the features part of a fragment"
+    return joblib.load(frag_prefix + '.features')
+
+
+def _fit(frag_prefixes, vocab, labelset, min_df):
+    """Return the vocabulary and label set for merging fragments.
+
+    The vocabulary (if not given) maps features that occur in at least
+    `min_df` instances to columns, sorted by name as educe does.
+
+    The label set maps labels to numbers in order of first appearance,
+    using the numbering of each fragment to order new labels (so that
+    labels reserved by educe keep their place at the front). If it is
+    given, any unseen labels are added to the end of it.
+    """
+    dfs = Counter()
+    labelset = dict(labelset) if labelset is not None else {}
+    base = min(labelset.values()) if labelset else None
+    for frag_prefix in frag_prefixes:
+        frag = _load_fragment(frag_prefix)
+        if vocab is None:
+            for row in frag['rows']:
+                dfs.update(f for f, _ in row)
+        local = frag['labelset']
+        if base is None and local:
+            base = min(local.values())
+        for lbl, _ in sorted(local.items(), key=lambda x: x[1]):
+            if lbl not in labelset:
+                labelset[lbl] = base + len(labelset)
+    if vocab is None:
+        feats = sorted(f for f, c in dfs.items() if c >= min_df)
+        vocab = dict((f, j) for j, f in enumerate(feats))
+    return vocab, labelset
+
+
+class FeatureHasher(object):
+    """Map feature names to a fixed number of columns by hashing
+    them, instead of through a vocabulary fitted on the training
+    data. The number of columns (and so the size of the models and
+    of the vocabulary file) does not depend on the feature set, and
+    the test data can be vectorized without the training vocabulary.
+
+    The hash is a CRC32 of the feature name, which is stable across
+    processes and Python versions (unlike `hash`). We keep no record
+    of the names we have hashed.
+
+    Parameters
+    ----------
+    n_features: int
+        Number of columns
+    """
+    def __init__(self, n_features):
+        self.n_features = n_features
+
+    def __call__(self, feat):
+        "column for a feature"
+        name = feat.encode('utf-8') if isinstance(feat, six.text_type)\
+            else str(feat).encode('utf-8')
+        return (zlib.crc32(name) & 0xffffffff) % self.n_features
+
+    @staticmethod
+    def column_name(col):
+        """Name of a column in the vocabulary (which pruning keeps
+        when it renumbers the columns, see `irit_rst_dt.prune`)
+        """
+        return '__hash_{}'.format(col)
+
+    def vocabulary(self):
+        """Vocabulary to write out next to the features (attelo
+        needs one, if only for the number of columns), naming each
+        column after its index (see `column_name`)
+        """
+        return dict((self.column_name(j), j)
+                    for j in range(self.n_features))
+
+
+def _vectorized(frag_prefixes, column, labelset):
+    """Walk fragments (one at a time), yielding vectorized rows
+    along with their targets
+
+    Parameters
+    ----------
+    column: function
+        Column for a feature name, or None if the feature is not
+        kept (eg. `vocab.get`, or a `FeatureHasher`); values of
+        features that share a column are added up
+    """
+    for frag_prefix in frag_prefixes:
+        frag = _load_fragment(frag_prefix)
+        for row, lbl in zip(frag['rows'], frag['targets']):
+            xrow = {}
+            for feat, val in row:
+                col = column(feat)
+                if col is not None:
+                    xrow[col] = xrow.get(col, 0) + val
+            yield sorted(xrow.items()), labelset[lbl]
+
+
+class _StrippedWriter(object):
+    """Write the "stripped" version of a features file, which keeps
+    only the targets (and the labels header), for faster loading when
+    scoring.
+
+    To be valid svmlight, there must be at least one feature somewhere,
+    so we keep the first feature of the first row. The header is only
+    known once the full file is written, so it gets prepended on
+    closing.
+    """
+    def __init__(self, out_file):
+        self._path = out_file + '.stripped'
+        self._body = open(self._path + '.tmp', 'w')
+        self._first = True
+
+    def add(self, row, target):
+        "Append a row"
+        if self._first and row:
+            j, val = row[0]
+            self._body.write('{} {}:{}\n'.format(target, j, val))
+            self._first = False
+        else:
+            self._body.write('{}\n'.format(target))
+
+    def close(self, header):
+        "Write out the final file, starting with the given header line"
+        self._body.close()
+        with open(self._path, 'w') as stream:
+            stream.write(header)
+            with open(self._path + '.tmp') as body:
+                shutil.copyfileobj(body, stream)
+        os.remove(self._path + '.tmp')
+
+
+def _stored(sinks, pairs):
+    "Pass rows and targets through, adding them to other outputs"
+    for xrow, target in pairs:
+        for sink in sinks:
+            sink.add(xrow, target)
+        yield xrow, target
+
+
+class _Targets(object):
+    "Make a sink see the targets only"
+    def __init__(self, sink):
+        self._sink = sink
+
+    def add(self, _, target):
+        "Append a row, without its features"
+        self._sink.add([], target)
+
+
+def _concatenate(frag_prefixes, ext, out_path):
+    "Concatenate one part of the fragments into a single file"
+    with open(out_path, 'wb') as file_out:
+        for frag_prefix in frag_prefixes:
+            with open(frag_prefix + ext, 'rb') as file_in:
+                shutil.copyfileobj(file_in, file_out)
+
+
+def merge_fragments(frag_prefixes, out_file,
+                    vocab=None, labelset=None, min_df=MIN_DF,
+                    n_features=None):
+    """Merge per-document fragments into attelo input files.
+
+    Parameters
+    ----------
+    frag_prefixes: [filepath]
+        Fragments to merge, in document order.
+    out_file: filepath
+        Path to the `relations.sparse` file to write; the EDU,
+        pairings, vocabulary files, binary store (see
+        `irit_rst_dt.store`) and stripped versions of the features
+        (targets only, as text and binary store) are written next to
+        it.
+    vocab: dict(string, int), optional
+        Fixed vocabulary (eg. from the training data); if None, it
+        is fitted on the fragments.
+    labelset: dict(string, int), optional
+        Fixed label set (eg. from the training data); if None, it is
+        fitted on the fragments.
+    min_df: int
+        Minimum number of instances for a feature to be kept when
+        fitting the vocabulary.
+    n_features: int, optional
+        If set, hash the features into this many columns (see
+        `FeatureHasher`) instead of using a vocabulary; `vocab` and
+        `min_df` are then ignored.
+
+    Returns
+    -------
+    vocab: dict(string, int)
+        Vocabulary used for the output
+    labelset: dict(string, int)
+        Label set used for the output
+    """
+    from educe.learning.edu_input_format import labels_comment
+    from educe.learning.svmlight_format import dump_svmlight_file
+    from educe.learning.vocabulary_format import dump_vocabulary
+
+    if n_features is None:
+        vocab, labelset = _fit(frag_prefixes, vocab, labelset, min_df)
+        column = vocab.get
+    else:
+        # (an empty vocabulary: we only fit the label set)
+        _, labelset = _fit(frag_prefixes, {}, labelset, min_df)
+        column = FeatureHasher(n_features)
+    # write the binary stores and the stripped (targets only) data in
+    # the same pass as the text file
+    store = CsrWriter(out_file)
+    stripped_store = CsrWriter(out_file + '.stripped')
+    stripped = _StrippedWriter(out_file)
+    sinks = [store, _Targets(stripped_store), stripped]
+    x_pairs, y_pairs = itertools.tee(
+        _stored(sinks, _vectorized(frag_prefixes, column, labelset)))
+    with open(out_file, 'wb') as stream:
+        dump_svmlight_file((x for x, _ in x_pairs),
+                           (y for _, y in y_pairs),
+                           stream,
+                           comment=labels_comment(labelset))
+    store.close()
+    stripped_store.close()
+    with open(out_file) as stream:
+        stripped.close(stream.readline())
+    _concatenate(frag_prefixes, '.edu_input', out_file + '.edu_input')
+    _concatenate(frag_prefixes, '.pairings', out_file + '.pairings')
+    if n_features is not None:
+        vocab = column.vocabulary()
+    dump_vocabulary(vocab, out_file + '.vocab')
+    return vocab, labelset
+
+
+# ---------------------------------------------------------------------
+# cache
+# ---------------------------------------------------------------------
+
+CACHE_VERSION = 1
+"""Bump this whenever the fragment format or the way we extract
+documents changes, to invalidate existing cache entries"""
+
+_INPUT_INDICES = {}
+"""Input files under a directory, indexed by document stem"""
+
+
+def _doc_stem(name):
+    """Part of a file or document name shared by all the inputs
+    for the same document (eg. `wsj_0600` for `wsj_0600.out.dis`
+    and `wsj_0600.mrg`)
+    """
+    return name.split('.', 1)[0].lower()
+
+
+def _input_index(root):
+    """Map from document stem to the files for that document
+    anywhere under a directory
+    """
+    if root not in _INPUT_INDICES:
+        index = {}
+        for dirpath, _, fnames in os.walk(root, followlinks=True):
+            for fname in fnames:
+                index.setdefault(_doc_stem(fname), []).append(
+                    fp.join(dirpath, fname))
+        _INPUT_INDICES[root] = dict((k, sorted(v))
+                                    for k, v in index.items())
+    return _INPUT_INDICES[root]
+
+
+def _hash_file(path, hasher):
+    "Feed the contents of a file into a hash"
+    with open(path, 'rb') as stream:
+        for block in iter(lambda: stream.read(1 << 20), b''):
+            hasher.update(block)
+
+
+def document_key(doc_key, corpus, ptb_dir, feature_set,
+                 corenlp_out_dir=None, lecsie_data_dir=None,
+                 coarse=False, fix_pseudo_rels=False):
+    """Cache key for a document: a hash of all its input files
+    (RST tree, PTB, CoreNLP and LECSIE data), and of the settings
+    that affect its extraction
+
+    See `extract_document` for the parameters
+    """
+    stem = _doc_stem(doc_key.doc)
+    hasher = hashlib.sha1()
+    settings = [CACHE_VERSION, doc_key.doc, feature_set,
+                coarse, fix_pseudo_rels]
+    hasher.update(repr(settings).encode('utf-8'))
+    for root in [corpus, ptb_dir, corenlp_out_dir, lecsie_data_dir]:
+        if root is None:
+            continue
+        for path in _input_index(root).get(stem, []):
+            hasher.update(fp.relpath(path, root).encode('utf-8'))
+            _hash_file(path, hasher)
+    return hasher.hexdigest()
+
+
+def cached_fragment_path(cache_dir, key):
+    """Path prefix for the fragment with a given cache key
+    (see `document_key`)
+    """
+    return fp.join(cache_dir, key[:2], key)
+
+
+# ---------------------------------------------------------------------
+# corpus
+# ---------------------------------------------------------------------
+
+
+def parallel(n_jobs, jobs):
+    """Run delayed jobs with the same conventions as the harness:
+    0 for fully sequential, any other value is passed on to joblib
+    """
+    if n_jobs == 0:
+        return [func(*args, **kwargs) for func, args, kwargs in jobs]
+    else:
+        return Parallel(n_jobs=n_jobs, verbose=5)(jobs)
+
+
+def _fragment_prefixes(corpus, doc_keys, settings, cache_dir, tmp_dir):
+    "Where to find the fragments for the documents of a corpus"
+    if cache_dir is None:
+        frag_dir = fp.join(tmp_dir, fp.basename(corpus))
+        return [fragment_path(frag_dir, k) for k in doc_keys]
+    else:
+        return [cached_fragment_path(cache_dir,
+                                     document_key(k, corpus, **settings))
+                for k in doc_keys]
+
+
+def extract_corpora(corpora, output_dir, ptb_dir, feature_set,
+                    corenlp_out_dir=None, lecsie_data_dir=None,
+                    coarse=False, fix_pseudo_rels=False,
+                    vocab_path=None, label_path=None,
+                    cache_dir=None, refresh=False,
+                    n_features=None, n_jobs=-1):
+    """Extract instances from a list of corpora, document by document,
+    and store them in `<output_dir>/<corpus>.relations.sparse` (and
+    friends).
+
+    The documents of all corpora are extracted together, in the same
+    pool of workers. The vocabulary and label set are then fitted on
+    the first corpus (normally the training data) and reused for the
+    others, unless `vocab_path` and `label_path` point to a fixed
+    vocabulary and label set (eg. when only extracting test data).
+    With `n_features`, features are hashed into that many columns
+    instead (see `FeatureHasher`), and there is no vocabulary to fit
+    or pass around.
+
+    See `extract_document` for the extraction parameters; `n_jobs`
+    follows the harness conventions (see `parallel`).
+
+    If `cache_dir` is set, fragments are kept there under a hash of
+    their inputs (see `document_key`), and only documents without a
+    fragment get extracted (all of them if `refresh` is True). The
+    output files are rebuilt from the fragments in any case.
+    """
+    from educe.learning.edu_input_format import load_labels
+    from educe.learning.vocabulary_format import load_vocabulary
+
+    if not fp.exists(output_dir):
+        os.makedirs(output_dir)
+    tmp_dir = fp.join(output_dir, 'tmp-fragments')
+    settings = dict(ptb_dir=ptb_dir,
+                    feature_set=feature_set,
+                    corenlp_out_dir=corenlp_out_dir,
+                    lecsie_data_dir=lecsie_data_dir,
+                    coarse=coarse,
+                    fix_pseudo_rels=fix_pseudo_rels)
+    all_prefixes = []
+    jobs = []
+    for corpus in corpora:
+        doc_keys = list_documents(corpus, ptb_dir, corenlp_out_dir,
+                                  coarse, fix_pseudo_rels)
+        frag_prefixes = _fragment_prefixes(corpus, doc_keys, settings,
+                                           cache_dir, tmp_dir)
+        todo = [(k, p) for k, p in zip(doc_keys, frag_prefixes)
+                if refresh or not has_fragment(p)]
+        print('extracting {} of {} documents from {}'.format(len(todo),
+                                                             len(doc_keys),
+                                                             corpus),
+              file=sys.stderr)
+        jobs.extend(delayed(extract_document)(k, p, corpus, **settings)
+                    for k, p in todo)
+        all_prefixes.append(frag_prefixes)
+    parallel(n_jobs, jobs)
+
+    vocab = load_vocabulary(vocab_path)\
+        if vocab_path is not None and n_features is None else None
+    labelset = load_labels(label_path) if label_path is not None\
+        else None
+    for corpus, frag_prefixes in zip(corpora, all_prefixes):
+        out_file = fp.join(output_dir,
+                           fp.basename(corpus) + '.relations.sparse')
+        vocab, labelset = merge_fragments(frag_prefixes, out_file,
+                                          vocab=vocab, labelset=labelset,
+                                          n_features=n_features)
+    if cache_dir is None:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
@@ -0,0 +1,169 @@
+# Author: Eric Kow
+# License: CeCILL-B (French BSD3-like)
+
+"""
+Stable hashes of learners, files and document sets
+
+These are used to give content-addressed names to things we want to
+share between evaluations (eg. models), so that two objects get the
+same name if and only if they would give the same results.
+"""
+
+from __future__ import print_function
+from os import path as fp
+import functools
+import hashlib
+import inspect
+import json
+import os
+import types
+
+import numpy as np
+import six
+
+try:
+    from enum import Enum
+except ImportError:
+    Enum = None
+
+_MAX_DEPTH = 8
+"""How far we look into nested objects"""
+
+_ROUTINES = (types.FunctionType, types.BuiltinFunctionType,
+             types.MethodType, type)
+
+_getargspec = getattr(inspect, 'getfullargspec', None) or\
+    inspect.getargspec  # pylint: disable=deprecated-method
+
+
+def _qualified_name(obj):
+    "module and (qualified) name of a function or class"
+    return '{}.{}'.format(getattr(obj, '__module__', None),
+                          getattr(obj, '__qualname__', obj.__name__))
+
+
+def _init_params(cls):
+    """Names of the constructor arguments of a class (and of its
+    parents, whose constructors it may pass them on to)
+    """
+    names = []
+    for klass in inspect.getmro(cls):
+        init = vars(klass).get('__init__')
+        if not inspect.isfunction(init):
+            continue
+        for name in _getargspec(init).args[1:]:
+            if name not in names:
+                names.append(name)
+    return names
+
+
+def _settings(obj):
+    """The settings of an object: the values of its constructor
+    arguments, as kept in attributes of the same name (or the same
+    with a leading underscore)
+    """
+    res = {}
+    for name in _init_params(type(obj)):
+        for attr in [name, '_' + name]:
+            if hasattr(obj, attr):
+                res[name] = getattr(obj, attr)
+                break
+    return res
+
+
+def _describe(obj, depth=0, seen=None):
+    """Reduce an object to a structure of builtins that only depends
+    on its configuration.
+
+    We only look at the hyperparameters of estimators (`get_params`),
+    and at the constructor arguments of other objects (see
+    `_settings`), so that a fitted and a fresh learner with the same
+    settings look the same. Functions and classes are described by
+    their qualified names, and enumeration members by their names.
+    """
+    seen = seen or set()
+    if obj is None or isinstance(obj, (bool, float) + six.integer_types):
+        return obj
+    elif isinstance(obj, six.string_types):
+        return obj
+    elif isinstance(obj, np.ndarray):
+        return ['ndarray', hashlib.sha1(obj.tobytes()).hexdigest()]
+    elif isinstance(obj, np.generic):
+        return obj.item()
+    elif Enum is not None and isinstance(obj, Enum):
+        return [_qualified_name(type(obj)), obj.name]
+    elif depth > _MAX_DEPTH or id(obj) in seen:
+        return type(obj).__name__
+    seen = seen | set([id(obj)])
+    if isinstance(obj, (list, tuple)):
+        return [_describe(x, depth + 1, seen) for x in obj]
+    elif isinstance(obj, dict):
+        return sorted([str(k), _describe(v, depth + 1, seen)]
+                      for k, v in obj.items())
+    elif isinstance(obj, (set, frozenset)):
+        return sorted((_describe(x, depth + 1, seen) for x in obj),
+                      key=repr)
+    elif isinstance(obj, functools.partial):
+        return ['partial', _describe([obj.func, obj.args,
+                                      obj.keywords or {}], depth + 1, seen)]
+    elif isinstance(obj, _ROUTINES):
+        res = [_qualified_name(obj)]
+        if getattr(obj, '__self__', None) is not None and\
+                not isinstance(obj.__self__, types.ModuleType):
+            # bound method: the object matters too
+            res.append(_describe(obj.__self__, depth + 1, seen))
+        code = getattr(obj, '__code__', None)
+        if code is not None and '<' in res[0]:
+            # lambdas and nested functions share their names
+            res.append(hashlib.sha1(code.co_code).hexdigest())
+            res.append(_describe([code.co_consts,
+                                  obj.__defaults__,
+                                  [c.cell_contents for c in
+                                   obj.__closure__ or []]],
+                                 depth + 1, seen))
+        return res
+
+    name = _qualified_name(type(obj))
+    if hasattr(obj, 'get_params'):
+        params = obj.get_params(deep=False)
+    elif hasattr(obj, '_asdict'):
+        params = obj._asdict()
+    else:
+        params = _settings(obj)
+    return [name, _describe(params, depth + 1, seen)]
+
+
+def fingerprint(*objs):
+    """Hash of the configuration of some objects (eg. learners and
+    their hyperparameters, see `_describe`)
+    """
+    desc = json.dumps(_describe(list(objs)), sort_keys=True)
+    return hashlib.sha1(desc.encode('utf-8')).hexdigest()
+
+
+def hash_file(path):
+    """Hash of the contents of a file.
+
+    As files may be large, the hash is saved in a `<path>.sha1` file
+    along with the size and modification time of the file, and reused
+    as long as these stay the same.
+    """
+    stat = os.stat(path)
+    stamp = '{} {}'.format(stat.st_size, int(stat.st_mtime))
+    cache_path = path + '.sha1'
+    if fp.exists(cache_path):
+        with open(cache_path) as stream:
+            cached_stamp, _, digest = stream.read().strip().rpartition(' ')
+        if cached_stamp == stamp:
+            return digest
+    hasher = hashlib.sha1()
+    with open(path, 'rb') as stream:
+        for block in iter(lambda: stream.read(1 << 20), b''):
+            hasher.update(block)
+    digest = hasher.hexdigest()
+    # (atomically: every worker of an evaluation may be here at once)
+    tmp_path = '{}.{}'.format(cache_path, os.getpid())
+    with open(tmp_path, 'w') as stream:
+        print(stamp, digest, file=stream)
+    os.rename(tmp_path, cache_path)
+    return digest
@@ -6,24 +6,34 @@ from os import path as fp
 import sys
 
 from attelo.fold import (make_n_fold)
-from attelo.harness import Harness
-from attelo.harness.evaluate import (evaluate_corpus,
-                                     prepare_dirs)
+from attelo.harness import (Harness, RuntimeConfig)
+from attelo.harness.evaluate import (prepare_dirs)
+from attelo.harness.util import (makedirs)
 from attelo.io import (load_fold_dict,
+                       load_multipack,
                        save_fold_dict)
 from attelo.parser.intra import (IntraInterPair)
 from attelo.util import (mk_rng)
 
+from .evaluate import (evaluate_corpus)
+from .fingerprint import (fingerprint, hash_file)
 from .local import (CONFIG_FILE,
                     DETAILED_EVALUATIONS,
                     EVALUATIONS,
                     FIXED_FOLD_FILE,
                     GRAPH_DOCS,
                     METRICS,
+                    PRUNE_MAX_FEATURES,
+                    PRUNE_MIN_DF,
                     TEST_CORPUS,
                     TEST_EVALUATION_KEY,
-                    TRAINING_CORPUS)
+                    TRAINING_CORPUS,
+                    WARM_START)
+from .prune import (masked, pruned_suffix, rewrites, training_mask)
+from .store import (has_store,
+                    load_multipack as load_store_multipack)
 from .util import (latest_tmp, exit_ungathered)
+from .warmstart import (Fitted, designate, estimator, warm_spec)
 
 
 # pylint: disable=too-many-arguments, too-many-instance-attributes
@@ -37,20 +47,71 @@ class IritHarness(Harness):
         testset = (fp.basename(TEST_CORPUS) if TEST_CORPUS is not None
                    else None)
         super(IritHarness, self).__init__(dataset, testset)
+        self._data_dir = None
+        self._fold_dict = None
+        self._fingerprints = {}
+        self._warm_plans = {}
         self.sanity_check_config()
 
-    def run(self, runcfg):
+    def run(self, runcfg, backend=None, task=None):
         """Run the evaluation
+
+        Parameters
+        ----------
+        runcfg : RuntimeConfig
+        backend : function, optional
+            How to run the tasks of the evaluation (see
+            `irit_rst_dt.evaluate.evaluate_corpus`)
+        task : string, optional
+            Key of the only task to run (see
+            `irit_rst_dt.evaluate.evaluate_corpus`)
         """
         data_dir = latest_tmp()
         if not fp.exists(data_dir):
             exit_ungathered()
         eval_dir, scratch_dir = prepare_dirs(runcfg, data_dir)
+        self._data_dir = fp.realpath(data_dir)
         self.load(runcfg, eval_dir, scratch_dir)
         evidence_of_gathered = self.mpack_paths(False)['edu_input']
         if not fp.exists(evidence_of_gathered):
             exit_ungathered()
-        evaluate_corpus(self)
+        if not fp.exists(self.mpack_paths(False)['features']):
+            sys.exit("The features have not been pruned yet (see "
+                     "PRUNE_MIN_DF in local.py).\n"
+                     "Please run `irit-rst-dt prune`, then start "
+                     "a new evaluation")
+        evaluate_corpus(self, backend=backend, task=task)
+
+    def load_latest(self):
+        """Point the harness at the latest evaluation without running
+        anything (eg. to decode fresh documents with its combined
+        models, see `irit_rst_dt.predict`)
+        """
+        data_dir = latest_tmp()
+        eval_dir = fp.join(data_dir, 'eval-current')
+        if not fp.exists(eval_dir):
+            sys.exit("No evaluation in {}.\n"
+                     "Please run `irit-rst-dt evaluate` first".format(
+                         data_dir))
+        self._data_dir = fp.realpath(data_dir)
+        runcfg = RuntimeConfig(mode=None, folds=None, stage=None,
+                               n_jobs=0)
+        self.load(runcfg, eval_dir, fp.join(data_dir, 'scratch-current'))
+
+    def load_gathered(self):
+        """Point the harness at the latest gathered (and pruned) data,
+        outside of any evaluation (eg. to tune hyperparameters on it,
+        see `irit_rst_dt.tune`)
+        """
+        data_dir = latest_tmp()
+        if not fp.exists(data_dir):
+            exit_ungathered()
+        self._data_dir = fp.realpath(data_dir)
+        runcfg = RuntimeConfig(mode=None, folds=None, stage=None,
+                               n_jobs=0)
+        self.load(runcfg, data_dir, fp.join(data_dir, 'scratch-current'))
+        if not fp.exists(self.mpack_paths(False)['vocab']):
+            exit_ungathered()
 
     # ------------------------------------------------------
     # local settings
@@ -80,12 +141,7 @@ class IritHarness(Harness):
             return None
         elif TEST_EVALUATION_KEY is None:
             return None
-        test_confs = [x for x in self.evaluations
-                      if x.key == TEST_EVALUATION_KEY]
-        if test_confs:
-            return test_confs[0]
-        else:
-            return None
+        return self.evaluations.get(TEST_EVALUATION_KEY)
 
     @property
     def graph_docs(self):
@@ -101,8 +157,39 @@ class IritHarness(Harness):
         else:
             fold_dict = load_fold_dict(FIXED_FOLD_FILE)
         save_fold_dict(fold_dict, self.fold_file)
+        self._fold_dict = fold_dict
         return fold_dict
 
+    def load_multipack(self, test_data, stripped=False):
+        """Load the datapack for the dataset (or test set), from
+        the binary store if `mpack_paths` points to one, or from the
+        svmlight files otherwise.
+
+        Parameters
+        ----------
+        test_data : boolean
+            If True, it's the test set we wanted, else the dataset.
+
+        stripped : boolean, defaults to False
+            If True, load the "stripped" version of the data if there
+            is one (faster loading, but only useful for scoring).
+
+        Returns
+        -------
+        mpack : dict(string, DataPack)
+            Datapack for each document.
+        """
+        paths = self.mpack_paths(test_data, stripped=stripped)
+        if stripped and not fp.exists(paths['features']):
+            paths = self.mpack_paths(test_data, stripped=False)
+        loader = (load_store_multipack if paths.get('store', False)
+                  else load_multipack)
+        return loader(paths['edu_input'],
+                      paths['pairings'],
+                      paths['features'],
+                      paths['vocab'],
+                      verbose=True)
+
     # ------------------------------------------------------
     # paths
     # ------------------------------------------------------
@@ -124,9 +211,13 @@ class IritHarness(Harness):
         res : dict
             Paths to files that enable to read a datapack.
             Useful keys are 'edu_input', 'pairings', 'features', 'vocab',
-            'corpus' (WIP, used to access gold structures).
+            'corpus' (WIP, used to access gold structures), 'store'
+            (True if we should prefer the binary feature store next
+            to the features file, see `irit_rst_dt.store`).
         """
         ext = 'relations.sparse'
+        if rewrites(PRUNE_MIN_DF):
+            ext = '{}.{}'.format(pruned_suffix(PRUNE_MIN_DF), ext)
         # path to data file in the evaluation dir
         dset = self.testset if test_data else self.dataset
         core_path = fp.join(self.eval_dir, "%s.%s" % (dset, ext))
@@ -134,17 +225,73 @@ class IritHarness(Harness):
         corpus_path = fp.abspath(TEST_CORPUS if test_data
                                  else TRAINING_CORPUS)
         # end WIP
+        feature_path = (core_path + '.stripped') if stripped else core_path
         return {
             'edu_input': core_path + '.edu_input',
             'pairings': core_path + '.pairings',
-            'features': (core_path + '.stripped') if stripped else core_path,
+            'features': feature_path,
             'vocab': core_path + '.vocab',
-            'corpus': corpus_path
+            'corpus': corpus_path,
+            'store': has_store(feature_path),
         }
 
+    @property
+    def pruning(self):
+        """Pruning settings (minimum number of instances and maximum
+        number of features, see `irit_rst_dt.prune`), or None if we
+        use all the features
+        """
+        if PRUNE_MIN_DF is None and PRUNE_MAX_FEATURES is None:
+            return None
+        return (PRUNE_MIN_DF, PRUNE_MAX_FEATURES)
+
+    def prune_training(self, dpacks):
+        """Training datapacks with the features we do not want to
+        learn from zeroed out (worked out on these datapacks only, see
+        `irit_rst_dt.prune.training_mask`)
+        """
+        if self.pruning is None or not dpacks:
+            return dpacks
+        mask = training_mask(dpacks, PRUNE_MIN_DF,
+                             max_features=PRUNE_MAX_FEATURES)
+        return [masked(d, mask) for d in dpacks]
+
+    def model_dir_path(self):
+        """Directory for the models of all evaluations on the current
+        features (see `model_paths`)
+        """
+        return fp.join(self._data_dir, 'models')
+
+    def _fold_docs(self, fold):
+        """Names of the documents that models for a fold are trained
+        on (all documents for the combined models)
+        """
+        if self._fold_dict is None:
+            self._fold_dict = load_fold_dict(self.fold_file)
+        return sorted(d for d, f in self._fold_dict.items()
+                      if fold is None or f != fold)
+
+    def _learner_fingerprint(self, klearner):
+        """Hash of the hyperparameters of a keyed learner.
+
+        This is computed once per learner object, so that it does not
+        change once the learner has been fitted.
+        """
+        if id(klearner) not in self._fingerprints:
+            self._fingerprints[id(klearner)] = (klearner,
+                                                fingerprint(klearner))
+        return self._fingerprints[id(klearner)][1]
+
     def model_paths(self, rconf, fold, parser):
         """Paths to the learner(s) model(s).
 
+        Models are kept in a content-addressed store shared by all
+        evaluations on the same features (see `model_dir_path`): the
+        name of each model is a hash of the learner and its
+        hyperparameters, the task, the features file and the documents
+        it is trained on. Evaluations that share a learner thus never
+        train it twice, whatever they decode with.
+
         Parameters
         ----------
         rconf : (IntraInterPair of) LearnerConfig
@@ -153,8 +300,9 @@ class IritHarness(Harness):
             See `attelo.parser.intra.IntraInterPair`,
             `attelo.harness.config.LearnerConfig`
 
-        fold : TODO
-            TODO
+        fold : int or None
+            Fold whose training part the models are trained on (None
+            for the combined models, trained on all the data)
 
         parser : parser (WIP)
             For IntraInterParser, enables to know which edges the inter
@@ -165,21 +313,129 @@ class IritHarness(Harness):
         paths : dict from string to pathname
             Mapping from learner description to model paths.
         """
-        parent_dir = (self.fold_dir_path(fold) if fold is not None
-                      else self.combined_dir_path())
-
-        def _eval_model_path(subconf, mtype):
-            "Model for a given loop/eval config and fold"
-            # basic filename for a model: bname
-            rsubconf = (subconf.attach if 'attach' in mtype
-                        else subconf.label)
-            fn_tmpl = '{dataset}.{learner}.{task}.{ext}'
-            bname = fn_tmpl.format(dataset=self.dataset,
-                                   learner=rsubconf.key,
-                                   task=mtype,
-                                   ext='model')
-            return fp.join(parent_dir, bname)
+        paths = dict((desc, self._model_path(klearner, mtype, fold))
+                     for desc, (klearner, mtype)
+                     in self._models(rconf, parser).items())
+        for path in paths.values():
+            makedirs(fp.dirname(path))
+        return paths
+
+    def _model_path(self, rsubconf, mtype, fold):
+        "Model for a given loop/eval config and fold"
+        # basic filename for a model: bname
+        mkey = self._model_key(rsubconf, mtype, fold)
+        fn_tmpl = '{dataset}.{learner}.{task}.{mkey}.{ext}'
+        bname = fn_tmpl.format(dataset=self.dataset,
+                               learner=rsubconf.key,
+                               task=mtype,
+                               mkey=mkey,
+                               ext='model')
+        return fp.join(self.model_dir_path(), mkey[:2], bname)
+
+    def _model_key(self, rsubconf, mtype, fold):
+        """Name of a model in the store: a hash of what it depends on,
+        and for a warm-started model, of the name of the model it
+        starts from (see `warm_starts`)
+        """
+        mkey_parts = [self._learner_fingerprint(rsubconf), mtype,
+                      self._data_key(fold)]
+        if WARM_START and estimator(rsubconf.payload) is not None:
+            neighbour = self._warm_plan(fold).get(fingerprint(*mkey_parts))
+            mkey_parts.extend(['warm-start',
+                               self._model_key(neighbour[0], neighbour[1],
+                                               fold)
+                               if neighbour is not None else 'none'])
+        return fingerprint(*mkey_parts)
 
+    def warm_starts(self, rconf, fold, parser):
+        """The models of a configuration that we can warm-start (or
+        warm-start others from, see `irit_rst_dt.warmstart`), with the
+        same keys as `model_paths`, and the model each of them starts
+        from
+
+        Returns
+        -------
+        specs : dict from string to WarmSpec
+        """
+        if not WARM_START:
+            return {}
+        data_key = self._data_key(fold)
+        res = {}
+        for desc, (klearner, mtype) in self._models(rconf, parser).items():
+            spec = warm_spec(klearner.payload, mtype, data_key)
+            if spec is None:
+                continue
+            base = fingerprint(self._learner_fingerprint(klearner), mtype,
+                               data_key)
+            neighbour = self._warm_plan(fold).get(base)
+            if neighbour is not None:
+                nlearner, ntype = neighbour
+                nspec = warm_spec(nlearner.payload, ntype, data_key)
+                spec = spec._replace(neighbour=Fitted(
+                    path=self._model_path(nlearner, ntype, fold),
+                    params=nspec.params))
+            res[desc] = spec
+        return res
+
+    def _warm_plan(self, fold):
+        """Which model each model of a fold starts from (see
+        `irit_rst_dt.warmstart.designate`)
+
+        This only depends on the evaluations: the models of each are
+        fitted by the first evaluation that needs them, as in
+        `irit_rst_dt.schedule.training_plan`.
+
+        Returns
+        -------
+        neighbours : dict from string to (keyed learner, string)
+            Learner and task of the model each model starts from (if
+            any), by the hash of its learner, task and data
+        """
+        if fold in self._warm_plans:
+            return self._warm_plans[fold]
+        data_key = self._data_key(fold)
+        models = {}
+        specs = {}
+        owners = {}
+        n_plan = 0
+        for econf in self.evaluations:
+            new = False
+            for klearner, mtype in self._models(econf.learner,
+                                                econf.parser).values():
+                key = fingerprint(self._learner_fingerprint(klearner),
+                                  mtype, data_key)
+                if key in owners:
+                    continue
+                new = True
+                owners[key] = n_plan
+                models[key] = (klearner, mtype)
+                spec = warm_spec(klearner.payload, mtype, data_key)
+                if spec is not None:
+                    specs[key] = spec
+            n_plan += int(new)
+        neighbours = designate(specs, owners)
+        self._warm_plans[fold] = dict((k, models[n])
+                                      for k, n in neighbours.items()
+                                      if n is not None)
+        return self._warm_plans[fold]
+
+    def _data_key(self, fold):
+        """What the models for a fold depend on besides their
+        learners: the features and the documents they are trained on
+        """
+        features = fp.join(self._data_dir,
+                           fp.basename(self.mpack_paths(False)['features']))
+        data_key = [self.dataset, hash_file(features),
+                    self._fold_docs(fold)]
+        if PRUNE_MAX_FEATURES is not None:
+            data_key.append(self.pruning)
+        return data_key
+
+    @staticmethod
+    def _models(rconf, parser):
+        """Learner and task for each of the models of a configuration
+        (see `model_paths`)
+        """
         if isinstance(rconf, IntraInterPair):
             # WIP
             sel_inter = parser.payload._sel_inter
@@ -191,19 +447,17 @@ class IritHarness(Harness):
             }
             # end WIP
             return {
-                'inter:attach': _eval_model_path(
-                    rconf.inter, inter_prefixes[sel_inter] + "attach"),
-                'inter:label': _eval_model_path(
-                    rconf.inter, inter_prefixes[sel_inter] + "relate"),
-                'intra:attach': _eval_model_path(
-                    rconf.intra, "sent-attach"),
-                'intra:label': _eval_model_path(
-                    rconf.intra, "sent-relate")
+                'inter:attach': (rconf.inter.attach,
+                                 inter_prefixes[sel_inter] + "attach"),
+                'inter:label': (rconf.inter.label,
+                                inter_prefixes[sel_inter] + "relate"),
+                'intra:attach': (rconf.intra.attach, "sent-attach"),
+                'intra:label': (rconf.intra.label, "sent-relate"),
             }
         else:
             return {
-                'attach': _eval_model_path(rconf, "attach"),
-                'label': _eval_model_path(rconf, "relate")
+                'attach': (rconf.attach, "attach"),
+                'label': (rconf.label, "relate"),
             }
 
     # ------------------------------------------------------
@@ -214,7 +468,7 @@ class IritHarness(Harness):
         """
         Die if there's anything odd about the config
         """
-        conf_counts = Counter(econf.key for econf in self.evaluations)
+        conf_counts = Counter(self.evaluations.keys())
         bad_confs = [k for k, v in conf_counts.items() if v > 1]
         if bad_confs:
             oops = ("Sorry, there's an error in your configuration.\n"
@@ -231,7 +485,8 @@ class IritHarness(Harness):
                     "Hint: it's ok to specify a test corpus without "
                     "specifiying a test eval")
             sys.exit(oops)
-        if TEST_EVALUATION_KEY is not None and self.test_evaluation is None:
+        if TEST_EVALUATION_KEY is not None and\
+                TEST_EVALUATION_KEY not in self.evaluations.keys():
             oops = ("Sorry, there's an error in your configuration.\n"
                     "I don't dare to start evaluation until you fix it.\n"
                     "ERROR! -----------------vvvv---------------------\n"
@@ -7,32 +7,13 @@ In the future we may move this to a proper configuration file.
 # License: CeCILL-B (French BSD3-like)
 
 from __future__ import print_function
-import copy
+from functools import partial
 from os import path as fp
 import itertools as itr
 
-from attelo.harness.config import (LearnerConfig,
-                                   Keyed)
-# from attelo.decoding.astar import (AstarArgs,
-#                                    AstarDecoder,
-#                                    Heuristic,
-#                                    RfcConstraint)
-from attelo.decoding.eisner import EisnerDecoder
-from attelo.decoding.mst import (MstDecoder, MstRootStrategy)
-from attelo.learning.local import (SklearnAttachClassifier,
-                                   SklearnLabelClassifier)
-from attelo.parser.intra import (IntraInterPair,
-                                 HeadToHeadParser,
-                                 FrontierToHeadParser,
-                                 # SentOnlyParser,
-                                 SoftParser)
-
-from sklearn.linear_model import (LogisticRegression)
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.ensemble import RandomForestClassifier
-
-
-from .config.intra import (combine_intra)
+# NB: we only declare the evaluations here (see irit_rst_dt.registry);
+# libraries like scikit-learn are imported when they are built
+
 from .config.perceptron import (attach_learner_dp_pa,
                                 attach_learner_dp_perc,
                                 attach_learner_dp_struct_pa,
@@ -45,11 +26,18 @@ from .config.perceptron import (attach_learner_dp_pa,
                                 label_learner_perc)
 from .config.common import (ORACLE,
                             ORACLE_INTER,
-                            combined_key,
                             decoder_last,
-                            decoder_local,
-                            mk_joint,
-                            mk_post)
+                            decoder_local)
+from .registry import (KeyedSpec,
+                       LearnerSpec,
+                       Pair,
+                       Registry,
+                       combine_intra,
+                       combined_key,
+                       declared,
+                       hyperparameters,
+                       mk_joint,
+                       mk_post)
 
 # PATHS
 
@@ -60,6 +48,10 @@ LOCAL_TMP = 'TMP'
 """Things we may want to hold on to (eg. for weeks), but could
 live with throwing away as needed"""
 
+EXTRACT_CACHE = fp.join(LOCAL_TMP, 'cache', 'extract')
+"""Per-document results of feature extraction, keyed by a hash of
+their inputs and reused across runs of gather (safe to delete)"""
+
 SNAPSHOTS = 'SNAPSHOTS'
 """Results over time we are making a point of saving"""
 
@@ -126,6 +118,33 @@ FEATURE_SET = 'dev'  # one of ['dev', 'eyk', 'li2014']
 Which feature set to use for feature extraction
 """
 
+FEATURE_HASHING = None
+# FEATURE_HASHING = 2 ** 18
+"""
+If set, gather hashes the features into this many columns instead of
+fitting a vocabulary on the training data (see
+`irit_rst_dt.extract.FeatureHasher`). This bounds the size of the
+feature matrices and of the models whatever the feature set, and the
+test data no longer needs the training vocabulary. Changing it means
+gathering the features again.
+"""
+
+PRUNE_MIN_DF = None
+# PRUNE_MIN_DF = 3
+"""
+If set, only use the features that occur in at least this many
+instances (see `irit_rst_dt.prune`). Run `irit-rst-dt prune` after
+gathering the features, and evaluate uses the pruned ones.
+"""
+
+PRUNE_MAX_FEATURES = None
+# PRUNE_MAX_FEATURES = 50000
+"""
+If set, models only use this many features, the best ones by their
+chi² statistic with respect to the labels on their training data
+(on its own, this needs no `irit-rst-dt prune`)
+"""
+
 FIXED_FOLD_FILE = None
 # FIXED_FOLD_FILE = 'folds-TRAINING.json'
 """
@@ -142,73 +161,168 @@ DECODER_LOCAL = decoder_local(0.2)
 "local decoder should accept above this score"
 
 
+WARM_START = False
+"""Fit models from the nearest model of the same learner in the
+evaluations, with fewer epochs (or a stronger regularisation, for
+the logistic regressions we can), when there is one (see `irit_rst_dt.warmstart`). The models are then not
+quite the ones fitted from scratch, so they are stored apart"""
+
+FAST_EISNER = True
+"""Use our vectorised Eisner decoder (`irit_rst_dt.eisner`) rather
+than attelo's; they give the same trees"""
+
+SLURM_RESOURCES = {
+    'learn': (4, '16G'),
+    'decode': (1, '8G'),
+    'collect': (1, '2G'),
+    'report': (1, '2G'),
+    'test': (1, '16G'),
+}
+"""CPUs and memory to request for each kind of task in the SLURM
+backend (see `cluster/README.md`). The decoders and most learners are
+single-threaded, but the structured learners spread their shards over
+all the CPUs of the job (see `STRUC_N_JOBS` in `config/perceptron.py`);
+the learn and test tasks hold the training data as well as the
+models."""
+
+
+def _eisner_decoder(**kwargs):
+    "Eisner decoder"
+    if FAST_EISNER:
+        from .eisner import EisnerDecoder
+    else:
+        from attelo.decoding.eisner import EisnerDecoder
+    return EisnerDecoder(**kwargs)
+
+
+def _mst_decoder(use_prob):
+    "MST decoder"
+    from attelo.decoding.mst import (MstDecoder, MstRootStrategy)
+    return MstDecoder(MstRootStrategy.fake_root, use_prob=use_prob)
+
+
 def decoder_eisner():
     "our instantiation of the Eisner decoder"
-    return Keyed('eisner', EisnerDecoder(use_prob=True))
+    return KeyedSpec('eisner', partial(_eisner_decoder, use_prob=True))
 
 
 def decoder_mst():
     "our instantiation of the mst decoder"
-    return Keyed('mst', MstDecoder(MstRootStrategy.fake_root,
-                                   use_prob=True))
+    return KeyedSpec('mst', partial(_mst_decoder, True))
 
 
-def attach_learner_maxent():
+DECODER_SWEEP = False
+"""If True, also evaluate each (global) learner with the grid of
+decoders and decoder settings from `_sweep_decoders`. This is cheap
+once the learners are fitted: all the configurations of a learner read
+the attachment/label scores that the first one saved (see
+`irit_rst_dt.scores`), so they only pay for decoding.
+"""
+
+LOCAL_THRESHOLDS = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9]
+"thresholds for the local decoder in a decoder sweep"
+
+
+def _sweep_decoders(use_prob):
+    """decoders to try in a decoder sweep (see `DECODER_SWEEP`);
+    they must have different keys from the ones in `_core_parsers`
+    """
+    decoders = [
+        decoder_last(),
+        KeyedSpec('mst', partial(_mst_decoder, use_prob)),
+        KeyedSpec('eisner-multiroot',
+                  partial(_eisner_decoder, unique_real_root=False,
+                          use_prob=use_prob)),
+    ]
+    if use_prob:
+        decoders.extend(KeyedSpec('local-{}'.format(t),
+                                  decoder_local(t).build)
+                        for t in LOCAL_THRESHOLDS)
+    return decoders
+
+
+@declared('maxent')
+def attach_learner_maxent(**params):
     "return a keyed instance of maxent learner"
+    from attelo.harness.config import (Keyed)
+    from attelo.learning.local import (SklearnAttachClassifier)
+    from sklearn.linear_model import (LogisticRegression)
     return Keyed('maxent',
                  SklearnAttachClassifier(LogisticRegression(
-                     n_jobs=1)))
+                     **hyperparameters(params, n_jobs=1))))
 
 
-def label_learner_maxent():
+@declared('maxent')
+def label_learner_maxent(**params):
     "return a keyed instance of maxent learner"
+    from attelo.harness.config import (Keyed)
+    from attelo.learning.local import (SklearnLabelClassifier)
+    from sklearn.linear_model import (LogisticRegression)
     return Keyed('maxent',
                  SklearnLabelClassifier(LogisticRegression(
-                     n_jobs=1)))
+                     **hyperparameters(params, n_jobs=1))))
 
 
-def attach_learner_dectree():
+@declared('dectree')
+def attach_learner_dectree(**params):
     "return a keyed instance of decision tree learner"
+    from attelo.harness.config import (Keyed)
+    from attelo.learning.local import (SklearnAttachClassifier)
+    from sklearn.tree import DecisionTreeClassifier
     return Keyed('dectree',
-                 SklearnAttachClassifier(DecisionTreeClassifier()))
+                 SklearnAttachClassifier(DecisionTreeClassifier(**params)))
 
 
-def label_learner_dectree():
+@declared('dectree')
+def label_learner_dectree(**params):
     "return a keyed instance of decision tree learner"
+    from attelo.harness.config import (Keyed)
+    from attelo.learning.local import (SklearnLabelClassifier)
+    from sklearn.tree import DecisionTreeClassifier
     return Keyed('dectree',
-                 SklearnLabelClassifier(DecisionTreeClassifier()))
+                 SklearnLabelClassifier(DecisionTreeClassifier(**params)))
 
 
-def attach_learner_rndforest():
+@declared('rndforest')
+def attach_learner_rndforest(**params):
     "return a keyed instance of random forest learner"
+    from attelo.harness.config import (Keyed)
+    from attelo.learning.local import (SklearnAttachClassifier)
+    from sklearn.ensemble import RandomForestClassifier
     return Keyed('rndforest',
                  SklearnAttachClassifier(RandomForestClassifier(
-                     n_estimators=100, n_jobs=1)))
+                     **hyperparameters(params, n_estimators=100,
+                                       n_jobs=1))))
 
 
-def label_learner_rndforest():
+@declared('rndforest')
+def label_learner_rndforest(**params):
     "return a keyed instance of decision tree learner"
+    from attelo.harness.config import (Keyed)
+    from attelo.learning.local import (SklearnLabelClassifier)
+    from sklearn.ensemble import RandomForestClassifier
     return Keyed('rndforest',
                  SklearnLabelClassifier(RandomForestClassifier(
-                     n_estimators=100, n_jobs=1)))
+                     **hyperparameters(params, n_estimators=100,
+                                       n_jobs=1))))
 
 
 _LOCAL_LEARNERS = [
     #    ORACLE,
-    LearnerConfig(attach=attach_learner_maxent(),
-                  label=label_learner_maxent()),
-    #    LearnerConfig(attach=attach_learner_maxent(),
-    #                  label=label_learner_oracle()),
-    #    LearnerConfig(attach=attach_learner_rndforest(),
-    #                  label=label_learner_rndforest()),
-    #    LearnerConfig(attach=attach_learner_perc(),
-    #                  label=label_learner_maxent()),
-    #    LearnerConfig(attach=attach_learner_pa(),
-    #                  label=label_learner_maxent()),
-    #    LearnerConfig(attach=attach_learner_dp_perc(),
-    #                  label=label_learner_maxent()),
-    #    LearnerConfig(attach=attach_learner_dp_pa(),
-    #                  label=label_learner_maxent()),
+    LearnerSpec(attach=attach_learner_maxent,
+                label=label_learner_maxent),
+    #    LearnerSpec(attach=attach_learner_maxent,
+    #                label=label_learner_oracle),
+    #    LearnerSpec(attach=attach_learner_rndforest,
+    #                label=label_learner_rndforest),
+    #    LearnerSpec(attach=attach_learner_perc,
+    #                label=label_learner_maxent),
+    #    LearnerSpec(attach=attach_learner_pa,
+    #                label=label_learner_maxent),
+    #    LearnerSpec(attach=attach_learner_dp_perc,
+    #                label=label_learner_maxent),
+    #    LearnerSpec(attach=attach_learner_dp_pa,
+    #                label=label_learner_maxent),
 ]
 """Straightforward attelo learner algorithms to try
 
@@ -221,9 +335,13 @@ between different configurations of your learners.
 def _structured(klearner):
     """learner configuration pair for a structured learner
 
-    (parameterised on a decoder)"""
-    return lambda d: LearnerConfig(attach=klearner(d),
-                                   label=label_learner_maxent())
+    (parameterised on a decoder declaration)"""
+    def _with_decoder(kdecoder):
+        "declaration of the learner for a given decoder"
+        attach = declared(klearner.key, klearner.proba)(
+            lambda: klearner(kdecoder.build()))
+        return LearnerSpec(attach=attach, label=label_learner_maxent)
+    return _with_decoder
 
 
 _STRUCTURED_LEARNERS = [
@@ -234,13 +352,35 @@ _STRUCTURED_LEARNERS = [
 We assume that they cannot be used relation modelling
 """
 
+TUNABLE_LEARNERS = dict((l.key, l) for l in [
+    LearnerSpec(attach=attach_learner_maxent,
+                label=label_learner_maxent),
+    LearnerSpec(attach=attach_learner_dectree,
+                label=label_learner_dectree),
+    LearnerSpec(attach=attach_learner_rndforest,
+                label=label_learner_rndforest),
+    LearnerSpec(attach=attach_learner_perc,
+                label=label_learner_perc),
+    LearnerSpec(attach=attach_learner_pa,
+                label=label_learner_pa),
+    LearnerSpec(attach=attach_learner_dp_perc,
+                label=label_learner_dp_perc),
+    LearnerSpec(attach=attach_learner_dp_pa,
+                label=label_learner_dp_pa),
+])
+"""Learners whose hyperparameters `irit-rst-dt tune` can search
+(their factories take them as keyword arguments, see
+`irit_rst_dt.registry.with_params`)
+"""
+
 
-def _core_parsers(klearner, unique_real_root=True):
+def _core_parsers(klearner, unique_real_root=True, sweep=False):
     """Our basic parser configurations
+
+    (with `sweep`, also those of the decoder sweep)
     """
     # joint
-    if ((not klearner.attach.payload.can_predict_proba or
-         not klearner.label.payload.can_predict_proba)):
+    if not (klearner.attach.proba and klearner.label.proba):
         joint = []
     else:
         joint = [
@@ -248,39 +388,59 @@ def _core_parsers(klearner, unique_real_root=True):
                 # decoder_last(),
                 # DECODER_LOCAL,
                 # decoder_mst(),
-                Keyed('eisner',
-                      EisnerDecoder(unique_real_root=unique_real_root,
-                                    use_prob=True)),
-            ]
+                KeyedSpec('eisner',
+                          partial(_eisner_decoder,
+                                  unique_real_root=unique_real_root,
+                                  use_prob=True)),
+            ] + (_sweep_decoders(True) if sweep else [])
         ]
 
     # postlabeling
-    use_prob = klearner.attach.payload.can_predict_proba
+    use_prob = klearner.attach.proba
     post = [
         mk_post(klearner, d) for d in [
             # decoder_last() ,
             # DECODER_LOCAL,
             # decoder_mst(),
-            Keyed('eisner',
-                  EisnerDecoder(unique_real_root=unique_real_root,
-                                use_prob=use_prob)),
-        ]
+            KeyedSpec('eisner',
+                      partial(_eisner_decoder,
+                              unique_real_root=unique_real_root,
+                              use_prob=use_prob)),
+        ] + (_sweep_decoders(use_prob) if sweep else [])
     ]
 
     return joint + post
 
 
+def tuning_evaluation(klearner):
+    """The configuration `irit-rst-dt tune` scores a learner with
+    (our first basic parser)
+    """
+    return _core_parsers(klearner)[0]
+
+
+def _intra_inter(parser, sel_inter):
+    "intra/inter parser constructor (by name) and edge selection"
+    from attelo.parser import intra
+    return getattr(intra, parser), sel_inter
+
+
+def _ii_config(key, parser, sel_inter):
+    "declaration of an intra/inter configuration"
+    return KeyedSpec(key, partial(_intra_inter, parser, sel_inter))
+
+
 _INTRA_INTER_CONFIGS = [
-#    Keyed('ifrontier-inter', (FrontierToHeadParser, 'inter')),
-#    Keyed('ifrontier-head_to_head', (FrontierToHeadParser, 'head_to_head')),
-#    Keyed('ifrontier-frontier_to_head', (FrontierToHeadParser, 'frontier_to_head')),
-#    Keyed('ifrontier-global', (FrontierToHeadParser, 'global')),
-#    Keyed('iheads-inter', (HeadToHeadParser, 'inter')),
-#    Keyed('iheads-head_to_head', (HeadToHeadParser, 'head_to_head')),
-#    Keyed('iheads-frontier_to_head', (HeadToHeadParser, 'frontier_to_head')),
-    Keyed('iheads-global', (HeadToHeadParser, 'global')),
-    # Keyed('ionly', SentOnlyParser),
-    # Keyed('isoft', SoftParser),
+#    _ii_config('ifrontier-inter', 'FrontierToHeadParser', 'inter'),
+#    _ii_config('ifrontier-head_to_head', 'FrontierToHeadParser', 'head_to_head'),
+#    _ii_config('ifrontier-frontier_to_head', 'FrontierToHeadParser', 'frontier_to_head'),
+#    _ii_config('ifrontier-global', 'FrontierToHeadParser', 'global'),
+#    _ii_config('iheads-inter', 'HeadToHeadParser', 'inter'),
+#    _ii_config('iheads-head_to_head', 'HeadToHeadParser', 'head_to_head'),
+#    _ii_config('iheads-frontier_to_head', 'HeadToHeadParser', 'frontier_to_head'),
+    _ii_config('iheads-global', 'HeadToHeadParser', 'global'),
+    # _ii_config('ionly', 'SentOnlyParser', 'inter'),
+    # _ii_config('isoft', 'SoftParser', 'inter'),
 ]
 
 
@@ -302,7 +462,7 @@ def _mk_basic_intras(klearner, kconf):
     """
     # NEW intra parsers are explicitly authorized to have more than one
     # real root (necessary for the Eisner decoder, maybe other decoders too)
-    parsers = [IntraInterPair(intra=x, inter=y) for x, y in
+    parsers = [Pair(intra=x, inter=y) for x, y in
                zip(_core_parsers(klearner, unique_real_root=False),
                    _core_parsers(klearner))]
     return [combine_intra(p, kconf) for p in parsers]
@@ -312,7 +472,7 @@ def _mk_sorc_intras(klearner, kconf):
     """Intra/inter parsers based on a single core parser
     and a sentence oracle
     """
-    parsers = [IntraInterPair(intra=x, inter=y) for x, y in
+    parsers = [Pair(intra=x, inter=y) for x, y in
                zip(_core_parsers(ORACLE, unique_real_root=False),
                    _core_parsers(klearner))]
     return [combine_intra(p, kconf, primary='inter') for p in parsers]
@@ -322,7 +482,7 @@ def _mk_dorc_intras(klearner, kconf):
     """Intra/inter parsers based on a single core parser
     and a document oracle
     """
-    parsers = [IntraInterPair(intra=x, inter=y) for x, y in
+    parsers = [Pair(intra=x, inter=y) for x, y in
                zip(_core_parsers(klearner, unique_real_root=False),
                    _core_parsers(ORACLE))]
     return [combine_intra(p, kconf, primary='intra') for p in parsers]
@@ -331,14 +491,13 @@ def _mk_dorc_intras(klearner, kconf):
 def _mk_last_intras(klearner, kconf):
     """Parsers using "last" for intra and a core decoder for inter.
     """
-    if ((not klearner.attach.payload.can_predict_proba or
-         not klearner.label.payload.can_predict_proba)):
+    if not (klearner.attach.proba and klearner.label.proba):
         return []
 
-    kconf = Keyed(key=combined_key('last', kconf),
-                  payload=kconf.payload)
+    kconf = KeyedSpec(key=combined_key('last', kconf),
+                      build=kconf.build)
     econf_last = mk_joint(klearner, decoder_last())
-    parsers = [IntraInterPair(intra=econf_last, inter=y) for y in
+    parsers = [Pair(intra=econf_last, inter=y) for y in
                _core_parsers(klearner)]
     return [combine_intra(p, kconf, primary='inter') for p in parsers]
 # end of possibly obsolete
@@ -355,7 +514,7 @@ def _is_junk(econf):
     has_intra_oracle = has.intra and (kids.intra.oracle or kids.inter.oracle)
     has_any_oracle = has.oracle or has_intra_oracle
 
-    decoder_name = econf.parser.key[len(has.key) + 1:]
+    decoder_name = econf.parser[len(has.key) + 1:]
     # last with last-based intra decoders is a bit redundant
     if has.intra and decoder_name == 'last':
         return True
@@ -381,30 +540,31 @@ def _evaluations():
     learners = []
     learners.extend(_LOCAL_LEARNERS)
     # current structured learners don't do probs, hence non-prob decoders
-    nonprob_eisner = EisnerDecoder(use_prob=False)
+    nonprob_eisner = KeyedSpec('eisner',
+                               partial(_eisner_decoder, use_prob=False))
     learners.extend(l(nonprob_eisner) for l in _STRUCTURED_LEARNERS)
     # MST is disabled by default, as it does not output projective trees
-    # nonprob_mst = MstDecoder(MstRootStrategy.fake_root, False)
+    # nonprob_mst = KeyedSpec('mst', partial(_mst_decoder, False))
     # learners.extend(l(nonprob_mst) for l in _STRUCTURED_LEARNERS)
-    global_parsers = itr.chain.from_iterable(_core_parsers(l)
-                                             for l in learners)
+    global_parsers = itr.chain.from_iterable(
+        _core_parsers(l, sweep=DECODER_SWEEP) for l in learners)
     res.extend(global_parsers)
 
     # == two-step parsers: intra then inter-sentential ==
+    # (each declaration builds its own learners, so the intra and inter
+    # learners are never shared)
     ii_learners = []  # (intra, inter) learners
-    ii_learners.extend((copy.deepcopy(klearner), copy.deepcopy(klearner))
+    ii_learners.extend((klearner, klearner)
                        for klearner in _LOCAL_LEARNERS
                        if klearner != ORACLE)
     # keep pointer to intra and inter oracles
-    ii_oracles = (copy.deepcopy(ORACLE), ORACLE_INTER)
+    ii_oracles = (ORACLE, ORACLE_INTER)
     ii_learners.append(ii_oracles)
     # structured learners, cf. supra
-    intra_nonprob_eisner = EisnerDecoder(use_prob=False,
-                                         unique_real_root=True)
-    inter_nonprob_eisner = EisnerDecoder(use_prob=False,
-                                         unique_real_root=True)
-    ii_learners.extend((copy.deepcopy(l)(intra_nonprob_eisner),
-                        copy.deepcopy(l)(inter_nonprob_eisner))
+    nonprob_eisner = KeyedSpec('eisner',
+                               partial(_eisner_decoder, use_prob=False,
+                                       unique_real_root=True))
+    ii_learners.extend((l(nonprob_eisner), l(nonprob_eisner))
                        for l in _STRUCTURED_LEARNERS)
     # couples of learners with either sentence- or document-level oracle
     sorc_ii_learners = [
@@ -423,7 +583,7 @@ def _evaluations():
         # NEW intra parsers are explicitly authorized (in fact, expected)
         # to have more than one real root ; this is necessary for the
         # Eisner decoder and probably others, with "hard" strategies
-        ii_pairs.extend(IntraInterPair(intra=x, inter=y) for x, y in
+        ii_pairs.extend(Pair(intra=x, inter=y) for x, y in
                         zip(_core_parsers(intra_lnr, unique_real_root=True),  # TODO add unique_real_root to hyperparameters in grid search
                             _core_parsers(inter_lnr, unique_real_root=True)))
     # cross-product: pairs of parsers x intra-/inter- configs
@@ -438,7 +598,9 @@ def _evaluations():
     return [x for x in res if not _is_junk(x)]
 
 
-EVALUATIONS = _evaluations()
+EVALUATIONS = Registry(_evaluations)
+"""The evaluations we want to run (see `irit_rst_dt.registry`: the
+configurations are only built when we iterate over them)"""
 
 
 GRAPH_DOCS = [
@@ -453,7 +615,7 @@ Set to None to graph everything
 def _want_details(econf):
     "true if we should do detailed reporting on this configuration"
 
-    if isinstance(econf.learner, IntraInterPair):
+    if isinstance(econf.learner, Pair):
         learners = [econf.learner.intra, econf.learner.inter]
     else:
         learners = [econf.learner]
@@ -462,17 +624,17 @@ def _want_details(econf):
     kids = econf.settings.children
     has_intra_oracle = has.intra and (kids.intra.oracle or kids.inter.oracle)
     return (has_maxent and
-            ('mst' in econf.parser.key or 'astar' in econf.parser.key or
-             'eisner' in econf.parser.key) and
+            ('mst' in econf.parser or 'astar' in econf.parser or
+             'eisner' in econf.parser) and
             not has_intra_oracle)
 
-DETAILED_EVALUATIONS = [e for e in EVALUATIONS if _want_details(e)]
+DETAILED_EVALUATIONS = EVALUATIONS.filter(_want_details)
 """
 Any evalutions that we'd like full reports and graphs for.
 You could just set this to EVALUATIONS, but this sort of
 thing (mostly the graphs) takes time and space to build
 
-HINT: set to empty list for no graphs whatsoever
+HINT: set to [] for no graphs whatsoever
 """
 
 # WIP explicit selection of metrics
@@ -491,7 +653,7 @@ def print_evaluations():
     for econf in EVALUATIONS:
         print(econf)
         print()
-    print("\n".join(econf.key for econf in EVALUATIONS))
+    print("\n".join(EVALUATIONS.keys()))
 
 if __name__ == '__main__':
     print_evaluations()
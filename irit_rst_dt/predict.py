@@ -0,0 +1,269 @@
+# Author: Eric Kow
+# License: CeCILL-B (French BSD3-like)
+
+"""
+Parsing fresh documents with the combined models of an evaluation
+
+The documents come in as extraction fragments (the EDUs, pairings and
+named features of a single document, as `irit_rst_dt.extract` writes
+them, or the same as a JSON object, see `Document`), so that whatever
+feeds us documents does the preprocessing (segmentation, syntactic
+parses) and the feature extraction as `gather` would. We map their
+features to the columns the models were trained on (with the
+vocabulary of the latest evaluation, or the feature hasher if we hash
+features), and decode them with the combined models of a
+configuration, which `irit-rst-dt evaluate` leaves in the model store
+(see `IritHarness.model_paths`).
+
+The models, vocabulary and label set are loaded once (see
+`Predictor`), and the documents are parsed in batches: a batch is
+turned into a single datapack (as the corpus would be), then decoded
+document by document.
+"""
+
+from __future__ import print_function
+from collections import namedtuple
+from os import path as fp
+import numbers
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import scipy.sparse
+import six
+
+
+class Document(namedtuple('Document',
+                          ['edu_input', 'pairings', 'rows'])):
+    """A preprocessed document (see `extract_document`)
+
+    Parameters
+    ----------
+    edu_input: string
+        Contents of its `.edu_input` file
+    pairings: string
+        Contents of its `.pairings` file
+    rows: [[(string, float)]]
+        Named features of each of its pairings
+    """
+    @property
+    def name(self):
+        "the grouping of the document (as in its EDUs)"
+        for line in self.edu_input.splitlines():
+            fields = line.split('\t')
+            if len(fields) > 2:
+                return fields[2]
+        return None
+
+    @classmethod
+    def from_json(cls, obj):
+        """document from a (decoded) JSON object (raising ValueError
+        if it is not one)"""
+        try:
+            doc = cls(edu_input=obj['edu_input'],
+                      pairings=obj['pairings'],
+                      rows=[[(f, v) for f, v in row]
+                            for row in obj['rows']])
+        except (KeyError, TypeError, ValueError) as oops:
+            raise ValueError('not a document: {}'.format(oops))
+        if not (isinstance(doc.edu_input, six.string_types) and
+                isinstance(doc.pairings, six.string_types)):
+            raise ValueError('not a document: edu_input and pairings '
+                             'must be strings')
+        for row in doc.rows:
+            for feat, val in row:
+                if not isinstance(feat, six.string_types) or\
+                        isinstance(val, bool) or\
+                        not isinstance(val, numbers.Real):
+                    raise ValueError('not a document: bad feature '
+                                     '{!r}: {!r}'.format(feat, val))
+        return doc
+
+    @classmethod
+    def from_fragment(cls, frag_prefix):
+        "document from a fragment (see `extract.fragment_path`)"
+        from .extract import (_load_fragment)
+        with open(frag_prefix + '.edu_input') as stream:
+            edu_input = stream.read()
+        with open(frag_prefix + '.pairings') as stream:
+            pairings = stream.read()
+        return cls(edu_input=edu_input,
+                   pairings=pairings,
+                   rows=_load_fragment(frag_prefix)['rows'])
+
+
+def feature_columns(hconf):
+    """Vocabulary of the features the models of the latest evaluation
+    were trained on, and the column for a feature name (None if it is
+    not one of them)
+
+    Returns
+    -------
+    vocab: [string]
+        Name of each column (as `attelo.io.load_vocab`)
+    column: function(string) -> int or None
+    """
+    from attelo.io import (load_vocab)
+    from educe.learning.vocabulary_format import (load_vocabulary)
+    from .extract import (FeatureHasher)
+    from .local import (FEATURE_HASHING)
+
+    vocab_path = hconf.mpack_paths(False)['vocab']
+    vocab = load_vocabulary(vocab_path)
+    if FEATURE_HASHING is None:
+        return load_vocab(vocab_path), vocab.get
+    # hashed columns are named after their index when gathered, which
+    # pruning keeps when it renumbers the columns
+    hasher = FeatureHasher(FEATURE_HASHING)
+
+    def _column(feat):
+        "column of a hashed feature"
+        return vocab.get(hasher.column_name(hasher(feat)))
+    return load_vocab(vocab_path), _column
+
+
+def edges(dpack):
+    """Predicted edges of a decoded datapack
+
+    Returns
+    -------
+    edges: [(string, string, string)]
+        Source, target and label of each edge
+    """
+    from attelo.table import (UNRELATED)
+    return [(src.id, tgt.id, dpack.labels[int(lbl)])
+            for (src, tgt), lbl in zip(dpack.pairings,
+                                       dpack.graph.prediction)
+            if dpack.labels[int(lbl)] != UNRELATED]
+
+
+class Predictor(object):
+    """The combined models of a configuration, and what we need to
+    decode fresh documents with them
+
+    Parameters
+    ----------
+    hconf: IritHarness
+        Harness pointing at an evaluation (see `load_latest`)
+    key: string
+        Key of the configuration (in `EVALUATIONS`)
+    """
+    def __init__(self, hconf, key):
+        from attelo.io import (load_labels)
+        from attelo.table import (UNKNOWN)
+        from .scores import (without_graph_cache)
+
+        econf = hconf.evaluations.get(key)
+        if econf is None:
+            sys.exit("No configuration {} in EVALUATIONS".format(key))
+        cache = hconf.model_paths(econf.learner, None, econf.parser)
+        missing = sorted(d for d, p in cache.items() if not fp.exists(p))
+        if missing:
+            sys.exit("No combined {} model(s) for {}.\n"
+                     "Please run `irit-rst-dt evaluate` with it "
+                     "first".format(', '.join(missing), key))
+        self.key = key
+        self.vocab, self._column = feature_columns(hconf)
+        self.labels = [UNKNOWN] + load_labels(
+            hconf.mpack_paths(False)['features'])
+        self.parser = econf.parser.payload
+        # (the models are there, so this just loads them)
+        self.parser.fit([], [], cache=cache)
+        without_graph_cache(self.parser)
+        self._tmp_dir = tempfile.mkdtemp(prefix='irit-rst-dt-predict-')
+
+    def close(self):
+        "remove our scratch files"
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+    def _matrix(self, docs):
+        "feature matrix of some documents (in order)"
+        data, indices, indptr = [], [], [0]
+        for doc in docs:
+            for row in doc.rows:
+                xrow = {}
+                for feat, val in row:
+                    col = self._column(feat)
+                    if col is not None:
+                        xrow[col] = xrow.get(col, 0) + val
+                for col, val in sorted(xrow.items()):
+                    indices.append(col)
+                    data.append(val)
+                indptr.append(len(indices))
+        return scipy.sparse.csr_matrix((np.array(data, dtype=np.float64),
+                                        np.array(indices, dtype=np.int32),
+                                        np.array(indptr, dtype=np.int64)),
+                                       shape=(len(indptr) - 1,
+                                              len(self.vocab)))
+
+    def datapacks(self, docs):
+        """Datapack of each of a batch of documents (which must have
+        distinct names)
+
+        Returns
+        -------
+        dpacks: dict(string, DataPack)
+        """
+        # pylint: disable=protected-access
+        from attelo.io import (_process_edu_links, load_edus,
+                               load_pairings)
+        from attelo.table import (DataPack, UNKNOWN)
+        from .views import (split_multipack)
+
+        names = [d.name for d in docs]
+        if len(frozenset(names)) != len(names):
+            raise ValueError('documents with the same name in a batch')
+        prefix = fp.join(self._tmp_dir, str(os.getpid()))
+        with open(prefix + '.edu_input', 'w') as stream:
+            stream.write(''.join(d.edu_input for d in docs))
+        with open(prefix + '.pairings', 'w') as stream:
+            stream.write(''.join(d.pairings for d in docs))
+        edus, pairings = _process_edu_links(
+            load_edus(prefix + '.edu_input'),
+            load_pairings(prefix + '.pairings'))
+        data = self._matrix(docs)
+        if data.shape[0] != len(pairings):
+            raise ValueError('{} feature rows for {} pairings'.format(
+                data.shape[0], len(pairings)))
+        targets = np.full(len(pairings), self.labels.index(UNKNOWN))
+        dpack = DataPack.load(edus, pairings, data, targets,
+                              self.labels, self.vocab)
+        return split_multipack(dpack)
+
+    def parse(self, docs):
+        """Parse a batch of documents (which must have distinct names)
+
+        Returns
+        -------
+        parses: [[(string, string, string)]]
+            Predicted edges of each document (see `edges`), in order
+        """
+        if not docs:
+            return []
+        dpacks = self.datapacks(docs)
+        # (a document with a single EDU has no pairings, so no edges)
+        return [edges(self.parser.transform(dpacks[d.name]))
+                if d.name in dpacks else []
+                for d in docs]
+
+
+def distinct_batch(docs, size):
+    """Take the next batch from a list of pending documents: up to
+    `size` of them, with distinct names (the others stay pending)
+
+    Returns
+    -------
+    batch: [int]
+        Indices of the documents in the batch
+    """
+    names = set()
+    batch = []
+    for idx, doc in enumerate(docs):
+        if len(batch) >= size:
+            break
+        if doc.name not in names:
+            names.add(doc.name)
+            batch.append(idx)
+    return batch
@@ -0,0 +1,250 @@
+# Author: Eric Kow
+# License: CeCILL-B (French BSD3-like)
+
+"""
+Frequency-based feature pruning
+
+Most of the features that gather extracts only occur in a handful of
+instances, which makes for wide matrices and slow learners. Pruning
+happens in two steps:
+
+1. `irit-rst-dt prune` drops the features that occur in fewer than
+   `PRUNE_MIN_DF` instances of the training corpus, once and for all,
+   and writes the reduced features (text file, binary store and
+   vocabulary) next to the gathered ones, for `evaluate` to use
+   (see `pruned_path`)
+
+2. when fitting the models of a fold, we work out which features to
+   keep from the training part of the fold only (`training_mask`):
+   those that occur in `PRUNE_MIN_DF` training instances, and
+   optionally only the `PRUNE_MAX_FEATURES` best of them by their
+   chi² statistic with respect to the labels. The other features are
+   dropped from the training data (`masked`).
+
+The first step only rewrites the files if `PRUNE_MIN_DF` is above 1
+(see `rewrites`): with `PRUNE_MAX_FEATURES` alone, we use the gathered
+files as they are.
+
+Every feature that a fold keeps also passes the first step (it occurs
+often enough in part of the corpus, so it does in all of it), so the
+first step does not let any information out of the test part of a
+fold. We do not need to mask the test data: a feature that is always
+zero in training has a null weight (or is never split on).
+"""
+
+from __future__ import print_function
+from os import path as fp
+import itertools
+import os
+
+import numpy as np
+import scipy.sparse
+
+from .store import (CsrWriter, STORE_PARTS, load_store, store_paths)
+
+_CHUNK_ROWS = 1 << 16
+"""Number of rows of a store to work on at a time"""
+
+
+def pruned_suffix(min_df):
+    """Infix for the names of the pruned features files (None if we
+    do not prune)
+    """
+    return None if min_df is None else 'pruned-df{}'.format(min_df)
+
+
+def rewrites(min_df):
+    """If pruning with a minimum number of instances rewrites the
+    features files (not for none or 1: every feature occurs somewhere)
+    """
+    return min_df is not None and min_df > 1
+
+
+def pruned_path(core_path, min_df):
+    """Path to the pruned version of a features file
+
+    (eg. `TRAINING.pruned-df3.relations.sparse` for
+    `TRAINING.relations.sparse`)
+    """
+    ext = '.relations.sparse'
+    if not core_path.endswith(ext):
+        raise ValueError('Not a features file: ' + core_path)
+    return '{}.{}{}'.format(core_path[:-len(ext)],
+                            pruned_suffix(min_df), ext)
+
+
+# ---------------------------------------------------------------------
+# statistics
+# ---------------------------------------------------------------------
+
+
+def _chunks(matrix):
+    "The rows of a (memory-mapped) CSR matrix, a chunk at a time"
+    for start in range(0, matrix.shape[0], _CHUNK_ROWS):
+        yield start, matrix[start:start + _CHUNK_ROWS]
+
+
+def column_counts(matrices, n_features):
+    """Number of rows each column is nonzero in, over some CSR
+    matrices
+    """
+    counts = np.zeros(n_features, dtype=np.int64)
+    for matrix in matrices:
+        counts += np.bincount(matrix.indices[matrix.data != 0],
+                              minlength=n_features)
+    return counts
+
+
+def chi2_scores(matrices, targets, n_features):
+    """Chi² statistic of each column with respect to the targets
+    (as `sklearn.feature_selection.chi2`, but summed over a list of
+    matrices instead of stacking them)
+
+    The features must be nonnegative (eg. counts)
+    """
+    classes = np.unique(np.concatenate([np.asarray(t) for t in targets]))
+    observed = np.zeros((len(classes), n_features))
+    class_counts = np.zeros(len(classes))
+    for matrix, target in zip(matrices, targets):
+        rows = np.arange(len(target))
+        cols = np.searchsorted(classes, target)
+        onehot = scipy.sparse.csr_matrix((np.ones(len(target)),
+                                          (rows, cols)),
+                                         shape=(len(target), len(classes)))
+        observed += (onehot.T * matrix).toarray()
+        class_counts += np.bincount(cols, minlength=len(classes))
+    totals = observed.sum(axis=0)
+    expected = np.outer(class_counts / class_counts.sum(), totals)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stats = (observed - expected) ** 2 / expected
+    return np.nan_to_num(stats).sum(axis=0)
+
+
+def training_mask(dpacks, min_df, max_features=None):
+    """Features to keep when fitting models on some datapacks (the
+    training part of a fold)
+
+    Parameters
+    ----------
+    dpacks: [DataPack]
+    min_df: int or None
+        Minimum number of instances a feature must occur in
+    max_features: int, optional
+        Only keep this many features (the best by chi²)
+
+    Returns
+    -------
+    mask: array(bool)
+    """
+    n_features = dpacks[0].data.shape[1]
+    matrices = [d.data for d in dpacks]
+    keep = column_counts(matrices, n_features) >= (min_df or 1)
+    if max_features is not None and keep.sum() > max_features:
+        scores = chi2_scores(matrices, [d.target for d in dpacks],
+                             n_features)
+        scores[~keep] = -np.inf
+        keep = np.zeros(n_features, dtype=bool)
+        keep[np.argsort(-scores, kind='mergesort')[:max_features]] = True
+    return keep
+
+
+def masked(dpack, mask):
+    """Datapack with the features outside of the mask dropped from its
+    feature matrix (which keeps its shape, so that the models line up
+    with the test data, but only stores the entries we learn from)
+    """
+    data = dpack.data
+    keep = mask[data.indices]
+    kept = np.concatenate([[0], np.cumsum(keep)])
+    matrix = scipy.sparse.csr_matrix((data.data[keep],
+                                      data.indices[keep],
+                                      kept[data.indptr]),
+                                     shape=data.shape)
+    return dpack._replace(data=matrix)
+
+
+# ---------------------------------------------------------------------
+# pruned files
+# ---------------------------------------------------------------------
+
+
+def frequent_columns(core_path, n_features, min_df):
+    """Columns of the feature store of a features file that are
+    nonzero in at least `min_df` rows
+    """
+    matrix, _ = load_store(core_path, n_features)
+    counts = column_counts((c for _, c in _chunks(matrix)), n_features)
+    return counts >= min_df
+
+
+def _pruned_rows(matrix, target, columns):
+    """Rows of a feature store, as (column, value) lists over the
+    kept columns (renumbered), along with their targets
+    """
+    renumber = np.cumsum(columns) - 1
+    for start, chunk in _chunks(matrix):
+        for i in range(chunk.shape[0]):
+            lo, hi = chunk.indptr[i], chunk.indptr[i + 1]
+            idxs = chunk.indices[lo:hi]
+            keep = columns[idxs]
+            row = list(zip(renumber[idxs[keep]].tolist(),
+                           chunk.data[lo:hi][keep].tolist()))
+            yield row, int(target[start + i])
+
+
+def _stored(sink, pairs):
+    "Pass rows and targets through, adding them to a store"
+    for xrow, target in pairs:
+        sink.add(xrow, target)
+        yield xrow, target
+
+
+def _link(src, dst):
+    "Symlink a file to another in the same directory"
+    if fp.lexists(dst):
+        os.unlink(dst)
+    os.symlink(fp.basename(src), dst)
+
+
+def write_pruned(core_path, out_path, columns):
+    """Write the pruned version of a features file: the features
+    (text and binary store) and vocabulary restricted to some
+    columns. The EDUs, pairings and stripped features (targets only)
+    are unchanged, so we just link to them.
+
+    Parameters
+    ----------
+    core_path: filepath
+        Features file (eg. `TRAINING.relations.sparse`)
+    out_path: filepath
+        Pruned features file (see `pruned_path`)
+    columns: array(bool)
+        Columns to keep
+    """
+    from educe.learning.edu_input_format import (labels_comment,
+                                                 load_labels)
+    from educe.learning.svmlight_format import dump_svmlight_file
+    from educe.learning.vocabulary_format import (dump_vocabulary,
+                                                  load_vocabulary)
+
+    vocab = load_vocabulary(core_path + '.vocab')
+    renumber = np.cumsum(columns) - 1
+    pruned_vocab = dict((f, int(renumber[j])) for f, j in vocab.items()
+                        if columns[j])
+    matrix, target = load_store(core_path, len(vocab))
+    store = CsrWriter(out_path)
+    x_pairs, y_pairs = itertools.tee(
+        _stored(store, _pruned_rows(matrix, target, columns)))
+    with open(out_path, 'wb') as stream:
+        dump_svmlight_file((x for x, _ in x_pairs),
+                           (y for _, y in y_pairs),
+                           stream,
+                           comment=labels_comment(load_labels(core_path)))
+    store.close()
+    dump_vocabulary(pruned_vocab, out_path + '.vocab')
+    for ext in ['.edu_input', '.pairings', '.stripped']:
+        _link(core_path + ext, out_path + ext)
+    stripped = store_paths(core_path + '.stripped')
+    pruned_stripped = store_paths(out_path + '.stripped')
+    for part in STORE_PARTS:
+        _link(stripped[part], pruned_stripped[part])
@@ -0,0 +1,381 @@
+# Author: Eric Kow
+# License: CeCILL-B (French BSD3-like)
+
+"""
+Declarative registry of evaluation configurations
+
+Building our evaluation configurations means creating learners,
+decoders and parsers (and importing scikit-learn and most of attelo
+to do so), which we would rather not do every time we start a
+command. So `local.py` declares the configurations instead: each one
+is an `EvaluationSpec`, which knows the key and settings of the
+configuration and how to build it, and the `Registry` of these specs
+only builds them when they are actually used. Listing the keys (eg.
+`irit-rst-dt preview`) builds nothing.
+
+The keys and settings of declarations and of the configurations they
+build (see `irit_rst_dt.config`) are worked out by the same functions
+here (eg. `pipeline_keys`, `intra_keys`); we still check that they
+agree when building the configurations.
+
+This module should only import lightweight modules.
+"""
+
+from collections import namedtuple
+
+import six
+
+# pylint: disable=too-few-public-methods
+
+
+def combined_key(*variants):
+    """return a key from a list of objects that have a
+    `key` field each"""
+    return '-'.join(v if isinstance(v, six.string_types) else v.key
+                    for v in variants)
+
+
+Settings = namedtuple('Settings',
+                      ['key', 'intra', 'oracle', 'children'])
+"""
+Note that the existence of a `key` field means you can feed
+this into `combined_key` if you want
+
+The settings are used for config management only, for example,
+if we want to filter in/out configurations that involve an
+oracle.
+
+Parameters
+----------
+intra: bool
+    If this config uses intra/inter decoding
+
+oracle: bool
+    If parser should be considered oracle-based
+
+children: container(Settings)
+    Any nested settings (eg. if intra/inter, this would be the
+    the settings of the intra and inter decoders)
+"""
+
+
+Pair = namedtuple('Pair', ['intra', 'inter'])
+"""Intra/inter-sentential pair of declarations (a lightweight
+`attelo.parser.intra.IntraInterPair`)"""
+
+
+def declared(key, proba=True):
+    """Decorator for functions that return a keyed learner (or
+    decoder), declaring the key and whether the learner can predict
+    probabilities without calling the function.
+
+    Example
+    -------
+    ::
+
+        @declared('maxent')
+        def attach_learner_maxent():
+            return Keyed('maxent', ...)
+    """
+    def _declare(func):
+        "annotate the function"
+        func.key = key
+        func.proba = proba
+        return func
+    return _declare
+
+
+def hyperparameters(params, **defaults):
+    """Keyword arguments for a learner: our defaults, overridden by
+    the hyperparameters passed to its factory (see `with_params`)
+    """
+    res = dict(defaults)
+    res.update(params)
+    return res
+
+
+def _param_key(params):
+    "key suffix for some hyperparameters (eg. '-C0.1-penaltyl1')"
+    return ''.join('-{}{}'.format(k, params[k]) for k in sorted(params))
+
+
+def with_params(func, **params):
+    """Declaration of a learner with some hyperparameters set, from
+    the declaration of a factory that accepts them as keyword
+    arguments. The hyperparameters are added to the key (eg.
+    `maxent-C0.1`), so that the configurations are kept apart.
+
+    Example
+    -------
+    ::
+
+        LearnerSpec(attach=with_params(attach_learner_maxent, C=0.1),
+                    label=with_params(label_learner_maxent, C=0.1))
+    """
+    key = func.key + _param_key(params)
+
+    @declared(key, func.proba)
+    def _with_params(*args):
+        "build the keyed learner (under our key)"
+        from attelo.harness.config import (Keyed)
+        return Keyed(key, func(*args, **params).payload)
+    return _with_params
+
+
+class LearnerSpec(namedtuple('LearnerSpec', ['attach', 'label'])):
+    """Declaration of an `attelo.harness.config.LearnerConfig`
+
+    Parameters
+    ----------
+    attach, label: function
+        Functions returning a keyed learner, with the `key` and
+        `proba` attributes given by the `declared` decorator
+    """
+    @property
+    def key(self):
+        "same key as the learner configuration"
+        if self.attach.key == self.label.key:
+            return self.attach.key
+        else:
+            return '{}_{}'.format(self.attach.key, self.label.key)
+
+    def build(self):
+        "build the learner configuration"
+        from attelo.harness.config import (LearnerConfig)
+        lconf = LearnerConfig(attach=self.attach(), label=self.label())
+        for decl, klearner in [(self.attach, lconf.attach),
+                               (self.label, lconf.label)]:
+            if klearner.payload.can_predict_proba != decl.proba:
+                oops = ('Learner {} is declared with proba={}, but '
+                        'can_predict_proba is {}').format(
+                            klearner.key, decl.proba,
+                            klearner.payload.can_predict_proba)
+                raise ValueError(oops)
+        return lconf
+
+
+class KeyedSpec(namedtuple('KeyedSpec', ['key', 'build'])):
+    """Declaration of a keyed object (eg. a decoder, or the parser
+    constructor and edge selection of an intra/inter configuration)
+
+    Parameters
+    ----------
+    key: string
+    build: function
+        Returns the (bare) object
+    """
+    def keyed(self):
+        "build the keyed object"
+        from attelo.harness.config import (Keyed)
+        return Keyed(self.key, self.build())
+
+
+class EvaluationSpec(namedtuple('EvaluationSpec',
+                                ['key', 'settings', 'learner', 'parser',
+                                 'builder'])):
+    """Declaration of an `attelo.harness.config.EvaluationConfig`
+
+    Parameters
+    ----------
+    key: string
+        Key of the configuration
+    settings: Settings
+        Settings of the configuration
+    learner: LearnerSpec or Pair(LearnerSpec)
+        Learner(s) of the configuration
+    parser: string
+        Key of the parser of the configuration
+    builder: function
+        Builds the configuration
+    """
+    def build(self):
+        "build the configuration"
+        econf = self.builder()
+        if econf.key != self.key:
+            oops = ('Configuration declared as {} builds as {} '
+                    '(see irit_rst_dt.registry)').format(self.key, econf.key)
+            raise ValueError(oops)
+        return econf
+
+
+JOINT_SETTINGS = 'AD.L-jnt'
+"""Settings key of the joint decoding pipelines"""
+
+POST_SETTINGS = 'AD.L-pst'
+"""Settings key of the post label pipelines"""
+
+
+def core_settings(key, learner):
+    """settings for basic pipelines (for a learner configuration or
+    its declaration)"""
+    return Settings(key=key,
+                    intra=False,
+                    oracle='oracle' in learner.key,
+                    children=None)
+
+
+def pipeline_keys(settings, learner, decoder):
+    """keys of the parser and of the configuration of a basic pipeline
+    (for configurations and declarations alike)"""
+    parser_key = combined_key(settings, decoder)
+    return parser_key, combined_key(learner, parser_key)
+
+
+def _pipeline(settings_key, builder_name, lspec, dspec):
+    "declaration for one of the basic pipelines in `config.common`"
+    settings = core_settings(settings_key, lspec)
+    parser_key, key = pipeline_keys(settings, lspec, dspec)
+
+    def _build():
+        "build the configuration"
+        from .config import common
+        builder = getattr(common, builder_name)
+        return builder(lspec.build(), dspec.keyed())
+
+    return EvaluationSpec(key=key,
+                          settings=settings,
+                          learner=lspec,
+                          parser=parser_key,
+                          builder=_build)
+
+
+def mk_joint(lspec, dspec):
+    "declare a joint decoding parser config (see `config.common`)"
+    return _pipeline(JOINT_SETTINGS, 'mk_joint', lspec, dspec)
+
+
+def mk_post(lspec, dspec):
+    "declare a post label parser config (see `config.common`)"
+    return _pipeline(POST_SETTINGS, 'mk_post', lspec, dspec)
+
+
+def primary_member(pair, primary):
+    """the intra or inter member of a pair (of configurations or
+    declarations), whichever is primary for the key"""
+    if primary == 'intra':
+        return pair.intra
+    elif primary == 'inter':
+        return pair.inter
+    else:
+        raise ValueError("'primary' should be one of intra/inter: " + primary)
+
+
+def intra_settings(kconf, primary, children):
+    """settings for the combination of a pair of configurations, given
+    the settings of the primary one and of both"""
+    return Settings(key=combined_key(kconf, primary),
+                    intra=True,
+                    oracle=primary.oracle,
+                    children=children)
+
+
+def intra_keys(kconf, primary_parser, learners):
+    """keys of the parser and of the configuration combining a pair of
+    configurations, given the parser (or its key) of the primary one
+    and the learners of both"""
+    parser_key = combined_key(kconf, primary_parser)
+    if learners.intra.key == learners.inter.key:
+        learner_key = learners.intra.key
+    else:
+        learner_key = '{}S_D{}'.format(learners.intra.key,
+                                       learners.inter.key)
+    return parser_key, combined_key(learner_key, parser_key)
+
+
+def combine_intra(especs, kconf, primary='intra', verbose=False):
+    """Declare the combination of a pair of configurations into a
+    single IntraInterParser (see `config.intra.combine_intra`)
+
+    Parameters
+    ----------
+    especs: Pair(EvaluationSpec)
+
+    kconf: KeyedSpec
+        Key and (function returning the) pair of parser constructor
+        and inter-sentential edge selection
+    """
+    espec = primary_member(especs, primary)
+    settings = intra_settings(kconf, espec.settings,
+                              Pair(intra=especs.intra.settings,
+                                   inter=especs.inter.settings))
+    learners = Pair(intra=especs.intra.learner, inter=especs.inter.learner)
+    parser_key, key = intra_keys(kconf, espec.parser, learners)
+
+    def _build():
+        "build the configuration"
+        from attelo.parser.intra import (IntraInterPair)
+        from .config.intra import combine_intra as build_intra
+        econfs = IntraInterPair(intra=especs.intra.build(),
+                                inter=especs.inter.build())
+        return build_intra(econfs, kconf.keyed(),
+                           primary=primary, verbose=verbose)
+
+    return EvaluationSpec(key=key,
+                          settings=settings,
+                          learner=learners,
+                          parser=parser_key,
+                          builder=_build)
+
+
+class Registry(object):
+    """Lazy sequence of evaluation configurations.
+
+    The declarations are only worked out when we need them (eg. for
+    their keys), and the configurations only built when we iterate
+    over the registry (or index into it). Filtered registries share
+    the configurations they build with the original, so the same
+    configuration is always the same object.
+
+    Parameters
+    ----------
+    declare: function
+        Returns the list of `EvaluationSpec`
+    """
+    def __init__(self, declare, _built=None):
+        self._declare = declare
+        self._specs = None
+        self._built = {} if _built is None else _built
+
+    @property
+    def specs(self):
+        "the declarations of the configurations"
+        if self._specs is None:
+            self._specs = list(self._declare())
+        return self._specs
+
+    def keys(self):
+        "the keys of the configurations (without building them)"
+        return [s.key for s in self.specs]
+
+    def get(self, key):
+        """The configuration with the given key (built on demand), or
+        None if there is none
+        """
+        for spec in self.specs:
+            if spec.key == key:
+                return self._build(spec)
+        return None
+
+    def filter(self, pred):
+        """The registry of the configurations whose declarations
+        satisfy a predicate
+        """
+        return Registry(lambda: [s for s in self.specs if pred(s)],
+                        _built=self._built)
+
+    def _build(self, spec):
+        "build a configuration (once)"
+        if spec.key not in self._built:
+            self._built[spec.key] = spec.build()
+        return self._built[spec.key]
+
+    def __len__(self):
+        return len(self.specs)
+
+    def __iter__(self):
+        return (self._build(s) for s in self.specs)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self._build(s) for s in self.specs[idx]]
+        return self._build(self.specs[idx])
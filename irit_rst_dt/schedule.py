@@ -0,0 +1,634 @@
+# Author: Eric Kow
+# License: CeCILL-B (French BSD3-like)
+
+"""
+Task graph for an evaluation, and the backends to run it
+
+Rather than working through the folds one at a time (or in fixed
+groups of folds on the cluster), we break an evaluation down into
+small units of work:
+
+* learn: fit the models of one configuration on the training part
+  of a fold (or on all the data for the combined models); there is
+  one such task per distinct set of models, not per configuration
+  (see `training_plan`)
+* decode: decode the test part of a fold with one configuration
+  (or a share of its documents, when there are more workers than
+  decoding jobs, see `decode_parts`)
+* collect: put together the outputs of the shares of a decode
+* report: write the report for a fold once it is fully decoded
+* test: decode and report on the test data
+
+Whichever task finishes the output of a configuration on a fold also
+appends its edge counts to the count records (see
+`irit_rst_dt.counts`), so that the scores so far can be summarised at
+any time.
+
+The local backend (`run_local`) feeds whatever tasks are ready to a
+pool of worker processes, so that idle workers pick up work from any
+fold as soon as its dependencies are done. The SLURM backend
+(`submit_slurm`) submits one job per task, with the resources its
+kind of task needs, depending only on the jobs of its own
+dependencies.
+"""
+
+from __future__ import print_function
+from collections import namedtuple
+from os import path as fp
+import math
+import multiprocessing
+import os
+import subprocess
+import sys
+import traceback
+
+import six
+from six.moves import queue
+
+from attelo.harness.parse import (delayed_decode,
+                                  post_decode)
+from attelo.harness.report import (mk_fold_report,
+                                   mk_test_report)
+from attelo.harness.util import (makedirs)
+
+from .counts import (append_record, fold_record)
+from .local import (SLURM_RESOURCES)
+from .structured import (spreads_shards)
+from .trace import (stage)
+from .util import (dead_workers, worker_count)
+from .views import (select_training)
+from .warmstart import (start_from_neighbours)
+
+# pylint: disable=too-few-public-methods
+
+
+class Task(namedtuple('Task',
+                      ['key', 'kind', 'fold', 'econf',
+                       'outputs', 'deps', 'part'])):
+    """A unit of work in an evaluation.
+
+    Parameters
+    ----------
+    key: string
+        Unique name for the task (stable across runs of the harness
+        with the same configuration)
+    kind: string
+        One of 'learn', 'decode', 'collect', 'report', 'test'
+    fold: int or None
+        Fold the task works on (None for combined models/test data)
+    econf: EvaluationConfig or None
+        Configuration the task works on (None for reports)
+    outputs: frozenset(filepath)
+        Model files the task is responsible for (learn tasks only)
+    deps: frozenset(string)
+        Keys of the tasks that must be done before this one
+    part: (int, int) or None
+        Index of the share of the test documents the task decodes, and
+        number of shares (decode tasks only; None for all of them)
+    """
+    pass
+
+
+LIVENESS_CHECK = 10
+"""How often (in seconds) the local backend checks that its workers
+are still there while it waits for a task"""
+
+
+def training_plan(hconf, fold):
+    """Work out which configurations to fit to get every model needed
+    in a fold.
+
+    Configurations often share learners (eg. the same learner with
+    different decoders or pipelines), which then share models (see
+    `IritHarness.model_paths`). We want each model to be trained by a
+    single configuration, so we assign each model to the first
+    configuration that needs it.
+
+    Returns
+    -------
+    plan: [(EvaluationConfig, frozenset(filepath), frozenset(filepath))]
+        Configurations to fit, along with the models they are
+        responsible for and all the models they need
+    owners: dict(filepath, int)
+        Index in the plan of the configuration responsible for each
+        model
+    """
+    plan = []
+    owners = {}
+    for econf in hconf.evaluations:
+        paths = frozenset(hconf.model_paths(econf.learner, fold,
+                                            econf.parser).values())
+        new = paths - frozenset(owners)
+        if new:
+            for path in new:
+                owners[path] = len(plan)
+            plan.append((econf, new, paths))
+    return plan, owners
+
+
+def _learn_key(fold, idx):
+    "name of a learn task"
+    return 'learn:{}:{}'.format(fold, idx)
+
+
+def _warm_edges(hconf, fold, plan, owners):
+    """Pairs of entries of the plan (src, dst) such that the models of
+    dst are warm-started from those of src (see
+    `IritHarness.warm_starts`)
+    """
+    res = []
+    for econf, outputs, _ in plan:
+        cache = hconf.model_paths(econf.learner, fold, econf.parser)
+        warm = hconf.warm_starts(econf.learner, fold, econf.parser)
+        for desc, spec in sorted(warm.items()):
+            if cache[desc] in outputs and spec.neighbour is not None:
+                res.append((owners[spec.neighbour.path], owners[cache[desc]]))
+    return res
+
+
+def _learn_tasks(hconf, fold):
+    """Learning tasks for a fold, along with a function giving the
+    learning tasks a set of models depends on
+
+    Besides the models they need, learning tasks wait for the ones
+    they warm-start from (which always come before them, see
+    `irit_rst_dt.warmstart.designate`), so the tasks stay in a
+    topological order
+    """
+    plan, owners = training_plan(hconf, fold)
+
+    def _deps(paths):
+        "tasks responsible for these models"
+        return frozenset(_learn_key(fold, owners[p]) for p in paths)
+
+    deps = [set(owners[p] for p in needed - outputs)
+            for _, outputs, needed in plan]
+    for src, dst in _warm_edges(hconf, fold, plan, owners):
+        deps[dst].add(src)
+    tasks = [Task(key=_learn_key(fold, i),
+                  kind='learn',
+                  fold=fold,
+                  econf=econf,
+                  outputs=outputs,
+                  deps=frozenset(_learn_key(fold, j) for j in deps[i]),
+                  part=None)
+             for i, (econf, outputs, _) in enumerate(plan)]
+    return tasks, _deps
+
+
+def _model_deps(hconf, econf, fold, deps):
+    "learn tasks a configuration depends on"
+    return deps(hconf.model_paths(econf.learner, fold,
+                                  econf.parser).values())
+
+
+def decode_parts(workers, n_decodes):
+    """Number of shares to split the test documents of each decode
+    into, so that all the workers have something to decode (eg. when
+    evaluating a single configuration on a single fold)
+    """
+    if n_decodes == 0:
+        return 1
+    return max(1, int(math.ceil(workers / float(n_decodes))))
+
+
+def _decode_tasks(fold, econf, deps, n_parts):
+    """Tasks decoding the test part of a fold with a configuration:
+    one task, or one per share of the documents and a task putting
+    their outputs together
+    """
+    key = 'decode:{}:{}'.format(fold, econf.key)
+    if n_parts == 1:
+        return [Task(key=key, kind='decode', fold=fold, econf=econf,
+                     outputs=frozenset(), deps=deps, part=None)]
+    parts = [Task(key='{}:{}'.format(key, i), kind='decode', fold=fold,
+                  econf=econf, outputs=frozenset(), deps=deps,
+                  part=(i, n_parts))
+             for i in range(n_parts)]
+    collect = Task(key=key, kind='collect', fold=fold, econf=econf,
+                   outputs=frozenset(),
+                   deps=frozenset(t.key for t in parts),
+                   part=None)
+    return parts + [collect]
+
+
+def build_graph(hconf, folds, combined=True, test=True, workers=1):
+    """Build the tasks for an evaluation.
+
+    Parameters
+    ----------
+    folds: [int]
+        Folds to learn, decode and report on
+    combined: boolean
+        Also learn the combined models
+    test: boolean
+        Also evaluate on the test data (if there is a test
+        configuration)
+    workers: int
+        Number of processes the tasks will share; if there are more
+        of them than decoding jobs, each decode is split into shares
+        of the test documents (see `decode_parts`)
+
+    Returns
+    -------
+    tasks: [Task]
+        Tasks in a topological order
+    """
+    tasks = []
+    n_parts = decode_parts(workers, len(folds) * len(hconf.evaluations))
+    for fold in folds:
+        learn_tasks, deps = _learn_tasks(hconf, fold)
+        tasks.extend(learn_tasks)
+        decode_tasks = []
+        for econf in hconf.evaluations:
+            decode_tasks.extend(
+                _decode_tasks(fold, econf,
+                              _model_deps(hconf, econf, fold, deps),
+                              n_parts))
+        tasks.extend(decode_tasks)
+        tasks.append(Task(key='report:{}'.format(fold),
+                          kind='report',
+                          fold=fold,
+                          econf=None,
+                          outputs=frozenset(),
+                          deps=frozenset(t.key for t in decode_tasks
+                                         if t.part is None),
+                          part=None))
+    if combined:
+        learn_tasks, deps = _learn_tasks(hconf, None)
+        tasks.extend(learn_tasks)
+        econf = hconf.test_evaluation
+        if test and econf is not None:
+            tasks.append(Task(key='test:{}'.format(econf.key),
+                              kind='test',
+                              fold=None,
+                              econf=econf,
+                              outputs=frozenset(),
+                              deps=_model_deps(hconf, econf, None, deps),
+                              part=None))
+    return tasks
+
+
+def levels(tasks):
+    """Group tasks by depth in the graph: level 0 tasks have no
+    dependencies, level n+1 tasks depend on level n tasks at most
+
+    Returns
+    -------
+    levels: [[Task]]
+    """
+    depth = {}
+    for task in tasks:
+        depth[task.key] = 1 + max([depth[d] for d in task.deps] or [-1])
+    res = [[] for _ in range(max(depth.values() or [-1]) + 1)]
+    for task in tasks:
+        res[depth[task.key]].append(task)
+    return res
+
+
+# ---------------------------------------------------------------------
+# running tasks
+# ---------------------------------------------------------------------
+
+
+def _staged_paths(cache):
+    """Where to fit the models of a configuration: the paths of the
+    ones already fitted, and temporary files of this process for the
+    others, which we rename into place once they are all fitted, so
+    that a fit that is killed (or that runs alongside the same one in
+    another evaluation) never leaves a partial model in the store
+    """
+    return dict((desc, path if fp.exists(path)
+                 else '{}.{}.tmp'.format(path, os.getpid()))
+                for desc, path in cache.items())
+
+
+def _learn(hconf, econf, dconf, fold):
+    """Fit (or load) the models of a configuration for a fold (as
+    `attelo.harness.parse.learn`, but tracing the fold selection,
+    which uses the fold index of the multipack if it has one, see
+    `irit_rst_dt.views`)
+    """
+    if fold is None:
+        subpacks = dconf.pack
+        parent_dir = hconf.combined_dir_path()
+    else:
+        with stage('fold selection'):
+            subpacks = select_training(dconf.pack, dconf.folds, fold)
+        parent_dir = hconf.fold_dir_path(fold)
+    makedirs(parent_dir)
+    cache = hconf.model_paths(econf.learner, fold, econf.parser)
+    print('learning ', econf.key, '...', file=sys.stderr)
+    dpacks = list(subpacks.values())
+    # (no need to select features if we are only loading the models)
+    if hconf.pruning is not None and\
+            not all(fp.exists(p) for p in cache.values()):
+        with stage('feature selection'):
+            dpacks = hconf.prune_training(dpacks)
+    targets = [d.target for d in dpacks]
+    warm = hconf.warm_starts(econf.learner, fold, econf.parser)
+    undo = start_from_neighbours(warm, cache)
+    staged = _staged_paths(cache)
+    try:
+        with stage('learn', docs=len(dpacks)):
+            econf.parser.payload.fit(dpacks, targets, cache=staged)
+        for desc, path in staged.items():
+            if path != cache[desc]:
+                os.rename(path, cache[desc])
+    finally:
+        for func in undo:
+            func()
+        for desc, path in staged.items():
+            if path != cache[desc] and fp.exists(path):
+                os.remove(path)
+
+
+def _decode_share(dconf, fold, index, count):
+    """Data configuration whose test part for a fold is only one of
+    `count` shares of its documents, balanced by how long we expect
+    them to take (decoding is cubic in the number of EDUs, so about
+    `n_pairs ** 1.5`)
+    """
+    docs = sorted((d for d, f in dconf.folds.items() if f == fold),
+                  key=lambda d: (-len(dconf.pack[d]), d))
+    loads = [0.] * count
+    mine = set()
+    for doc in docs:
+        share = loads.index(min(loads))
+        loads[share] += len(dconf.pack[doc]) ** 1.5
+        if share == index:
+            mine.add(doc)
+    folds = dict((d, f if f != fold or d in mine else None)
+                 for d, f in dconf.folds.items())
+    return dconf._replace(folds=folds)
+
+
+def _makedirs(path):
+    "create a directory that other workers may be creating too"
+    try:
+        os.makedirs(path)
+    except OSError:
+        if not fp.isdir(path):
+            raise
+
+
+def _decode(hconf, econf, dconf, fold, part=None):
+    """Decode the test part of a fold (or the test data), or just a
+    share of its documents (see `decode_parts`), in which case the
+    outputs are put together by `_collect`
+    """
+    if part is not None:
+        dconf = _decode_share(dconf, fold, *part)
+        _makedirs(fp.dirname(hconf.decode_output_path(econf, fold)))
+    with stage('fold selection'):
+        jobs = delayed_decode(hconf, dconf, econf, fold)
+    with stage('parse', docs=len(jobs)):
+        for func, args, kwargs in jobs:
+            func(*args, **kwargs)
+    if part is None:
+        post_decode(hconf, dconf, econf, fold)
+
+
+def _collect(hconf, econf, dconf, fold):
+    "Put together the outputs of the shares of a decode"
+    with stage('collect'):
+        post_decode(hconf, dconf, econf, fold)
+
+
+def _count(hconf, econf, dconf, fold):
+    """Append the edge counts of a decoded fold to the count records
+    (see `irit_rst_dt.counts`)
+    """
+    with stage('count'):
+        append_record(hconf.eval_dir,
+                      fold_record(hconf, dconf, econf, fold))
+
+
+def run_task(hconf, dconf, test_dconf, task):
+    """Do the work for a single task (in the current process)
+    """
+    config = task.econf.key if task.econf is not None else None
+    with stage('task:' + task.kind, fold=task.fold, config=config):
+        if task.kind == 'learn':
+            if all(fp.exists(p) for p in task.outputs):
+                return
+            _learn(hconf, task.econf, dconf, task.fold)
+        elif task.kind == 'decode':
+            # the models are there by now, so this just loads them
+            _learn(hconf, task.econf, dconf, task.fold)
+            _decode(hconf, task.econf, dconf, task.fold, part=task.part)
+            if task.part is None:
+                _count(hconf, task.econf, dconf, task.fold)
+        elif task.kind == 'collect':
+            _collect(hconf, task.econf, dconf, task.fold)
+            _count(hconf, task.econf, dconf, task.fold)
+        elif task.kind == 'report':
+            with stage('scoring'):
+                mk_fold_report(hconf, dconf, task.fold)
+        elif task.kind == 'test':
+            _learn(hconf, task.econf, dconf, None)
+            _decode(hconf, task.econf, test_dconf, None)
+            with stage('scoring'):
+                mk_test_report(hconf, test_dconf)
+        else:
+            raise ValueError('Unknown kind of task: ' + task.kind)
+
+
+def run_sequential(hconf, dconf, test_dconf, tasks):
+    """Run tasks one after the other in the current process (they
+    must be in a topological order)
+    """
+    for task in tasks:
+        print('[task]', task.key, file=sys.stderr)
+        run_task(hconf, dconf, test_dconf, task)
+
+
+_WORKER_STATE = {}
+"""Harness, data and tasks for the local pool workers; set before
+forking the workers so that they share the data with the parent
+instead of each receiving a copy"""
+
+
+def _run_caught(hconf, dconf, test_dconf, task):
+    """Run a task, returning its key and the error message if it
+    failed
+    """
+    try:
+        run_task(hconf, dconf, test_dconf, task)
+    except Exception:  # pylint: disable=broad-except
+        return task.key, traceback.format_exc()
+    return task.key, None
+
+
+def _run_worker_task(key):
+    """Run a task by key in a pool worker (see `_run_caught`)
+    """
+    state = _WORKER_STATE
+    return _run_caught(state['hconf'], state['dconf'], state['test_dconf'],
+                       state['tasks'][key])
+
+
+def _in_parent(task):
+    """If the local backend should run a task in its own process
+    rather than in a pool worker: learning with a structured learner
+    that spreads its shards over worker processes of its own, which
+    the (daemonic) pool workers cannot start
+    """
+    return task.kind == 'learn' and spreads_shards(task.econf.learner)
+
+
+def _error_callback(finished, key):
+    """Report a task that failed outside of `_run_worker_task` (eg.
+    its result could not be sent back)"""
+    def _callback(exc):
+        "report the error"
+        finished.put((key, repr(exc)))
+    return _callback
+
+
+def _priorities(tasks):
+    """Number of tasks (transitively) waiting on each task; we start
+    the ones that unblock the most work first
+    """
+    waiting = dict((t.key, 0) for t in tasks)
+    for task in reversed(tasks):
+        for dep in task.deps:
+            waiting[dep] += 1 + waiting[task.key]
+    return waiting
+
+
+def run_local(hconf, dconf, test_dconf, tasks, n_jobs):
+    """Run tasks on a pool of worker processes.
+
+    Tasks are submitted as soon as their dependencies are done; the
+    pool hands them to whichever worker is free, so no worker waits
+    on a slow fold while there is work elsewhere. The structured
+    learners that train their shards in parallel are fitted in the
+    current process instead (see `_in_parent`), while the pool works
+    on whatever it was given.
+
+    Parameters
+    ----------
+    n_jobs: int
+        Number of workers (-1 for one per CPU, 0 to run everything in
+        the current process, following the harness conventions)
+    """
+    if n_jobs == 0:
+        return run_sequential(hconf, dconf, test_dconf, tasks)
+    n_jobs = worker_count(n_jobs)
+    by_key = dict((t.key, t) for t in tasks)
+    priority = _priorities(tasks)
+    remaining = dict((t.key, set(t.deps)) for t in tasks)
+    finished = queue.Queue()
+    _WORKER_STATE.update(hconf=hconf, dconf=dconf, test_dconf=test_dconf,
+                         tasks=by_key)
+    pool = multiprocessing.Pool(n_jobs)
+    pids = frozenset(p.pid for p in multiprocessing.active_children())
+    running = set()
+
+    def _submit_ready():
+        "submit the tasks that have nothing left to wait for"
+        ready = sorted((k for k, deps in remaining.items() if not deps),
+                       key=lambda k: -priority[k])
+        in_parent = []
+        for key in ready:
+            del remaining[key]
+            running.add(key)
+            print('[task] start', key, file=sys.stderr)
+            if _in_parent(by_key[key]):
+                in_parent.append(key)
+                continue
+            kwargs = {}
+            if six.PY3:
+                kwargs['error_callback'] = _error_callback(finished, key)
+            pool.apply_async(_run_worker_task, (key,),
+                             callback=finished.put, **kwargs)
+        for key in in_parent:
+            finished.put(_run_caught(hconf, dconf, test_dconf,
+                                     by_key[key]))
+
+    def _next_finished():
+        "wait for a task to finish, as long as no worker dies"
+        while True:
+            try:
+                return finished.get(timeout=LIVENESS_CHECK)
+            except queue.Empty:
+                dead = dead_workers(pids)
+                if dead:
+                    sys.exit('Worker process(es) {} died while running '
+                             'some of: {}'.format(
+                                 ', '.join(str(p) for p in dead),
+                                 ', '.join(sorted(running))))
+
+    try:
+        _submit_ready()
+        for num_done in range(1, len(tasks) + 1):
+            key, error = _next_finished()
+            running.discard(key)
+            if error is not None:
+                sys.exit('Task {} failed:\n{}'.format(key, error))
+            print('[task] done {} ({}/{})'.format(key, num_done,
+                                                   len(tasks)),
+                  file=sys.stderr)
+            for deps in remaining.values():
+                deps.discard(key)
+            _submit_ready()
+    finally:
+        pool.terminate()
+        pool.join()
+        _WORKER_STATE.clear()
+
+
+# ---------------------------------------------------------------------
+# SLURM
+# ---------------------------------------------------------------------
+
+
+def slurm_task(tasks, key):
+    """The task a SLURM job should run (see `submit_slurm`)
+    """
+    for task in tasks:
+        if task.key == key:
+            return task
+    raise ValueError('No such task in the graph: ' + key)
+
+
+def submit_slurm(tasks, script, script_args, resources=None):
+    """Submit each task as a SLURM job, which only starts once the
+    jobs of its own dependencies are done (so that eg. decoding a
+    fold does not wait on the models of the other folds).
+
+    The job for a task runs `<script> <script_args> --task KEY`.
+
+    Parameters
+    ----------
+    tasks: [Task]
+        Tasks in a topological order
+    resources: dict(string, (int, string)) or None
+        CPUs and memory (as for `sbatch --mem`) to request for each
+        kind of task (default: `SLURM_RESOURCES` in local.py)
+
+    Returns
+    -------
+    job_ids: [string]
+        Ids of the submitted jobs, one per task
+    """
+    resources = SLURM_RESOURCES if resources is None else resources
+    job_ids = {}
+    for task in tasks:
+        cpus, mem = resources[task.kind]
+        cmd = ['sbatch', '--parsable',
+               '--cpus-per-task={}'.format(cpus),
+               '--mem={}'.format(mem),
+               '--job-name=irit-rst-dt-{}'.format(task.key)]
+        if task.deps:
+            cmd.append('--dependency=afterok:' +
+                       ':'.join(job_ids[d] for d in sorted(task.deps)))
+        cmd.append(script)
+        cmd.extend(script_args)
+        cmd.extend(['--task', task.key])
+        output = subprocess.check_output(cmd).decode('utf-8')
+        job_ids[task.key] = output.strip().split(';')[0]
+        print('{}: job {}'.format(task.key, job_ids[task.key]),
+              file=sys.stderr)
+    return [job_ids[t.key] for t in tasks]
@@ -0,0 +1,258 @@
+# Author: Eric Kow
+# License: CeCILL-B (French BSD3-like)
+
+"""
+Cache of attachment/label scores (and of intra-sentential parses)
+
+Many of our configurations differ only by their decoder (or decoder
+settings), and share their learners and so their models (see
+`IritHarness.model_paths`). Running the classifiers on each test
+document is the same work for all of them, so our pipelines save the
+scores they predict for each document, next to the model store and
+keyed by the models that predicted them (and by the document, along
+with the graph it comes in with), and only decode when the scores
+are already there. This makes it cheap to try many decoders
+(see `DECODER_SWEEP` in `local.py`).
+
+Likewise, the intra/inter configurations that share an intra-sentential
+parser (the same intra models and decoder) would parse every sentence
+again; they save these parses instead (see `CachedParses`), so that
+only the inter-sentential stage runs for each of them.
+"""
+
+from __future__ import print_function
+from os import path as fp
+import hashlib
+import os
+
+import numpy as np
+
+from attelo.parser import Parser
+from attelo.parser.attach import (AttachClassifierWrapper)
+from attelo.parser.label import (LabelClassifierWrapper,
+                                 SimpleLabeller)
+from attelo.parser.pipeline import (Pipeline)
+from attelo.table import (Graph)
+
+from .fingerprint import (fingerprint)
+
+SCORE_DIR = 'scores'
+"""Name of the score cache directory (next to the model store)"""
+
+PARSE_DIR = 'parses'
+"""Name of the intra-sentential parse cache directory (ditto)"""
+
+_GRAPH_FIELDS = ['prediction', 'attach', 'label']
+
+
+def score_dir_path(model_path, name=SCORE_DIR):
+    """Directory for the scores predicted by a model in the store
+    (`<data>/models/xx/<model>`, see `IritHarness.model_paths`)
+    """
+    data_dir = fp.dirname(fp.dirname(fp.dirname(model_path)))
+    return fp.join(data_dir, name)
+
+
+def _update_array(hasher, arr):
+    "add an array (and its shape and type) to a hash"
+    arr = np.ascontiguousarray(arr)
+    hasher.update('{} {}\n'.format(arr.dtype.str,
+                                    arr.shape).encode('utf-8'))
+    hasher.update(arr.tobytes())
+
+
+def _dpack_hash(dpack, nonfixed_pairs=None):
+    """Hash of what we know about the pairings of a datapack (the
+    same document may be cut into different datapacks, eg. by the
+    intra/inter parsers): their features and targets, but also the
+    graph they come in with (which the classifiers combine their
+    scores with, eg. the intra-sentential parse in an intra/inter
+    pipeline) and the pairs we may still change
+    """
+    hasher = hashlib.sha1()
+    for arr in [dpack.data.indptr, dpack.data.indices, dpack.data.data,
+                np.asarray(dpack.target)]:
+        hasher.update(np.ascontiguousarray(arr).tobytes())
+    for src, tgt in dpack.pairings:
+        hasher.update('{} {}\n'.format(src.id, tgt.id).encode('utf-8'))
+    graph = getattr(dpack, 'graph', None)
+    if graph is not None:
+        for field in _GRAPH_FIELDS:
+            hasher.update('graph {}\n'.format(field).encode('utf-8'))
+            if getattr(graph, field) is not None:
+                _update_array(hasher, getattr(graph, field))
+    if nonfixed_pairs is not None:
+        hasher.update(b'nonfixed\n')
+        _update_array(hasher, nonfixed_pairs)
+    return hasher.hexdigest()
+
+
+def _cache_dir(cache, models, name, *keys):
+    """Directory for the graphs predicted with some models (None if we
+    do not know their paths)
+    """
+    if cache is None or any(cache.get(m) is None for m in models):
+        return None
+    key = fingerprint(list(keys) + [fp.basename(cache[m]) for m in models])
+    return fp.join(score_dir_path(cache[models[0]], name), key[:2], key)
+
+
+def _cached_graph(cache_dir, dpack, compute, nonfixed_pairs=None):
+    """Datapack with the graph saved for it in a cache directory, or
+    with the graph computed for it (which we then save)
+
+    Parameters
+    ----------
+    compute: function(DataPack, nonfixed_pairs) -> DataPack
+    """
+    if cache_dir is None:
+        return compute(dpack, nonfixed_pairs)
+    path = fp.join(cache_dir,
+                   _dpack_hash(dpack, nonfixed_pairs) + '.npz')
+    if fp.exists(path):
+        with np.load(path, allow_pickle=True) as saved:
+            graph = Graph(**dict((f, saved[f] if f in saved.files
+                                  else None)
+                                 for f in _GRAPH_FIELDS))
+        return dpack.set_graph(graph)
+    dpack = compute(dpack, nonfixed_pairs)
+    if not fp.exists(cache_dir):
+        try:
+            os.makedirs(cache_dir)
+        except OSError:  # other worker got there first
+            pass
+    arrays = dict((f, getattr(dpack.graph, f)) for f in _GRAPH_FIELDS
+                  if getattr(dpack.graph, f) is not None)
+    tmp_path = '{}.{}.tmp.npz'.format(path[:-len('.npz')], os.getpid())
+    np.savez(tmp_path, **arrays)
+    os.rename(tmp_path, path)
+    return dpack
+
+
+class CachedScores(Parser):
+    """Run a sequence of scoring steps (eg. attachment and label
+    classifiers), saving the graph scores they give for each datapack
+    so that the next time we see the same datapack with the same
+    models, we can just read them back.
+
+    Parameters
+    ----------
+    steps: [(string, Parser)]
+        Scoring steps
+    models: [string]
+        Keys of the models these steps use in the `cache` argument of
+        `fit` (the scores are not cached if we don't know their paths)
+    """
+    def __init__(self, steps, models):
+        self._steps = steps
+        self._models = models
+        self._cache_dir = None
+
+    def fit(self, dpacks, targets, nonfixed_pairs=None, cache=None):
+        for _, step in self._steps:
+            step.fit(dpacks, targets, nonfixed_pairs=nonfixed_pairs,
+                     cache=cache)
+        self._cache_dir = _cache_dir(cache, self._models, SCORE_DIR)
+        return self
+
+    def _score(self, dpack, nonfixed_pairs=None):
+        "run the scoring steps"
+        for _, step in self._steps:
+            dpack = step.transform(dpack, nonfixed_pairs=nonfixed_pairs)
+        return dpack
+
+    def transform(self, dpack, nonfixed_pairs=None):
+        return _cached_graph(self._cache_dir, dpack, self._score,
+                             nonfixed_pairs)
+
+
+class CachedParses(Parser):
+    """Wrap a parser (eg. the intra-sentential parser of an intra/inter
+    configuration), saving the graph it predicts for each datapack so
+    that the configurations that share this parser (the same models
+    and settings) only parse each datapack once.
+
+    Parameters
+    ----------
+    parser: Parser
+    models: [string]
+        Keys of the models the parser uses in the `cache` argument of
+        `fit` (the parses are not cached if we don't know their paths)
+    """
+    def __init__(self, parser, models):
+        self._parser = parser
+        self._models = models
+        # the settings of the parser (eg. its decoder), worked out
+        # before it is fitted
+        self._settings = fingerprint(parser)
+        self._cache_dir = None
+
+    def fit(self, dpacks, targets, nonfixed_pairs=None, cache=None):
+        self._parser.fit(dpacks, targets, nonfixed_pairs=nonfixed_pairs,
+                         cache=cache)
+        self._cache_dir = _cache_dir(cache, self._models, PARSE_DIR,
+                                     self._settings)
+        return self
+
+    def _parse(self, dpack, nonfixed_pairs=None):
+        "run the parser"
+        return self._parser.transform(dpack, nonfixed_pairs=nonfixed_pairs)
+
+    def transform(self, dpack, nonfixed_pairs=None):
+        return _cached_graph(self._cache_dir, dpack, self._parse,
+                             nonfixed_pairs)
+
+
+class JointPipeline(Pipeline):
+    """Same as `attelo.parser.full.JointPipeline` (attachment and
+    label scores, then joint decoding), but caching the scores
+    """
+    def __init__(self, learner_attach, learner_label, decoder):
+        if not learner_attach.can_predict_proba:
+            oops = ('JointPipeline can only be used with a learner that '
+                    'can predict probabilities')
+            raise ValueError(oops)
+        scores = CachedScores(
+            [('attach weights', AttachClassifierWrapper(learner_attach)),
+             ('label weights', LabelClassifierWrapper(learner_label))],
+            ['attach', 'label'])
+        super(JointPipeline, self).__init__(steps=[('scores', scores),
+                                                   ('decoder', decoder)])
+
+
+class PostlabelPipeline(Pipeline):
+    """Same as `attelo.parser.full.PostlabelPipeline` (attachment
+    scores, decoding, then labelling of the predicted edges), but
+    caching the attachment scores
+    """
+    def __init__(self, learner_attach, learner_label, decoder):
+        scores = CachedScores(
+            [('attach weights', AttachClassifierWrapper(learner_attach))],
+            ['attach'])
+        steps = [('scores', scores),
+                 ('decoder', decoder),
+                 ('labeller', SimpleLabeller(learner_label))]
+        super(PostlabelPipeline, self).__init__(steps=steps)
+
+
+def without_graph_cache(obj, seen=None):
+    """Stop the score and parse caches within a (fitted) parser from
+    reading or saving anything, eg. for fresh documents that we will
+    not see again (see `irit_rst_dt.predict`)
+    """
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return
+    seen.add(id(obj))
+    if isinstance(obj, (CachedScores, CachedParses)):
+        obj._cache_dir = None  # pylint: disable=protected-access
+    if isinstance(obj, dict):
+        children = list(obj.values())
+    elif isinstance(obj, (list, tuple)):
+        children = list(obj)
+    elif isinstance(obj, Parser):
+        children = list(vars(obj).values())
+    else:
+        return
+    for child in children:
+        without_graph_cache(child, seen)
@@ -0,0 +1,291 @@
+# Author: Eric Kow
+# License: CeCILL-B (French BSD3-like)
+
+"""
+HTTP parse server, with micro-batching
+
+The server keeps the combined models of a configuration loaded (see
+`irit_rst_dt.predict.Predictor`) and answers:
+
+* `POST /parse`: a document (a JSON object with the `edu_input`,
+  `pairings` and `rows` of an extraction fragment, see
+  `irit_rst_dt.predict.Document`) or a list of them; the answer has
+  the predicted edges (source, target, label) of each document
+* `GET /stats`: latency statistics of the requests so far
+
+Requests are handled in their own threads, but the parsing is done by
+a single thread (the models are not meant to be shared between
+threads), which takes the pending documents in batches (see
+`Batcher`): it waits a little after the first of a batch for others
+to come in, so that under load it parses many documents at once
+rather than one request at a time.
+"""
+
+from __future__ import division, print_function
+from collections import deque
+import json
+import sys
+import threading
+import time
+import traceback
+
+from six.moves import (queue, socketserver)
+from six.moves.BaseHTTPServer import (BaseHTTPRequestHandler, HTTPServer)
+
+from .predict import (Document, distinct_batch)
+
+STATS_WINDOW = 10000
+"""Number of recent requests the latency percentiles are over"""
+
+
+class LatencyStats(object):
+    """Latencies of the requests so far (the percentiles are over the
+    most recent ones)
+
+    Parameters
+    ----------
+    window: int
+        Number of recent requests to keep
+    """
+    def __init__(self, window=STATS_WINDOW):
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.errors = 0
+        self.docs = 0
+        self.total = 0.
+
+    def add(self, seconds, docs=1, error=False):
+        "record a request (failed or not)"
+        with self._lock:
+            self._recent.append(seconds)
+            self.count += 1
+            self.errors += int(error)
+            self.docs += docs
+            self.total += seconds
+
+    def summary(self):
+        """The statistics (times in milliseconds)
+
+        Returns
+        -------
+        stats: dict(string, number)
+        """
+        with self._lock:
+            recent = sorted(self._recent)
+            res = {'requests': self.count,
+                   'errors': self.errors,
+                   'documents': self.docs,
+                   'mean_ms': (1000 * self.total / self.count
+                               if self.count else 0.)}
+        for pct in [50, 90, 99]:
+            idx = min(len(recent) - 1, int(len(recent) * pct / 100))
+            res['p{}_ms'.format(pct)] = (1000 * recent[idx] if recent
+                                         else 0.)
+        res['max_ms'] = 1000 * recent[-1] if recent else 0.
+        return res
+
+    def report(self):
+        "the statistics, on one line"
+        stats = self.summary()
+        return ('{requests} requests ({errors} failed, {documents} '
+                'documents): '
+                'mean {mean_ms:.1f} ms, p50 {p50_ms:.1f} ms, '
+                'p90 {p90_ms:.1f} ms, p99 {p99_ms:.1f} ms, '
+                'max {max_ms:.1f} ms').format(**stats)
+
+
+class _Pending(object):
+    "A request waiting for its documents to be parsed"
+    def __init__(self, docs):
+        self.docs = docs
+        self.parses = [None] * len(docs)
+        self.todo = len(docs)
+        self.error = None
+        self.done = threading.Event()
+        if not docs:
+            self.done.set()
+
+
+class Batcher(object):
+    """Parse the documents of concurrent requests in batches, in a
+    single thread
+
+    Parameters
+    ----------
+    predictor: Predictor
+    batch_size: int
+        Most documents in a batch
+    batch_wait: float
+        How long (in seconds) to wait for more documents once a batch
+        has its first one
+    """
+    def __init__(self, predictor, batch_size=16, batch_wait=0.005):
+        self.predictor = predictor
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def parse(self, docs):
+        """Parse some documents (blocking until they are done)
+
+        Returns
+        -------
+        parses: [[(string, string, string)]]
+        """
+        pending = _Pending(docs)
+        if docs:
+            self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.parses
+
+    def _gather(self, items):
+        """Documents for the next batch: those left from the previous
+        one, and whatever comes in until the batch is full or we have
+        waited long enough
+        """
+        if not items:
+            pending = self._queue.get()
+            items.extend((pending, i) for i in range(len(pending.docs)))
+        deadline = time.time() + self.batch_wait
+        while len(items) < self.batch_size:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                pending = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            items.extend((pending, i) for i in range(len(pending.docs)))
+        return items
+
+    def _run(self):
+        "parse batches until the process ends"
+        items = []
+        while True:
+            items = self._gather(items)
+            idxs = distinct_batch([p.docs[i] for p, i in items],
+                                  self.batch_size)
+            batch = [items[j] for j in idxs]
+            taken = frozenset(idxs)
+            items = [x for j, x in enumerate(items) if j not in taken]
+            docs = [p.docs[i] for p, i in batch]
+            try:
+                parses = self.predictor.parse(docs)
+            except Exception:  # pylint: disable=broad-except
+                # one bad document: parse them one at a time so that
+                # only its request fails (as `batch.parse_batch` does)
+                parses = None
+            for k, (pending, i) in enumerate(batch):
+                if parses is not None:
+                    pending.parses[i] = parses[k]
+                elif pending.error is None:
+                    try:
+                        pending.parses[i] = self.predictor.parse(
+                            [docs[k]])[0]
+                    except Exception as oops:  # pylint: disable=broad-except
+                        traceback.print_exc()
+                        pending.error = oops
+                pending.todo -= 1
+                if pending.todo == 0 or pending.error is not None:
+                    pending.done.set()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    "HTTP requests (see the module documentation)"
+
+    def _reply(self, code, obj):
+        "send a JSON answer"
+        body = json.dumps(obj).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        "statistics"
+        if self.path.rstrip('/') != '/stats':
+            self._reply(404, {'error': 'not found: ' + self.path})
+            return
+        self._reply(200, self.server.stats.summary())
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        "parse requests"
+        start = time.time()
+        if self.path.rstrip('/') != '/parse':
+            self._reply(404, {'error': 'not found: ' + self.path})
+            return
+        code, res, docs = self._parse()
+        self._reply(code, res)
+        self.server.add_latency(time.time() - start, docs,
+                                error=code != 200)
+
+    def _parse(self):
+        """answer to a parse request
+
+        Returns
+        -------
+        code: int
+        answer: object
+        docs: int
+            Number of documents in the request
+        """
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            obj = json.loads(self.rfile.read(length).decode('utf-8'))
+        except ValueError as oops:
+            return 400, {'error': str(oops)}, 0
+        if not isinstance(obj, (dict, list)):
+            return 400, {'error': 'not a document or list of documents'}, 0
+        single = isinstance(obj, dict)
+        try:
+            docs = [Document.from_json(x)
+                    for x in ([obj] if single else obj)]
+        except ValueError as oops:
+            return 400, {'error': str(oops)}, 0
+        try:
+            parses = self.server.batcher.parse(docs)
+        except ValueError as oops:
+            return 400, {'error': str(oops)}, len(docs)
+        except Exception as oops:  # pylint: disable=broad-except
+            return 500, {'error': str(oops)}, len(docs)
+        res = [{'name': d.name, 'edges': p} for d, p in zip(docs, parses)]
+        return 200, (res[0] if single else res), len(docs)
+
+    def log_message(self, *args):
+        "(the latency statistics are enough)"
+        pass
+
+
+class ParseServer(socketserver.ThreadingMixIn, HTTPServer):
+    """HTTP parse server
+
+    Parameters
+    ----------
+    address: (string, int)
+        Host and port to listen on
+    batcher: Batcher
+    stats_every: int
+        Print the latency statistics every so many requests (0 for
+        never)
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, batcher, stats_every=1000):
+        HTTPServer.__init__(self, address, _Handler)
+        self.batcher = batcher
+        self.stats = LatencyStats()
+        self.stats_every = stats_every
+
+    def add_latency(self, seconds, docs, error=False):
+        "record a request (and print the statistics now and then)"
+        self.stats.add(seconds, docs, error=error)
+        if self.stats_every and self.stats.count % self.stats_every == 0:
+            print(self.stats.report(), file=sys.stderr)
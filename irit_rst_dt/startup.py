@@ -0,0 +1,83 @@
+# Author: Eric Kow
+# License: CeCILL-B (French BSD3-like)
+
+"""
+Import budget of the command line
+
+Some subcommands are run many times over an experiment (eg. on the
+cluster), and some are just meant to be quick, so we do not want them
+to pay for importing scikit-learn and friends. Running ::
+
+    python -m irit_rst_dt.startup
+
+sets up the argument parser for each of the commands in `BUDGET` in a
+fresh interpreter (as `irit-rst-dt` would before running them), and
+fails if any of them imports one of the modules it should not.
+"""
+
+from __future__ import print_function
+import json
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ['sklearn', 'scipy', 'numpy', 'attelo', 'educe']
+"""Modules that are slow to import"""
+
+BUDGET = [
+    (['--help'], HEAVY_MODULES),
+    (['clean'], HEAVY_MODULES),
+    (['preview'], HEAVY_MODULES),
+    (['profile'], HEAVY_MODULES),
+    (['summary'], HEAVY_MODULES),
+]
+"""Command line arguments, and the modules they should not import"""
+
+_PROBE = '''
+import json, sys
+from irit_rst_dt.cmd import mk_argparser
+mk_argparser(json.loads(sys.argv[1]))
+print(json.dumps(sorted(sys.modules)))
+'''
+
+
+def imported_modules(argv):
+    """Modules loaded when setting up the harness for the given
+    command line arguments (in a fresh interpreter)
+
+    Returns
+    -------
+    modules: [string]
+    seconds: float
+        How long it took
+    """
+    start = time.time()
+    output = subprocess.check_output([sys.executable, '-c', _PROBE,
+                                      json.dumps(argv)])
+    return json.loads(output.decode('utf-8')), time.time() - start
+
+
+def over_budget(modules, forbidden):
+    """Forbidden (top-level) modules among the imported ones
+    """
+    loaded = frozenset(m.split('.')[0] for m in modules)
+    return sorted(loaded & frozenset(forbidden))
+
+
+def main():
+    "check the import budget of each command"
+    failed = False
+    for argv, forbidden in BUDGET:
+        modules, seconds = imported_modules(argv)
+        bad = over_budget(modules, forbidden)
+        status = 'FAIL' if bad else 'ok'
+        print('{:<4} irit-rst-dt {:<20} {:.2f}s {}'.format(
+            status, ' '.join(argv), seconds,
+            'imports ' + ', '.join(bad) if bad else ''))
+        failed = failed or bool(bad)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+# Author: Eric Kow
+# License: CeCILL-B (French BSD3-like)
+
+"""
+Binary, memory-mappable feature store
+
+This is an alternative to the svmlight text files that gather
+produces: the feature matrix is kept as the three arrays of its CSR
+representation (data, indices, indptr), along with the targets, each
+in a numpy `.npy` file next to `<corpus>.relations.sparse`. Loading
+it is just a matter of memory-mapping these files, so all the
+evaluation workers on a machine share one page-cached copy instead of
+each parsing the text file.
+
+The EDU, pairings, vocabulary files and the labels (header of the
+svmlight file) are shared with the text format.
+"""
+
+from __future__ import print_function
+from os import path as fp
+import os
+
+import numpy as np
+import scipy.sparse
+
+STORE_PARTS = ['data', 'indices', 'indptr', 'target']
+"""Arrays that make up a store"""
+
+_TMP_DTYPES = {
+    'data': np.float64,
+    'indices': np.int64,
+    'indptr': np.int64,
+    'target': np.float64,
+}
+"""Types of the arrays while we write them; indices are narrowed
+down to 32 bits on closing if they fit (as scipy would)"""
+
+_COPY_CHUNK = 1 << 24
+"""Number of items to copy at a time when finalising arrays"""
+
+
+def store_paths(core_path):
+    """Paths to the arrays of a store for a given features file
+    (eg. `TRAINING.relations.sparse`)
+    """
+    return dict((k, '{}.{}.npy'.format(core_path, k))
+                for k in STORE_PARTS)
+
+
+def has_store(core_path):
+    "True if there is a complete store for this features file"
+    return all(fp.exists(p) for p in store_paths(core_path).values())
+
+
+class CsrWriter(object):
+    """Write a sparse matrix to a store one row at a time, so that
+    we never need to hold it in memory.
+
+    Arrays are first streamed to raw temporary files, then turned
+    into `.npy` files when the writer is closed.
+    """
+    def __init__(self, core_path):
+        self._paths = store_paths(core_path)
+        self._streams = dict((k, open(p + '.tmp', 'wb'))
+                             for k, p in self._paths.items())
+        self._nnz = 0
+        self._write('indptr', [0])
+
+    def _write(self, part, values):
+        "append some values to one of the arrays"
+        np.asarray(values, dtype=_TMP_DTYPES[part]).tofile(
+            self._streams[part])
+
+    def add(self, row, target):
+        """Append a row.
+
+        Parameters
+        ----------
+        row: [(int, float)]
+            (column, value) pairs for the nonzero cells of the row
+        target: int
+            Target for this row
+        """
+        self._write('indices', [j for j, _ in row])
+        self._write('data', [v for _, v in row])
+        self._nnz += len(row)
+        self._write('indptr', [self._nnz])
+        self._write('target', [target])
+
+    def close(self):
+        "Write out the final arrays"
+        for stream in self._streams.values():
+            stream.close()
+        small = self._nnz <= np.iinfo(np.int32).max
+        for part, path in self._paths.items():
+            dtype = _TMP_DTYPES[part]
+            if part in ['indices', 'indptr'] and small:
+                dtype = np.int32
+            _finalise(path + '.tmp', path, _TMP_DTYPES[part], dtype)
+
+
+def _finalise(tmp_path, path, tmp_dtype, dtype):
+    "Copy a raw array into an `.npy` file (by chunks)"
+    size = fp.getsize(tmp_path) // np.dtype(tmp_dtype).itemsize
+    out = np.lib.format.open_memmap(path, mode='w+',
+                                    dtype=dtype, shape=(size,))
+    if size:
+        raw = np.memmap(tmp_path, dtype=tmp_dtype, mode='r')
+        for start in range(0, size, _COPY_CHUNK):
+            end = min(size, start + _COPY_CHUNK)
+            out[start:end] = raw[start:end]
+        del raw
+    out.flush()
+    del out
+    os.remove(tmp_path)
+
+
+def load_store(core_path, n_features):
+    """Memory-map the feature matrix and targets of a store.
+
+    Returns
+    -------
+    data: scipy.sparse.csr_matrix
+        Feature matrix (backed by read-only memory maps)
+    target: array(float)
+        Targets
+    """
+    paths = store_paths(core_path)
+    arrays = dict((k, np.load(p, mmap_mode='r'))
+                  for k, p in paths.items())
+    nrows = len(arrays['indptr']) - 1
+    data = scipy.sparse.csr_matrix((arrays['data'],
+                                    arrays['indices'],
+                                    arrays['indptr']),
+                                   shape=(nrows, n_features),
+                                   copy=False)
+    return data, arrays['target']
+
+
+def load_multipack(edu_file, pairings_file, feature_file, vocab_file,
+                   verbose=False):
+    """Load a multipack from the store associated with a features
+    file (same signature as `attelo.io.load_multipack`, which it
+    mirrors except for the features, and for returning views rather
+    than copies, see `irit_rst_dt.views`)
+    """
+    # pylint: disable=protected-access
+    from attelo.io import (Torpor, _process_edu_links,
+                           load_edus, load_labels, load_pairings,
+                           load_vocab)
+    from attelo.table import (DataPack, UNKNOWN)
+    from .views import (split_multipack)
+
+    vocab = load_vocab(vocab_file)
+    with Torpor("Reading edus and pairings", quiet=not verbose):
+        edus, pairings = _process_edu_links(load_edus(edu_file),
+                                            load_pairings(pairings_file))
+    with Torpor("Mapping features", quiet=not verbose):
+        labels = [UNKNOWN] + load_labels(feature_file)
+        data, targets = load_store(feature_file, len(vocab))
+    with Torpor("Build data packs", quiet=not verbose):
+        dpack = DataPack.load(edus, pairings, data, targets,
+                              labels, vocab)
+    # the datapack of each document is a view on the corpus one
+    return split_multipack(dpack)
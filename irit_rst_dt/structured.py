@@ -0,0 +1,237 @@
+# Author: Eric Kow
+# License: CeCILL-B (French BSD3-like)
+
+"""
+Structured learners trained in parallel by iterative parameter mixing
+
+The structured perceptron and passive-aggressive learners decode
+every training document on every epoch, which makes them by far our
+slowest learners (`attelo.learning.perceptron` does it on one core).
+Here, the training documents are split into a fixed number of shards;
+on each epoch, each shard starts from the current weights, makes one
+pass over its documents (decoding them and updating its own copy of
+the weights), and the weights of the shards are then averaged
+(weighted by the number of documents) into the weights for the next
+epoch (McDonald, Hall and Mann, 2010: "Distributed training
+strategies for the structured perceptron"). The shards are handed to
+a pool of worker processes.
+
+The results only depend on the number of shards, not on the number
+of workers. One shard is a serial structured learner, but not quite
+attelo's (`attelo.learning.perceptron`): the cost of a predicted tree
+is always the number of reference attachments it misses (attelo's
+"dtree" cost), the scores are never turned into probabilities (its
+`use_prob`), and the documents are visited in an order of our own.
+More shards do not give the same weights as one; `test_structured`
+(in the tests) checks that they give about as good attachments.
+"""
+
+from __future__ import print_function
+import multiprocessing
+import sys
+
+import numpy as np
+
+from attelo.learning.interface import (AttachClassifier)
+from attelo.table import (Graph, UNKNOWN, UNRELATED)
+
+from .util import (worker_count)
+
+_WORKER_STATE = {}
+"""Learner and shards for the pool workers (set before forking them,
+as in `irit_rst_dt.schedule`)"""
+
+
+def _gold_mask(dpack, target):
+    "which pairs of a datapack are attached in the reference"
+    return np.asarray(target) != dpack.label_number(UNRELATED)
+
+
+def shards(n_docs, n_shards):
+    """Split documents into contiguous shards of (nearly) equal size
+
+    Returns
+    -------
+    shards: [[int]]
+        Indices of the documents in each (non-empty) shard
+    """
+    return [list(s) for s in np.array_split(np.arange(n_docs), n_shards)
+            if len(s)]
+
+
+def spreads_shards(learner, depth=0):
+    """If a (wrapped, keyed or paired) learner trains its shards in
+    worker processes of its own, which a daemonic process (eg. a pool
+    worker of the harness) cannot start
+    """
+    if isinstance(learner, MixedStructuredLearner):
+        return learner.n_jobs != 0 and learner.n_shards > 1
+    elif depth >= 4:
+        return False
+    elif isinstance(learner, tuple):
+        # eg. keyed learners, learner configurations, intra/inter pairs
+        return any(spreads_shards(x, depth + 1) for x in learner)
+    return False
+
+
+class MixedStructuredLearner(AttachClassifier):
+    """Structured perceptron (or passive-aggressive) attachment
+    learner, trained by iterative parameter mixing
+
+    Parameters
+    ----------
+    decoder: Decoder
+        Decoder for the predicted trees of the training documents
+    n_iter: int
+        Number of epochs
+    C: float, optional
+        Aggressiveness of the passive-aggressive updates (None for
+        perceptron updates)
+    loss: string
+        Loss of the passive-aggressive updates: "hinge" (PA-I) or
+        "squared_hinge" (PA-II)
+    average: boolean
+        Use the average of the weights over all updates
+    n_shards: int
+        Number of shards of the training documents
+    n_jobs: int
+        Number of worker processes (-1 for one per CPU, 0 for none);
+        the shards are done one after the other in the current
+        process if it cannot have children (eg. in a pool worker)
+    seed: int
+        For the order of the documents within each shard
+    verbose: int
+    """
+    def __init__(self, decoder, n_iter=20, C=None, loss='hinge',
+                 average=True, n_shards=8, n_jobs=-1, seed=0, verbose=0):
+        if loss not in ['hinge', 'squared_hinge']:
+            raise ValueError('unknown loss: {}'.format(loss))
+        self.decoder = decoder
+        self.n_iter = n_iter
+        self.C = C
+        self.loss = loss
+        self.average = average
+        self.n_shards = n_shards
+        self.n_jobs = n_jobs
+        self.seed = seed
+        self.verbose = verbose
+        self.can_predict_proba = False
+        self.coef_ = None
+
+    def _predicted_mask(self, dpack, weights):
+        "which pairs of a datapack we attach with some weights"
+        unrelated = dpack.label_number(UNRELATED)
+        label_scores = np.zeros((len(dpack), len(dpack.labels)))
+        label_scores[:, dpack.label_number(UNKNOWN)] = 1.
+        graph = Graph(prediction=np.full(len(dpack), unrelated),
+                      attach=dpack.data.dot(weights),
+                      label=label_scores)
+        dpack = self.decoder.transform(dpack.set_graph(graph))
+        return np.asarray(dpack.graph.prediction) != unrelated
+
+    def _update(self, weights, dpack, gold):
+        """Update the weights for a document (in place), returning
+        the number of wrong attachments"""
+        pred = self._predicted_mask(dpack, weights)
+        errors = int((gold & ~pred).sum())
+        diff = gold.astype(np.float64) - pred
+        if not diff.any():
+            return errors
+        delta = dpack.data.T.dot(diff)
+        if self.C is None:
+            step = 1.
+        else:
+            # passive-aggressive: smallest step that separates the
+            # reference from the prediction by the number of errors
+            loss = errors - delta.dot(weights)
+            norm = delta.dot(delta)
+            if loss <= 0 or norm == 0:
+                return errors
+            if self.loss == 'hinge':
+                step = min(self.C, loss / norm)
+            else:
+                step = loss / (norm + 0.5 / self.C)
+        weights += step * delta
+        return errors
+
+    def run_shard(self, dpacks, golds, weights, seed):
+        """One pass over the documents of a shard (in random order),
+        from some weights
+
+        Returns
+        -------
+        weights: array of float
+            Weights at the end of the pass
+        total: array of float
+            Sum of the weights after each document (for averaging)
+        errors: int
+            Number of wrong attachments on the way
+        """
+        weights = weights.copy()
+        total = np.zeros_like(weights)
+        errors = 0
+        order = np.random.RandomState(seed).permutation(len(dpacks))
+        for idx in order:
+            errors += self._update(weights, dpacks[idx], golds[idx])
+            if self.average:
+                total += weights
+        return weights, total, errors
+
+    def _pool_size(self, n_shards):
+        "number of worker processes to use (0 for none)"
+        if self.n_jobs == 0 or n_shards < 2 or\
+                multiprocessing.current_process().daemon:
+            return 0
+        return min(worker_count(self.n_jobs), n_shards)
+
+    def fit(self, dpacks, targets, nonfixed_pairs=None):
+        golds = [_gold_mask(d, t) for d, t in zip(dpacks, targets)]
+        parts = shards(len(dpacks), self.n_shards)
+        sizes = np.array([len(p) for p in parts], dtype=np.float64)
+        shard_data = [([dpacks[i] for i in p], [golds[i] for i in p])
+                      for p in parts]
+        weights = np.zeros(dpacks[0].data.shape[1])
+        total = np.zeros_like(weights)
+        n_pool = self._pool_size(len(parts))
+        pool = None
+        if n_pool:
+            _WORKER_STATE.update(learner=self, shards=shard_data)
+            pool = multiprocessing.Pool(n_pool)
+        try:
+            for epoch in range(self.n_iter):
+                jobs = [(i, weights, [self.seed, epoch, i])
+                        for i in range(len(parts))]
+                if pool is None:
+                    results = [self.run_shard(shard_data[i][0],
+                                              shard_data[i][1],
+                                              start, seed)
+                               for i, start, seed in jobs]
+                else:
+                    results = pool.map(_run_worker_shard, jobs)
+                weights = sum(s * r[0] for s, r in zip(sizes, results))
+                weights /= sizes.sum()
+                total += sum(r[1] for r in results)
+                if self.verbose:
+                    errors = sum(r[2] for r in results)
+                    print('epoch {}: {} errors'.format(epoch + 1, errors),
+                          file=sys.stderr)
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+                _WORKER_STATE.clear()
+        if self.average:
+            weights = total / (self.n_iter * len(dpacks))
+        self.coef_ = weights
+        return self
+
+    def predict_score(self, dpack, nonfixed_pairs=None):
+        return dpack.data.dot(self.coef_)
+
+
+def _run_worker_shard(job):
+    "run an epoch on a shard in a pool worker"
+    idx, weights, seed = job
+    dpacks, golds = _WORKER_STATE['shards'][idx]
+    return _WORKER_STATE['learner'].run_shard(dpacks, golds, weights,
+                                              seed)
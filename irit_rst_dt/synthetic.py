@@ -0,0 +1,206 @@
+# Author: Eric Kow
+# License: CeCILL-B (French BSD3-like)
+
+"""
+Synthetic datapacks
+
+These look like what gather produces from the RST-DT (documents of
+a few dozen EDUs in sentences of a few EDUs each, every EDU attached
+to one head with a skewed label distribution, sparse binary
+features), but are made up from scratch. They are useless for
+evaluating parsers, but they let us measure how learners and decoders
+scale without the (licensed) corpus; see the `benchmark` subcommand.
+"""
+
+from __future__ import print_function
+
+import numpy as np
+import scipy.sparse
+
+MEAN_EDUS = 56
+"""Average number of EDUs in an RST-DT document"""
+
+MEAN_SENTENCE_EDUS = 2.5
+"""Average number of EDUs in an RST-DT sentence"""
+
+N_FEATURES = 20000
+"""Size of the feature space (our vocabularies are of this order
+once rare features are filtered out)"""
+
+NNZ = 60
+"""Average number of (noise) features active for a pair of EDUs"""
+
+LABELS = [
+    ('elaboration', 0.31),
+    ('attribution', 0.15),
+    ('joint', 0.13),
+    ('same-unit', 0.06),
+    ('contrast', 0.04),
+    ('explanation', 0.04),
+    ('background', 0.04),
+    ('cause', 0.03),
+    ('evaluation', 0.03),
+    ('enablement', 0.03),
+    ('temporal', 0.03),
+    ('condition', 0.02),
+    ('comparison', 0.02),
+    ('manner-means', 0.02),
+    ('summary', 0.01),
+    ('topic-comment', 0.01),
+    ('textual', 0.01),
+    ('topic-change', 0.01),
+]
+"""Coarse relation labels, with (roughly) their frequency in the
+RST-DT"""
+
+_MAX_DISTANCE = 10
+"""Distances between EDUs are bucketed beyond this"""
+
+_SIGNALS = 8
+"""Number of features that hint at each relation label"""
+
+_NOISE_BASE = 2 * (_MAX_DISTANCE + 2) + 2 + _SIGNALS * len(LABELS)
+"""First noise feature (see `_doc_features`)"""
+
+
+def _doc_edus(rng, mean_edus):
+    """Sentence number for each EDU of a document (the number of
+    EDUs is lognormally distributed, as it is in the corpus)
+    """
+    n_edus = int(rng.lognormal(np.log(mean_edus) - 0.32, 0.8))
+    n_edus = min(max(2, n_edus), 6 * mean_edus)
+    breaks = rng.random_sample(n_edus) < 1.0 / MEAN_SENTENCE_EDUS
+    breaks[0] = False
+    return np.cumsum(breaks)
+
+
+def _doc_tree(rng, sentences):
+    """Head (0 for the root, otherwise 1-based index of an EDU) and
+    label number (index in `LABELS`) for each EDU of a document
+
+    EDUs mostly attach to the previous EDU in their sentence; the
+    first EDU of a sentence attaches to the first EDU of a preceding
+    sentence, usually a close one.
+    """
+    n_edus = len(sentences)
+    starts = [i for i in range(n_edus)
+              if i == 0 or sentences[i] != sentences[i - 1]]
+    heads = np.zeros(n_edus, dtype=int)
+    for i in range(1, n_edus):
+        if sentences[i] == sentences[i - 1]:
+            heads[i] = i
+        else:
+            before = [s for s in starts if s < i]
+            back = min(len(before), rng.geometric(0.6))
+            heads[i] = before[-back] + 1
+    probs = np.array([p for _, p in LABELS])
+    labels = rng.choice(len(LABELS), size=n_edus, p=probs / probs.sum())
+    return heads, labels
+
+
+def _doc_features(rng, sentences, heads, labels, n_features, nnz):
+    """Feature matrix and label numbers (in `LABELS`, or -1 for
+    unrelated) for all the pairs of EDUs of a document (including the
+    root as source), in the order of `_doc_pairs`
+
+    The first features tell the distance, direction and sentence
+    boundaries between the EDUs; the next ones weakly hint at the
+    relation between attached EDUs; the rest is (Zipf-distributed)
+    noise.
+    """
+    n_edus = len(sentences)
+    src, tgt = _doc_pairs(n_edus)
+    n_pairs = len(src)
+    attached = heads[tgt - 1] == src
+    pair_labels = np.where(attached, labels[tgt - 1], -1)
+
+    dist = np.where(src == 0, _MAX_DISTANCE + 1,
+                    np.minimum(np.abs(tgt - src), _MAX_DISTANCE))
+    dist_feat = dist + np.where(src > tgt, _MAX_DISTANCE + 2, 0)
+    same_sent = np.where(src == 0, False,
+                         sentences[np.maximum(src, 1) - 1] ==
+                         sentences[tgt - 1])
+    sent_feat = 2 * (_MAX_DISTANCE + 2) + same_sent.astype(int)
+    signal_base = _NOISE_BASE - _SIGNALS * len(LABELS)
+
+    hinted = (attached & (rng.random_sample(n_pairs) < 0.6)) |\
+        (~attached & (rng.random_sample(n_pairs) < 0.05))
+    hint_labels = np.where(pair_labels >= 0, pair_labels,
+                           rng.randint(len(LABELS), size=n_pairs))
+    signal_feat = (signal_base + _SIGNALS * hint_labels +
+                   rng.randint(_SIGNALS, size=n_pairs))
+
+    counts = rng.poisson(nnz, size=n_pairs)
+    noise = _NOISE_BASE + (rng.zipf(1.3, size=counts.sum()) %
+                           (n_features - _NOISE_BASE))
+    rows = [np.arange(n_pairs), np.arange(n_pairs),
+            np.flatnonzero(hinted),
+            np.repeat(np.arange(n_pairs), counts)]
+    cols = [dist_feat, sent_feat, signal_feat[hinted], noise]
+    rows = np.concatenate(rows)
+    cols = np.concatenate(cols)
+    data = scipy.sparse.coo_matrix((np.ones(len(rows)), (rows, cols)),
+                                   shape=(n_pairs, n_features)).tocsr()
+    data.data[:] = 1.0  # duplicate noise features were summed
+    return data, pair_labels
+
+
+def _doc_pairs(n_edus):
+    """Source and target (0 for the root, otherwise 1-based index of
+    an EDU) of all the candidate links in a document"""
+    src, tgt = np.meshgrid(np.arange(n_edus + 1), np.arange(1, n_edus + 1),
+                           indexing='ij')
+    keep = (src != tgt).ravel()
+    return src.ravel()[keep], tgt.ravel()[keep]
+
+
+def synthetic_mpack(n_docs, mean_edus=MEAN_EDUS, n_features=N_FEATURES,
+                    nnz=NNZ, seed=0):
+    """Generate a multipack of synthetic documents.
+
+    Parameters
+    ----------
+    n_docs: int
+        Number of documents
+    mean_edus: int
+        Average number of EDUs per document
+    n_features: int
+        Size of the feature space
+    nnz: int
+        Average number of noise features for each pair of EDUs
+    seed: int
+        Random seed (the same parameters and seed give the same
+        documents)
+
+    Returns
+    -------
+    mpack: dict(string, DataPack)
+    """
+    from attelo.edu import (EDU, FAKE_ROOT)
+    from attelo.table import (DataPack, UNKNOWN, UNRELATED)
+
+    if n_features <= _NOISE_BASE:
+        raise ValueError('Need more than {} features'.format(_NOISE_BASE))
+    rng = np.random.RandomState(seed)
+    labels = [UNKNOWN, UNRELATED] + [l for l, _ in LABELS]
+    vocab = ['f{}'.format(i) for i in range(n_features)]
+    mpack = {}
+    for num in range(n_docs):
+        doc = 'synthetic-{:05d}'.format(num)
+        sentences = _doc_edus(rng, mean_edus)
+        heads, edu_labels = _doc_tree(rng, sentences)
+        data, pair_labels = _doc_features(rng, sentences, heads, edu_labels,
+                                          n_features, nnz)
+        edus = [EDU('{}_{}'.format(doc, i + 1),
+                    'edu {}'.format(i + 1),
+                    10 * i, 10 * i + 9,
+                    doc,
+                    '{}_s{}'.format(doc, sent))
+                for i, sent in enumerate(sentences)]
+        nodes = [FAKE_ROOT] + edus
+        src, tgt = _doc_pairs(len(edus))
+        pairings = [(nodes[s], nodes[t]) for s, t in zip(src, tgt)]
+        targets = np.where(pair_labels >= 0, pair_labels + 2, 1)
+        mpack[doc] = DataPack.load(edus, pairings, data, targets,
+                                   labels, vocab)
+    return mpack
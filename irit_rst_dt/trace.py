@@ -0,0 +1,186 @@
+# Author: Eric Kow
+# License: CeCILL-B (French BSD3-like)
+
+"""
+Timing and memory trace of an evaluation
+
+When a trace is started (see `start_trace`), each stage of the
+evaluation wrapped in `stage` appends a JSON record to the trace
+file, giving its wall and CPU time, the memory use of its process at
+its start and end and at its peak (see `stage`), and whatever fields
+it is tagged with (fold, configuration, number of documents...).
+Stages nest: inner stages inherit the fields of the outer ones.
+
+The trace file is shared by all the processes of an evaluation
+(workers forked from the main process inherit the active trace);
+each record is written with a single append, so they do not get
+mixed up.
+"""
+
+from __future__ import print_function
+from contextlib import contextmanager
+import json
+import os
+import resource
+import sys
+import time
+
+TRACE_FILE = 'trace.jsonl'
+"""Name of the trace file in an evaluation directory"""
+
+_ACTIVE = {'path': None, 'fields': {}}
+"""Trace file and fields of the current stage, if any"""
+
+
+def start_trace(path):
+    """Start appending stage records to the given file
+    """
+    _ACTIVE['path'] = path
+    _ACTIVE['fields'] = {}
+
+
+def stop_trace():
+    """Stop recording stages
+    """
+    _ACTIVE['path'] = None
+    _ACTIVE['fields'] = {}
+
+
+def _cpu_time():
+    "user and system CPU time of this process so far"
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _max_rss_mb():
+    "peak resident memory of this process so far, in MB"
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on Mac OS X
+    return peak / (1024.0 * 1024 if sys.platform == 'darwin' else 1024.0)
+
+
+def _rss_mb():
+    "resident memory of this process now, in MB (None if we cannot tell)"
+    try:
+        with open('/proc/self/statm') as stream:
+            pages = int(stream.read().split()[1])
+    except (IOError, OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') / (1024.0 * 1024)
+
+
+def _stage_peak_mb(rss_start, rss_end, max_start, max_end):
+    """peak resident memory during a stage, in MB: the peak of the
+    process if the stage raised it, else the most we saw at its start
+    or end (the process peak may be that of an earlier stage, eg. a
+    big learn before it in the same pool worker)
+    """
+    if max_end > max_start or rss_start is None or rss_end is None:
+        return max_end
+    return max(rss_start, rss_end)
+
+
+def _write(record):
+    "append a record to the trace"
+    line = (json.dumps(record, sort_keys=True) + '\n').encode('utf-8')
+    fd = os.open(_ACTIVE['path'], os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def stage(name, **fields):
+    """Record the time and memory used by a block of code as a stage
+    of the active trace (does nothing if there is none).
+
+    The memory is the resident memory of the process at the start and
+    end of the stage (`rss_start_mb`, `rss_end_mb`) and its peak
+    during the stage (`peak_rss_mb`): exact if the stage sets a new
+    peak for the process, else a lower bound (see `_stage_peak_mb`).
+
+    Parameters
+    ----------
+    name: string
+        Name of the stage (eg. 'datapack load', 'attach fit')
+    fields: dict
+        Extra fields for the record, eg. `fold`, `config` (key of the
+        evaluation configuration), `docs` (number of documents)
+    """
+    if _ACTIVE['path'] is None:
+        yield
+        return
+    outer = _ACTIVE['fields']
+    inner = dict(outer)
+    inner.update((k, v) for k, v in fields.items() if v is not None)
+    _ACTIVE['fields'] = inner
+    start_wall = time.time()
+    start_cpu = _cpu_time()
+    start_rss = _rss_mb()
+    start_max = _max_rss_mb()
+    try:
+        yield
+    finally:
+        _ACTIVE['fields'] = outer
+        end_rss = _rss_mb()
+        record = dict(inner)
+        record.update(stage=name,
+                      start=start_wall,
+                      wall=time.time() - start_wall,
+                      cpu=_cpu_time() - start_cpu,
+                      rss_start_mb=start_rss,
+                      rss_end_mb=end_rss,
+                      peak_rss_mb=_stage_peak_mb(start_rss, end_rss,
+                                                 start_max, _max_rss_mb()),
+                      pid=os.getpid())
+        _write(record)
+
+
+class Traced(object):
+    """Wrap an object (eg. a learner or decoder) so that calls to one
+    of its methods are recorded as a stage of the active trace.
+
+    Everything else is passed through to the wrapped object, which
+    the wrapper also passes for in type checks and when pickled (so
+    saved models are just the wrapped learners).
+    """
+    def __init__(self, inner, method, name):
+        self._inner = inner
+        self._method = method
+        self._name = name
+
+    def __getattr__(self, attr):
+        if attr in ['_inner', '_method', '_name']:
+            # not set yet (eg. when unpickling)
+            raise AttributeError(attr)
+        value = getattr(self._inner, attr)
+        if attr != self._method:
+            return value
+
+        def _traced(*args, **kwargs):
+            "call the method within a stage"
+            with stage(self._name):
+                return value(*args, **kwargs)
+        return _traced
+
+    @property
+    def __class__(self):
+        return type(self._inner)
+
+    def __reduce_ex__(self, protocol):
+        return self._inner.__reduce_ex__(protocol)
+
+    def __repr__(self):
+        return repr(self._inner)
+
+
+def read_trace(path):
+    """Records of a trace file
+
+    Returns
+    -------
+    records: [dict]
+    """
+    with open(path) as stream:
+        return [json.loads(line) for line in stream if line.strip()]
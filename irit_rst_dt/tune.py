@@ -0,0 +1,268 @@
+# Author: Eric Kow
+# License: CeCILL-B (French BSD3-like)
+
+"""
+Successive halving over learner hyperparameters
+
+Trying out hyperparameters by adding them to `local.py` means a full
+cross-validation for each value. Instead, `irit-rst-dt tune` scores a
+grid of hyperparameters with a cheap proxy (the edge F1 on a few
+folds, training on a fraction of the documents), keeps the better
+half (give or take those that are not clearly worse) and tries those
+again with twice as many folds and documents, until only a few
+survivors are left. Only these get a full cross-validation.
+
+The scores are micro-averaged over the test documents of the folds
+used so far.
+"""
+
+from __future__ import division, print_function
+from collections import namedtuple
+import itertools
+import math
+import multiprocessing
+import random
+import sys
+import traceback
+
+import numpy as np
+
+from .counts import (EdgeCounts, NO_EDGES)
+from .util import (worker_count)
+from .views import (select_testing, select_training)
+
+
+def parse_value(text):
+    """Hyperparameter value from the command line (number, boolean,
+    None or string)
+    """
+    lowered = text.lower()
+    if lowered == 'none':
+        return None
+    elif lowered in ['true', 'false']:
+        return lowered == 'true'
+    for conv in [int, float]:
+        try:
+            return conv(text)
+        except ValueError:
+            pass
+    return text
+
+
+def param_grid(params):
+    """All combinations of values for some hyperparameters
+
+    Parameters
+    ----------
+    params: [(string, [value])]
+        Values to try for each hyperparameter
+
+    Returns
+    -------
+    grid: [dict(string, value)]
+    """
+    names = [n for n, _ in params]
+    return [dict(zip(names, values)) for values in
+            itertools.product(*[v for _, v in params])]
+
+
+def edge_counts(dpack, labelled=False):
+    """Compare the edges predicted for a (decoded) datapack with the
+    gold ones
+    """
+    from attelo.table import (UNRELATED)
+    unrelated = dpack.label_number(UNRELATED)
+    predicted = np.asarray(dpack.graph.prediction)
+    gold = np.asarray(dpack.target)
+    hits = (predicted != unrelated) & (gold != unrelated)
+    if labelled:
+        hits &= predicted == gold
+    return EdgeCounts(correct=int(hits.sum()),
+                      predicted=int((predicted != unrelated).sum()),
+                      gold=int((gold != unrelated).sum()))
+
+
+def _subsample(docs, fraction, seed):
+    "a (reproducible) fraction of some documents"
+    docs = sorted(docs)
+    random.Random(seed).shuffle(docs)
+    return sorted(docs[:int(math.ceil(fraction * len(docs)))])
+
+
+def run_fold(espec, mpack, folds, fold, fraction=1., labelled=False,
+             prepare=None):
+    """Edge counts for a configuration on a fold, trained on a
+    fraction of the training documents of the fold
+
+    Parameters
+    ----------
+    espec: EvaluationSpec
+    prepare: function, optional
+        Called on the training datapacks before fitting (eg.
+        `IritHarness.prune_training`)
+    """
+    train = select_training(mpack, folds, fold)
+    test = select_testing(mpack, folds, fold)
+    dpacks = [train[d] for d in _subsample(train, fraction, fold)]
+    if prepare is not None:
+        dpacks = prepare(dpacks)
+    parser = espec.build().parser.payload
+    parser.fit(dpacks, [d.target for d in dpacks], cache=None)
+    counts = NO_EDGES
+    for doc in sorted(test):
+        counts += edge_counts(parser.transform(test[doc]),
+                              labelled=labelled)
+    return counts
+
+
+_WORKER_STATE = {}
+"""Tuner for the pool workers (set before forking them, as in
+`irit_rst_dt.schedule`)"""
+
+
+def _run_worker_job(job):
+    "run a (key, fold, fraction) job in a pool worker"
+    try:
+        return job, _WORKER_STATE['tuner'].run(*job), None
+    except Exception:  # pylint: disable=broad-except
+        return job, None, traceback.format_exc()
+
+
+class Tuner(object):
+    """Scores of configurations on some folds, worked out as needed
+    (and only once)
+
+    Parameters
+    ----------
+    especs: [EvaluationSpec]
+        Configurations to compare
+    mpack: dict(string, DataPack)
+    folds: dict(string, int)
+        Fold of each document
+    labelled: boolean
+        Score labelled edges (rather than just attachments)
+    prepare: function, optional
+        See `run_fold`
+    n_jobs: int
+        Number of worker processes (harness conventions: -1 for one
+        per CPU, 0 for none)
+    """
+    def __init__(self, especs, mpack, folds, labelled=False,
+                 prepare=None, n_jobs=0):
+        self.especs = dict((e.key, e) for e in especs)
+        self.mpack = mpack
+        self.folds = folds
+        self.fold_order = sorted(frozenset(folds.values()))
+        self.labelled = labelled
+        self.prepare = prepare
+        self.n_jobs = n_jobs
+        self._counts = {}
+
+    def run(self, key, fold, fraction):
+        "edge counts for a configuration on a fold"
+        return run_fold(self.especs[key], self.mpack, self.folds, fold,
+                        fraction=fraction, labelled=self.labelled,
+                        prepare=self.prepare)
+
+    def _run_all(self, jobs):
+        "run jobs, in a pool of workers if we have one"
+        if self.n_jobs == 0 or len(jobs) < 2:
+            for job in jobs:
+                self._counts[job] = self.run(*job)
+            return
+        _WORKER_STATE.update(tuner=self)
+        pool = multiprocessing.Pool(min(worker_count(self.n_jobs),
+                                        len(jobs)))
+        try:
+            for job, counts, error in pool.imap_unordered(_run_worker_job,
+                                                          jobs):
+                if error is not None:
+                    sys.exit('Tuning {} failed:\n{}'.format(job, error))
+                self._counts[job] = counts
+        finally:
+            pool.terminate()
+            pool.join()
+            _WORKER_STATE.clear()
+
+    def scores(self, keys, n_folds, fraction):
+        """Edge F1 of some configurations on the first few folds,
+        trained on a fraction of the documents
+
+        Returns
+        -------
+        scores: dict(string, float)
+        """
+        folds = self.fold_order[:n_folds]
+        self._run_all([(k, f, fraction) for k in keys for f in folds
+                       if (k, f, fraction) not in self._counts])
+        return dict((k, sum((self._counts[(k, f, fraction)]
+                             for f in folds), NO_EDGES).f1)
+                    for k in keys)
+
+
+Rung = namedtuple('Rung', ['folds', 'fraction', 'scores', 'kept'])
+"""Scores of the configurations still in the race for some budget
+(number of folds and fraction of the training documents), and the
+keys of those we keep"""
+
+
+def successive_halving(tuner, eta=2, min_folds=1, min_fraction=0.25,
+                       survivors=1, margin=0.01, report=None):
+    """Race configurations on growing budgets, keeping the best
+    `1/eta` of them (plus those within `margin` of the last one we
+    keep) each time, until we are down to `survivors` of them; these
+    are then scored on all folds and documents
+
+    Parameters
+    ----------
+    tuner: Tuner
+    eta: int
+        At least 2 (or we would never be done)
+    survivors: int
+        At least 1 (ditto)
+    report: function, optional
+        Called on each `Rung` as we go
+
+    Returns
+    -------
+    rungs: [Rung]
+        The last one is the full cross-validation of the survivors
+    """
+    if eta < 2:
+        raise ValueError('eta must be at least 2, not {}'.format(eta))
+    if survivors < 1:
+        raise ValueError('survivors must be at least 1, not {}'.format(
+            survivors))
+    n_folds = len(tuner.fold_order)
+    alive = sorted(tuner.especs)
+    rungs = []
+
+    def _rung(folds, fraction, kept_from):
+        "score the configurations in the race, pick the ones to keep"
+        scores = tuner.scores(alive, folds, fraction)
+        ranked = sorted(alive, key=lambda k: (-scores[k], k))
+        rung = Rung(folds=folds, fraction=fraction,
+                    scores=scores, kept=kept_from(ranked, scores))
+        rungs.append(rung)
+        if report is not None:
+            report(rung)
+        return rung.kept
+
+    for step in itertools.count():
+        if len(alive) <= survivors:
+            break
+        folds = min(n_folds, min_folds * eta ** step)
+        fraction = min(1., min_fraction * eta ** step)
+        n_kept = max(survivors, int(math.ceil(len(alive) / eta)))
+        if folds == n_folds and fraction == 1.:
+            # at full budget, there is nothing more to learn by
+            # keeping the close calls around
+            alive = _rung(folds, fraction,
+                          lambda r, _: r[:n_kept])
+        else:
+            alive = _rung(folds, fraction,
+                          lambda r, s: [k for k in r if s[k] >=
+                                        s[r[n_kept - 1]] - margin])
+    if not rungs or rungs[-1].folds < n_folds or rungs[-1].fraction < 1.:
+        _rung(n_folds, 1., lambda r, _: r)
+    return rungs
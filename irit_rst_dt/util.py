@@ -7,11 +7,10 @@ Miscellaneous utility functions
 """
 
 import itertools
+import multiprocessing
 import os
 import sys
 
-from attelo.harness.util import timestamp
-
 from .local import (HARNESS_NAME,
                     LOCAL_TMP)
 
@@ -20,6 +19,7 @@ def current_tmp():
     """
     Directory for the current run
     """
+    from attelo.harness.util import timestamp
     return os.path.join(LOCAL_TMP, timestamp())
 
 
@@ -30,12 +30,55 @@ def latest_tmp():
     return os.path.join(LOCAL_TMP, "latest")
 
 
+def subdirs(parent):
+    """
+    Subdirectories of a directory (as `attelo.harness.util.subdirs`,
+    which we avoid importing where we want to start quickly)
+    """
+    return [os.path.join(parent, f) for f in os.listdir(parent)
+            if os.path.isdir(os.path.join(parent, f))]
+
+
 def concat_i(itr):
     """
     Walk an iterable of iterables as a single one
     """
     return itertools.chain.from_iterable(itr)
 
+
+def cpu_count():
+    """
+    Number of CPUs we may run on: those this process is allowed to use
+    (eg. the allocation of a SLURM job on a bigger node) where we can
+    tell, or else all the CPUs of the machine
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return multiprocessing.cpu_count()
+
+
+def worker_count(n_jobs):
+    """
+    Number of worker processes for an `n_jobs` setting (harness
+    conventions: -1 for one per CPU, -2 for all of them but one, and
+    so on, 0 for none, ie. one process)
+    """
+    if n_jobs == 0:
+        return 1
+    elif n_jobs < 0:
+        return max(1, cpu_count() + 1 + n_jobs)
+    return n_jobs
+
+
+def dead_workers(pids):
+    """
+    Which of the pool workers we started with are gone (the pool
+    replaces a worker that is killed, eg. for running out of memory,
+    but the result of its task never comes back)
+    """
+    alive = frozenset(p.pid for p in multiprocessing.active_children())
+    return sorted(pids - alive)
+
 # ---------------------------------------------------------------------
 # config
 # ---------------------------------------------------------------------
@@ -0,0 +1,185 @@
+# Author: Eric Kow
+# License: CeCILL-B (French BSD3-like)
+
+"""
+Per-document views of a shared datapack
+
+Splitting a corpus datapack into one datapack per document (which is
+what attelo's multipacks are) normally copies the feature rows of
+every document, and the harness then picks the training and test
+documents of each fold out of these. But gather writes the pairings
+of each document in a single block, so a document is just a range of
+rows of the corpus feature matrix. Here we work out these ranges
+once, and make the datapack of each document a view on them (no copy
+of the features or targets); the documents of each fold are also
+worked out only once per fold assignment.
+
+The resulting `MultiPack` is still a dictionary from document name to
+datapack, so it can be used anywhere attelo expects a multipack.
+"""
+
+from __future__ import print_function
+from collections import defaultdict
+
+import numpy as np
+import scipy.sparse
+
+
+def row_ranges(pairings):
+    """Range of rows `(start, end)` taken up by each document in a
+    list of pairings, or None if some document is not in one block
+    """
+    from attelo.table import (groupings)
+    ranges = {}
+    for doc, idxs in groupings(pairings).items():
+        start, end = min(idxs), max(idxs) + 1
+        if end - start != len(idxs):
+            return None
+        ranges[doc] = (start, end)
+    return ranges
+
+
+def csr_rows(matrix, start, end):
+    """Rows `start` to `end` of a CSR matrix, sharing its data and
+    indices (scipy slicing copies them)
+    """
+    lo, hi = matrix.indptr[start], matrix.indptr[end]
+    # the constructor also copies slices of much larger arrays (see
+    # `scipy.sparse._sputils._prune_array`), so we fill in an empty
+    # matrix instead
+    view = scipy.sparse.csr_matrix((end - start, matrix.shape[1]),
+                                   dtype=matrix.dtype)
+    view.data = matrix.data[lo:hi]
+    view.indices = matrix.indices[lo:hi]
+    view.indptr = (np.asarray(matrix.indptr[start:end + 1]) -
+                   lo).astype(matrix.indices.dtype)
+    return view
+
+
+def _doc_edus(dpack):
+    """Function returning the EDUs of a document (the ones that
+    `DataPack.selected` would keep for its pairings)
+    """
+    by_doc = defaultdict(list)
+    for edu in dpack.edus:
+        by_doc[edu.grouping].append(edu)
+    roots = by_doc.get(None, [])
+
+    def _edus(doc, pairings):
+        "EDUs of a document"
+        wanted = frozenset(e.id for p in pairings for e in p)
+        return [e for e in roots + by_doc.get(doc, [])
+                if e.id in wanted]
+    return _edus
+
+
+def _view(dpack, edus, start, end):
+    "datapack for rows `start` to `end` of a datapack (no copies)"
+    return dpack._replace(edus=edus,
+                          pairings=dpack.pairings[start:end],
+                          data=csr_rows(dpack.data, start, end),
+                          target=dpack.target[start:end])
+
+
+class MultiPack(dict):
+    """Dictionary from document name to datapack, where each datapack
+    is a view on a range of rows of a shared one.
+
+    Parameters
+    ----------
+    shared: DataPack
+        Datapack for the whole corpus
+    ranges: dict(string, (int, int))
+        Rows of each document in the shared datapack
+    """
+    def __init__(self, shared, ranges):
+        edus = _doc_edus(shared)
+        super(MultiPack, self).__init__(
+            (doc, _view(shared, edus(doc, shared.pairings[s:e]), s, e))
+            for doc, (s, e) in ranges.items())
+        self.shared = shared
+        self.ranges = ranges
+        self._fold_docs = (None, None)
+
+    def fold_docs(self, folds):
+        """Documents of each fold (worked out once for each fold
+        assignment)
+
+        Parameters
+        ----------
+        folds: dict(string, int)
+            Fold of each document
+
+        Returns
+        -------
+        docs: dict(int, [string])
+        """
+        known, docs = self._fold_docs
+        if known is not folds:
+            docs = defaultdict(list)
+            for doc in sorted(self):
+                docs[folds[doc]].append(doc)
+            docs = dict(docs)
+            self._fold_docs = (folds, docs)
+        return docs
+
+    def training(self, folds, fold):
+        """Datapacks of the documents outside of a fold (as
+        `attelo.fold.select_training`)
+        """
+        return dict((doc, self[doc])
+                    for k, docs in self.fold_docs(folds).items()
+                    if k != fold for doc in docs)
+
+    def testing(self, folds, fold):
+        """Datapacks of the documents in a fold (as
+        `attelo.fold.select_testing`)
+        """
+        return dict((doc, self[doc])
+                    for doc in self.fold_docs(folds).get(fold, []))
+
+    def rows(self, docs):
+        """Rows of the shared datapack for some documents (eg. to
+        index its feature matrix)
+        """
+        ranges = [self.ranges[d] for d in docs]
+        if not ranges:
+            return np.zeros(0, dtype=np.intp)
+        return np.concatenate([np.arange(s, e, dtype=np.intp)
+                               for s, e in ranges])
+
+    def __reduce__(self):
+        return (MultiPack, (self.shared, self.ranges))
+
+
+def split_multipack(dpack):
+    """Split a corpus datapack into a dictionary of per-document
+    datapacks, as views if the documents are in contiguous blocks of
+    rows (or copies otherwise, as attelo would)
+    """
+    from attelo.table import (groupings)
+    ranges = row_ranges(dpack.pairings)
+    if ranges is None:
+        return dict((k, dpack.selected(idxs)) for
+                    k, idxs in groupings(dpack.pairings).items())
+    return MultiPack(dpack, ranges)
+
+
+def select_training(mpack, folds, fold):
+    """Training part of a multipack for a fold (using the fold index
+    of a `MultiPack`, if we have one)
+    """
+    if isinstance(mpack, MultiPack):
+        return mpack.training(folds, fold)
+    from attelo.fold import (select_training as attelo_select_training)
+    return attelo_select_training(mpack, folds, fold)
+
+
+def select_testing(mpack, folds, fold):
+    """Test part of a multipack for a fold (using the fold index
+    of a `MultiPack`, if we have one)
+    """
+    if isinstance(mpack, MultiPack):
+        return mpack.testing(folds, fold)
+    from attelo.fold import (select_testing as attelo_select_testing)
+    return attelo_select_testing(mpack, folds, fold)
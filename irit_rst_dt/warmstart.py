@@ -0,0 +1,293 @@
+# Author: Eric Kow
+# License: CeCILL-B (French BSD3-like)
+
+"""
+Warm-starting models from their nearest fitted neighbours
+
+Configurations often differ from one another by a single
+hyperparameter of their learner: the number of epochs, or the
+strength of the regularisation along a grid (see `irit-rst-dt tune`).
+Rather than fitting each of these models from scratch, we start from
+the fitted model of a neighbour:
+
+* the same learner with fewer epochs (the most we have), which we
+  just train for the remaining epochs, so that models at 10, 20 and
+  50 epochs cost one 50 epoch run
+* for the learners that converge to the same optimum wherever they
+  start from (see `PATH_ESTIMATORS`), the same learner with a stronger
+  regularisation (the nearest we have, in log scale), as along a
+  regularisation path; the online learners (perceptrons, SGD) would
+  merely run more epochs from there, and end up with another model
+
+This only works for the scikit-learn estimators that really carry on
+from their fitted weights when `warm_start` is set (see
+`WARM_ESTIMATORS`); other learners are always fitted from scratch.
+
+Which neighbour a model starts from is worked out from the
+configurations alone (see `designate`), before anything is fitted, and
+is part of the name of the model (see `IritHarness.model_paths`): the
+same model name always means the same weights, whatever order the
+models are fitted in. The fitting task of a model waits for the one of
+its neighbour.
+"""
+
+from __future__ import print_function
+from collections import defaultdict, namedtuple
+from os import path as fp
+import math
+import sys
+
+from .fingerprint import (fingerprint)
+
+EPOCHS = 'n_iter'
+"""Hyperparameter for the number of passes over the data"""
+
+REGULARISATION = {'C': 1}
+"""Regularisation hyperparameters, and whether they get weaker (1)
+or stronger (-1) as they grow"""
+
+WARM_ESTIMATORS = frozenset(['SGDClassifier',
+                             'Perceptron',
+                             'PassiveAggressiveClassifier',
+                             'LogisticRegression'])
+"""Estimators that continue from their `coef_` when warm-started
+(others, eg. random forests, merely have a `warm_start` parameter)"""
+
+COLD_SOLVERS = frozenset(['liblinear'])
+"""Solvers that ignore `warm_start` (the default one of
+`LogisticRegression` in the scikit-learn we use)"""
+
+PATH_ESTIMATORS = frozenset(['LogisticRegression'])
+"""Estimators that we warm-start along their regularisation (their
+solvers converge to the same optimum, whatever they start from); the
+others are only warm-started along their epochs"""
+
+_MAX_DEPTH = 4
+"""How far we look for an estimator in a (wrapped) learner"""
+
+
+class WarmSpec(namedtuple('WarmSpec', ['learner', 'family', 'params',
+                                       'neighbour'])):
+    """A model we can warm-start (or warm-start others from)
+
+    Parameters
+    ----------
+    learner: object
+        Learner (as passed to the parser)
+    family: string
+        Hash of everything the model depends on, except for the
+        hyperparameters we can warm-start along
+    params: dict(string, number)
+        Values of these hyperparameters
+    neighbour: Fitted or None
+        Model to start from (see `designate`)
+    """
+    pass
+
+
+Fitted = namedtuple('Fitted', ['path', 'params'])
+"""A model of some family (or its key), and its warm-start
+hyperparameters"""
+
+
+def _warm_startable(est):
+    "if fitting a scikit-learn estimator again picks up from its weights"
+    if type(est).__name__ not in WARM_ESTIMATORS:
+        return False
+    solver = est.get_params(deep=False).get('solver')
+    return solver not in COLD_SOLVERS
+
+
+def estimator(obj, depth=0):
+    """The scikit-learn estimator we can warm-start in a (wrapped)
+    learner, or None if there is none
+    """
+    if hasattr(obj, 'warm_start') and hasattr(obj, 'get_params'):
+        return obj if _warm_startable(obj) else None
+    elif depth >= _MAX_DEPTH or not hasattr(obj, '__dict__'):
+        return None
+    for _, val in sorted(vars(obj).items()):
+        res = estimator(val, depth + 1)
+        if res is not None:
+            return res
+    return None
+
+
+def _warm_params(est):
+    "the hyperparameters we can warm-start an estimator along"
+    if type(est).__name__ in PATH_ESTIMATORS:
+        return frozenset(REGULARISATION)
+    return frozenset([EPOCHS])
+
+
+def warm_spec(learner, *context):
+    """Warm-start description of a learner, or None if we cannot
+    warm-start it
+
+    Parameters
+    ----------
+    context: [object]
+        Anything else the model depends on (eg. the task and training
+        data)
+    """
+    est = estimator(learner)
+    if est is None:
+        return None
+    params = est.get_params(deep=False)
+    warm_params = _warm_params(est)
+    rest = dict((k, v) for k, v in params.items()
+                if k not in warm_params and k != 'warm_start')
+    family = fingerprint(type(est).__name__, rest, *context)
+    return WarmSpec(learner=learner,
+                    family=family,
+                    params=dict((k, v) for k, v in params.items()
+                                if k in warm_params),
+                    neighbour=None)
+
+
+def _distance(params, other):
+    """How far a model is from the one we want to fit, if we can
+    warm-start from it (fewer epochs first, then stronger
+    regularisation)
+    """
+    names = [k for k in sorted(frozenset(params) | frozenset(other))
+             if params.get(k) != other.get(k)]
+    if len(names) != 1:
+        return None
+    name = names[0]
+    new, old = params.get(name), other.get(name)
+    if new is None or old is None:
+        return None
+    elif name == EPOCHS and old < new:
+        return (0, new - old)
+    elif name in REGULARISATION and old > 0 and new > 0 and\
+            (new - old) * REGULARISATION[name] > 0:
+        return (1, abs(math.log(new / float(old))))
+    return None
+
+
+def nearest(params, candidates):
+    """The fitted model to warm-start from, if any
+
+    Parameters
+    ----------
+    params: dict(string, number)
+        Warm-start hyperparameters of the model we want
+    candidates: [Fitted]
+        Models of the same family
+
+    Returns
+    -------
+    fitted: Fitted or None
+    """
+    best = None
+    for cand in candidates:
+        dist = _distance(params, cand.params)
+        if dist is None:
+            continue
+        rank = (dist, cand.path)
+        if best is None or rank < best[0]:
+            best = (rank, cand)
+    return None if best is None else best[1]
+
+
+def designate(specs, owners):
+    """Pick the model each model starts from: its nearest neighbour
+    (see `nearest`) among those fitted by earlier tasks, so that
+    waiting for it keeps the tasks in a topological order
+
+    Parameters
+    ----------
+    specs: dict(string, WarmSpec)
+        Models we can warm-start, by key
+    owners: dict(string, int)
+        Index of the task that fits each model (tasks only wait for
+        earlier ones)
+
+    Returns
+    -------
+    neighbours: dict(string, string or None)
+        Key of the model each model starts from
+    """
+    families = defaultdict(list)
+    for key, spec in sorted(specs.items()):
+        families[spec.family].append(Fitted(path=key, params=spec.params))
+    res = {}
+    for key, spec in sorted(specs.items()):
+        earlier = [c for c in families[spec.family]
+                   if owners[c.path] < owners[key]]
+        cand = nearest(spec.params, earlier)
+        res[key] = None if cand is None else cand.path
+    return res
+
+
+def warm_start(learner, model, params, done):
+    """Set up a learner to carry on from the state of a fitted
+    neighbour
+
+    Parameters
+    ----------
+    learner: object
+        Learner we are about to fit
+    model: object
+        Fitted model to start from (as saved by attelo)
+    params: dict(string, number)
+        Warm-start hyperparameters of the learner
+    done: dict(string, number)
+        Warm-start hyperparameters of the fitted model
+
+    Returns
+    -------
+    undo: function
+        Puts back the hyperparameters of the learner once it is
+        fitted
+    """
+    est = estimator(learner)
+    old = estimator(model)
+    saved = est.get_params(deep=False)
+    for key, val in vars(old).items():
+        if key not in saved:
+            setattr(est, key, val)
+    changes = {'warm_start': True}
+    if EPOCHS in params and done.get(EPOCHS, params[EPOCHS]) <\
+            params[EPOCHS]:
+        changes[EPOCHS] = params[EPOCHS] - done[EPOCHS]
+    est.set_params(**changes)
+
+    def _undo():
+        "restore the hyperparameters"
+        est.set_params(**dict((k, saved[k]) for k in changes))
+    return _undo
+
+
+def start_from_neighbours(specs, cache):
+    """Warm-start the models of a configuration that are not fitted
+    yet from their neighbours
+
+    Parameters
+    ----------
+    specs: dict(string, WarmSpec)
+        Models we can warm-start (see `IritHarness.warm_starts`)
+    cache: dict(string, filepath)
+        Paths to the models (see `IritHarness.model_paths`)
+
+    Returns
+    -------
+    undo: [function]
+        To call once the configuration is fitted
+    """
+    from attelo.io import (load_model)
+    undo = []
+    for desc, spec in sorted(specs.items()):
+        if fp.exists(cache[desc]) or spec.neighbour is None:
+            continue
+        neighbour = spec.neighbour
+        if not fp.exists(neighbour.path):
+            # the task fitting it should have been done before us
+            raise IOError('{} should start from {}, which is not '
+                          'fitted'.format(desc, neighbour.path))
+        print('warm-starting', desc, 'from', fp.basename(neighbour.path),
+              file=sys.stderr)
+        undo.append(warm_start(spec.learner, load_model(neighbour.path),
+                               spec.params, neighbour.params))
+    return undo
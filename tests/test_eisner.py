@@ -0,0 +1,106 @@
+"""
+The vectorised Eisner decoder should find the best projective tree,
+as an exhaustive search over all of them does
+"""
+
+import itertools
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('attelo')
+
+from irit_rst_dt.eisner import (_LEFT, _RIGHT, _chart,  # noqa: E402
+                                eisner)
+
+
+def _is_tree(heads):
+    "every node reaches the root (node 0) by following its heads"
+    for node in range(1, len(heads)):
+        seen = set()
+        while node != 0:
+            if node in seen:
+                return False
+            seen.add(node)
+            node = heads[node]
+    return True
+
+
+def _dominates(heads, head, node):
+    "head is an ancestor of node (or node itself)"
+    while node != head and node != 0:
+        node = heads[node]
+    return node == head
+
+
+def _is_projective(heads):
+    "each arc dominates all the nodes between its ends"
+    for dep in range(1, len(heads)):
+        head = heads[dep]
+        for node in range(min(head, dep) + 1, max(head, dep)):
+            if not _dominates(heads, head, node):
+                return False
+    return True
+
+
+def _trees(size, unique_real_root):
+    "heads of all the projective trees over so many nodes"
+    for heads in itertools.product(range(size), repeat=size - 1):
+        heads = (-1,) + heads
+        if any(h == d for d, h in enumerate(heads)):
+            continue
+        if unique_real_root and heads.count(0) != 1:
+            continue
+        if _is_tree(heads) and _is_projective(heads):
+            yield heads
+
+
+def _score(scores, heads):
+    "total score of the arcs of a tree"
+    return sum(scores[h, d] for d, h in enumerate(heads) if h >= 0)
+
+
+def _best(scores, unique_real_root):
+    "best tree and its score, by exhaustive search"
+    return max(((_score(scores, t), t)
+                for t in _trees(scores.shape[0], unique_real_root)),
+               key=lambda x: x[0])
+
+
+def _matrix(rng, size):
+    "random arc scores, some of the arcs ruled out"
+    scores = rng.randn(size, size)
+    scores[rng.rand(size, size) < 0.2] = -np.inf
+    scores[:, 0] = -np.inf
+    return scores
+
+
+@pytest.mark.parametrize('unique_real_root', [True, False])
+@pytest.mark.parametrize('size', [2, 3, 4, 5, 6])
+def test_best_projective_tree(unique_real_root, size):
+    "same tree (and score) as an exhaustive search"
+    rng = np.random.RandomState(size)
+    for _ in range(20):
+        scores = _matrix(rng, size)
+        best_score, best_tree = _best(scores, unique_real_root)
+        heads = eisner(scores, unique_real_root=unique_real_root)
+        if np.isinf(best_score):
+            # no tree without a ruled out arc
+            assert np.isinf(_score(scores, heads))
+            continue
+        assert tuple(heads) == best_tree
+        assert np.isclose(_score(scores, heads), best_score)
+
+
+@pytest.mark.parametrize('size', [2, 3, 4, 5, 6])
+def test_chart_scores(size):
+    """the complete span over all the nodes, headed by the root, has
+    the score of the best tree"""
+    rng = np.random.RandomState(size)
+    for _ in range(20):
+        scores = _matrix(rng, size)
+        best_score, _ = _best(scores, False)
+        complete, _, _, _ = _chart(scores)
+        assert np.isclose(complete[_RIGHT, 0, size - 1], best_score)
+        # nothing heads the root
+        assert np.isneginf(complete[_LEFT, 0, size - 1])
@@ -0,0 +1,86 @@
+"""
+Fingerprints should tell apart objects that give different results,
+and only those
+"""
+
+import functools
+
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('six')
+enum = pytest.importorskip('enum')
+
+from irit_rst_dt.fingerprint import (fingerprint)  # noqa: E402
+
+
+class Strategy(enum.Enum):
+    "eg. `attelo.decoding.mst.MstRootStrategy`"
+    leftmost = 1
+    fake_root = 2
+
+
+class Decoder(object):
+    "settings kept in private attributes, as attelo does"
+    def __init__(self, strategy=Strategy.leftmost, use_prob=True):
+        self._strategy = strategy
+        self._use_prob = use_prob
+
+
+class Pipeline(object):
+    "settings passed on to the parent constructor"
+    def __init__(self, steps):
+        self._steps = steps
+
+
+class Joint(Pipeline):
+    "a subclass whose arguments are not attributes"
+    def __init__(self, learner, decoder):
+        super(Joint, self).__init__([('learner', learner),
+                                     ('decoder', decoder)])
+
+
+class Learner(object):
+    "fitted state in public attributes"
+    def __init__(self, n_iter=5):
+        self.n_iter = n_iter
+        self.weights = None
+
+    def fit(self):
+        "pretend to fit"
+        self.weights = [1., 2.]
+        self.n_updates = 3
+
+
+def _one(x):
+    return x
+
+
+def _two(x):
+    return x
+
+
+def test_enum_members():
+    assert fingerprint(Decoder(Strategy.leftmost)) !=\
+        fingerprint(Decoder(Strategy.fake_root))
+
+
+def test_functions():
+    assert fingerprint(_one) != fingerprint(_two)
+    assert fingerprint(functools.partial(_one, 1)) !=\
+        fingerprint(functools.partial(_one, 2))
+    assert fingerprint(lambda x: x + 1) != fingerprint(lambda x: x + 2)
+
+
+def test_nested_settings():
+    assert fingerprint(Joint(Learner(), Decoder(Strategy.leftmost))) !=\
+        fingerprint(Joint(Learner(), Decoder(Strategy.fake_root)))
+    assert fingerprint(Learner(5)) != fingerprint(Learner(10))
+
+
+def test_fitted_state():
+    learner = Learner()
+    fresh = fingerprint(learner)
+    learner.fit()
+    assert fingerprint(learner) == fresh
+    assert fingerprint(Learner()) == fresh
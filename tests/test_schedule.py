@@ -0,0 +1,120 @@
+"""
+Learning tasks only wait for earlier ones, whatever order the
+configurations they warm-start from are declared in; on SLURM, each
+task only waits for the jobs of its own dependencies
+"""
+
+from collections import namedtuple
+
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('six')
+pytest.importorskip('attelo')
+
+from irit_rst_dt import harness, schedule  # noqa: E402
+from irit_rst_dt.harness import (IritHarness)  # noqa: E402
+from irit_rst_dt.schedule import (Task, _learn_tasks, levels,  # noqa: E402
+                                  slurm_task, submit_slurm)
+
+Keyed = namedtuple('Keyed', ['key', 'payload'])
+Learners = namedtuple('Learners', ['attach', 'label'])
+Evaluation = namedtuple('Evaluation', ['key', 'learner', 'parser'])
+
+
+class Perceptron(object):
+    """just enough of a scikit-learn estimator to warm-start (named
+    after one we warm-start, see `irit_rst_dt.warmstart.WARM_ESTIMATORS`)"""
+    def __init__(self, n_iter=5, warm_start=False):
+        self.n_iter = n_iter
+        self.warm_start = warm_start
+
+    def get_params(self, deep=True):
+        "hyperparameters"
+        return {'n_iter': self.n_iter, 'warm_start': self.warm_start}
+
+
+def _evaluation(n_iter):
+    "a configuration whose attachment learner has so many epochs"
+    return Evaluation(key='perc-{}'.format(n_iter),
+                      learner=Learners(
+                          attach=Keyed('perc-{}'.format(n_iter),
+                                       Perceptron(n_iter)),
+                          label=Keyed('label', object())),
+                      parser=None)
+
+
+def _harness(monkeypatch, tmpdir, evaluations):
+    "a harness with these configurations"
+    monkeypatch.setattr(harness, 'WARM_START', True)
+    monkeypatch.setattr(IritHarness, 'evaluations',
+                        property(lambda self: evaluations))
+    hconf = IritHarness.__new__(IritHarness)
+    hconf.dataset = 'corpus'
+    hconf._fingerprints = {}
+    hconf._warm_plans = {}
+    monkeypatch.setattr(hconf, '_data_key', lambda fold: ['corpus', fold])
+    monkeypatch.setattr(hconf, 'model_dir_path', lambda: str(tmpdir))
+    return hconf
+
+
+@pytest.mark.parametrize('order', [[10, 20, 50], [50, 10, 20],
+                                   [50, 20, 10]])
+def test_warm_start_order(monkeypatch, tmpdir, order):
+    "tasks come after the ones they wait for"
+    evaluations = [_evaluation(n) for n in order]
+    hconf = _harness(monkeypatch, tmpdir, evaluations)
+    tasks, _ = _learn_tasks(hconf, 0)
+    seen = set()
+    for task in tasks:
+        assert task.deps <= seen
+        seen.add(task.key)
+    assert sum(len(l) for l in levels(tasks)) == len(tasks)
+    # each model starts from the nearest one fitted before it
+    starts = {}
+    for econf in evaluations:
+        spec = hconf.warm_starts(econf.learner, 0, None)['attach']
+        starts[econf.key] = (None if spec.neighbour is None
+                             else spec.neighbour.params['n_iter'])
+    expected = dict(('perc-{}'.format(n),
+                     max([m for m in order[:i] if m < n] or [None]))
+                    for i, n in enumerate(order))
+    assert starts == expected
+
+
+def _task(key, kind, deps=()):
+    "a task that only has a key, kind and dependencies"
+    return Task(key=key, kind=kind, fold=None, econf=None,
+                outputs=frozenset(), deps=frozenset(deps), part=None)
+
+
+def test_submit_slurm(monkeypatch):
+    "one job per task, waiting for its own dependencies only"
+    tasks = [_task('learn:0:0', 'learn'),
+             _task('learn:1:0', 'learn'),
+             _task('decode:0', 'decode', ['learn:0:0']),
+             _task('decode:1', 'decode', ['learn:1:0']),
+             _task('report:0', 'report', ['decode:0'])]
+    submitted = []
+
+    def _sbatch(cmd):
+        "pretend to submit a job"
+        submitted.append(cmd)
+        return '{};cluster\n'.format(100 + len(submitted)).encode('utf-8')
+
+    monkeypatch.setattr(schedule.subprocess, 'check_output', _sbatch)
+    resources = {'learn': (4, '16G'), 'decode': (1, '8G'),
+                 'report': (1, '2G')}
+    job_ids = submit_slurm(tasks, 'evaluate.script', ['--n-jobs', '1'],
+                           resources=resources)
+    assert job_ids == ['101', '102', '103', '104', '105']
+    deps = [[a for a in cmd if a.startswith('--dependency')]
+            for cmd in submitted]
+    assert deps == [[], [],
+                    ['--dependency=afterok:101'],
+                    ['--dependency=afterok:102'],
+                    ['--dependency=afterok:103']]
+    assert '--cpus-per-task=4' in submitted[0]
+    assert '--mem=8G' in submitted[2]
+    assert submitted[3][-2:] == ['--task', 'decode:1']
+    assert slurm_task(tasks, 'decode:1') == tasks[3]
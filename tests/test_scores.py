@@ -0,0 +1,124 @@
+"""
+The score and parse caches must not mix up parsers, or datapacks that
+only differ by the graph they come in with
+"""
+
+from collections import namedtuple
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('attelo')
+enum = pytest.importorskip('enum')
+
+from attelo.table import (Graph)  # noqa: E402
+
+from irit_rst_dt.scores import (CachedParses, CachedScores)  # noqa: E402
+
+
+class Strategy(enum.Enum):
+    "eg. `attelo.decoding.mst.MstRootStrategy`"
+    leftmost = 1
+    fake_root = 2
+
+
+class Decoder(object):
+    "a decoder with an enumerated setting"
+    def __init__(self, strategy):
+        self._strategy = strategy
+
+
+class Parser(object):
+    "an intra-sentential parser that does nothing"
+    def __init__(self, decoder):
+        self._decoder = decoder
+
+    def fit(self, dpacks, targets, nonfixed_pairs=None, cache=None):
+        "nothing to fit"
+        return self
+
+
+def _model_cache(tmpdir):
+    "paths to some models in the store"
+    return dict((k, str(tmpdir.join('models', 'ab', k + '.model')))
+                for k in ['attach', 'label'])
+
+
+def _cache_dir(tmpdir, decoder):
+    "where the parses of a parser with this decoder go"
+    cache = _model_cache(tmpdir)
+    parser = CachedParses(Parser(decoder), ['attach', 'label'])
+    parser.fit([], [], cache=cache)
+    return parser._cache_dir  # pylint: disable=protected-access
+
+
+def test_decoders_do_not_share_parses(tmpdir):
+    leftmost = _cache_dir(tmpdir, Decoder(Strategy.leftmost))
+    assert leftmost is not None
+    assert leftmost == _cache_dir(tmpdir, Decoder(Strategy.leftmost))
+    assert leftmost != _cache_dir(tmpdir, Decoder(Strategy.fake_root))
+
+
+Matrix = namedtuple('Matrix', ['indptr', 'indices', 'data'])
+Edu = namedtuple('Edu', ['id'])
+
+
+class DataPack(object):
+    "just enough of a datapack for the caches"
+    def __init__(self, data, target, pairings, graph):
+        self.data = data
+        self.target = target
+        self.pairings = pairings
+        self.graph = graph
+
+    def __len__(self):
+        return len(self.target)
+
+    def set_graph(self, graph):
+        "the same datapack with another graph"
+        return DataPack(self.data, self.target, self.pairings, graph)
+
+
+class Scorer(object):
+    """a scoring step that adds to the scores the datapack comes in
+    with, as attelo's classifier wrappers do"""
+    def __init__(self):
+        self.calls = []
+
+    def fit(self, dpacks, targets, nonfixed_pairs=None, cache=None):
+        "nothing to fit"
+        return self
+
+    def transform(self, dpack, nonfixed_pairs=None):
+        "one more than the incoming scores"
+        self.calls.append(nonfixed_pairs)
+        prior = (np.zeros(len(dpack)) if dpack.graph is None
+                 else dpack.graph.attach)
+        return dpack.set_graph(Graph(prediction=None, attach=prior + 1,
+                                     label=None))
+
+
+def test_scores_depend_on_incoming_graph(tmpdir):
+    scorer = Scorer()
+    scores = CachedScores([('attach weights', scorer)], ['attach'])
+    scores.fit([], [], cache=_model_cache(tmpdir))
+    dpack = DataPack(data=Matrix(indptr=np.array([0, 1, 2]),
+                                 indices=np.array([0, 0]),
+                                 data=np.array([1., 2.])),
+                     target=np.array([1, 2]),
+                     pairings=[(Edu('ROOT'), Edu('e1')),
+                               (Edu('e1'), Edu('e2'))],
+                     graph=None)
+    prior = dpack.set_graph(Graph(prediction=np.array([1, 1]),
+                                  attach=np.array([5., 5.]),
+                                  label=None))
+    assert list(scores.transform(dpack).graph.attach) == [1., 1.]
+    assert list(scores.transform(prior).graph.attach) == [6., 6.]
+    # the same datapack and graph again come from the cache
+    assert list(scores.transform(prior).graph.attach) == [6., 6.]
+    assert len(scorer.calls) == 2
+    # and so do the pairs we may change
+    nonfixed = np.array([1])
+    assert list(scores.transform(prior, nonfixed_pairs=nonfixed)
+                .graph.attach) == [6., 6.]
+    assert scorer.calls[-1] is nonfixed
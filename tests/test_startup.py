@@ -0,0 +1,26 @@
+"""
+The quick subcommands must not import the heavy modules (see
+`irit_rst_dt.startup`)
+"""
+
+import pytest
+
+pytest.importorskip('six')
+
+from irit_rst_dt.startup import (BUDGET, imported_modules,  # noqa: E402
+                                 over_budget)
+
+
+@pytest.mark.parametrize('argv,forbidden', BUDGET,
+                         ids=[' '.join(a) for a, _ in BUDGET])
+def test_budget(argv, forbidden):
+    "each command in the budget stays within it"
+    modules, _ = imported_modules(argv)
+    assert over_budget(modules, forbidden) == []
+
+
+@pytest.mark.parametrize('argv', [['--help'], ['preview']])
+def test_no_learning_libraries(argv):
+    "the help and preview do not need attelo, educe or scikit-learn"
+    modules, _ = imported_modules(argv)
+    assert over_budget(modules, ['attelo', 'educe', 'sklearn']) == []
@@ -0,0 +1,142 @@
+"""
+Structured learners trained on shards of the documents should attach
+about as well as the ones trained on a single shard
+"""
+
+from collections import namedtuple
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('attelo')
+
+from attelo.table import (Graph, UNKNOWN, UNRELATED)  # noqa: E402
+
+from irit_rst_dt.structured import (MixedStructuredLearner,  # noqa: E402
+                                    spreads_shards)
+
+LABELS = [UNKNOWN, UNRELATED, 'elaboration']
+N_FEATURES = 20
+
+
+class Document(object):
+    "just enough of a datapack for `MixedStructuredLearner`"
+    def __init__(self, data, targets, graph=None):
+        self.data = data
+        self.targets = targets
+        self.labels = LABELS
+        self.graph = graph
+
+    def __len__(self):
+        return len(self.targets)
+
+    @staticmethod
+    def label_number(label):
+        "index of a label"
+        return LABELS.index(label)
+
+    def set_graph(self, graph):
+        "the same document with a graph"
+        return Document(self.data, self.targets, graph)
+
+
+class Decoder(object):
+    "attach each EDU to its best scoring head"
+    @staticmethod
+    def transform(dpack):
+        "decode a document"
+        pred = np.full(len(dpack), LABELS.index(UNRELATED))
+        attach = dpack.graph.attach
+        for tgt in set(dpack.targets):
+            idxs = [i for i, t in enumerate(dpack.targets) if t == tgt]
+            pred[max(idxs, key=lambda i: attach[i])] = 2
+        return dpack.set_graph(dpack.graph._replace(prediction=pred))
+
+
+def _graph(attach):
+    "graph with attachment scores only"
+    return Graph(prediction=None, attach=attach, label=None)
+
+
+def _corpus(rng, truth, n_docs):
+    """documents (and their reference attachments) whose heads are
+    the pairs scoring best with some true weights"""
+    dpacks, targets = [], []
+    for _ in range(n_docs):
+        n_edus = rng.randint(3, 10)
+        pairs = [(s, t) for t in range(1, n_edus) for s in range(n_edus)
+                 if s != t]
+        dpack = Document(rng.randn(len(pairs), N_FEATURES),
+                         [t for _, t in pairs])
+        gold = Decoder.transform(dpack.set_graph(
+            _graph(dpack.data.dot(truth)))).graph.prediction
+        dpacks.append(dpack)
+        targets.append(gold)
+    return dpacks, targets
+
+
+def _accuracy(learner, dpacks, targets):
+    "proportion of the reference attachments we find"
+    found = total = 0
+    for dpack, gold in zip(dpacks, targets):
+        pred = Decoder.transform(dpack.set_graph(
+            _graph(learner.predict_score(dpack)))).graph.prediction
+        gold = np.asarray(gold) == 2
+        found += int((gold & (pred == 2)).sum())
+        total += int(gold.sum())
+    return found / float(total)
+
+
+@pytest.fixture(scope='module')
+def corpus():
+    "training and test documents"
+    rng = np.random.RandomState(0)
+    truth = rng.randn(N_FEATURES)
+    return _corpus(rng, truth, 200), _corpus(rng, truth, 100)
+
+
+@pytest.mark.parametrize('C,loss', [(None, 'hinge'),
+                                    (1.0, 'hinge'),
+                                    (1.0, 'squared_hinge')])
+def test_shards_attach_as_well(corpus, C, loss):
+    "a few shards lose little attachment accuracy"
+    (train, train_y), (test, test_y) = corpus
+    scores = []
+    for n_shards in [1, 8]:
+        learner = MixedStructuredLearner(Decoder(), n_iter=10, C=C,
+                                         loss=loss, n_shards=n_shards,
+                                         n_jobs=0)
+        learner.fit(train, train_y)
+        scores.append(_accuracy(learner, test, test_y))
+    assert scores[0] > 0.8
+    assert abs(scores[0] - scores[1]) < 0.02
+
+
+def test_workers_do_not_matter(corpus):
+    "the weights only depend on the number of shards"
+    (train, train_y), _ = corpus
+    weights = []
+    for n_jobs in [0, 2]:
+        learner = MixedStructuredLearner(Decoder(), n_iter=3,
+                                         n_shards=4, n_jobs=n_jobs)
+        weights.append(learner.fit(train, train_y).coef_)
+    assert np.allclose(weights[0], weights[1])
+
+
+def test_spreads_shards():
+    """the harness runs the learners spreading their shards over worker
+    processes outside of its pool"""
+    keyed = namedtuple('Keyed', ['key', 'payload'])
+    pair = namedtuple('Learners', ['attach', 'label'])
+
+    def _learners(**kwargs):
+        "keyed pair of learners"
+        return pair(keyed('struct', MixedStructuredLearner(Decoder(),
+                                                           **kwargs)),
+                    keyed('label', object()))
+
+    assert spreads_shards(_learners(n_shards=4, n_jobs=-1))
+    assert not spreads_shards(_learners(n_shards=4, n_jobs=0))
+    assert not spreads_shards(_learners(n_shards=1, n_jobs=-1))
+    assert not spreads_shards(pair(keyed('perc', object()),
+                                   keyed('label', object())))
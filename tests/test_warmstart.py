@@ -0,0 +1,71 @@
+"""
+Only estimators that carry on from their fitted weights should be
+warm-started
+"""
+
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('six')
+
+from irit_rst_dt.warmstart import (estimator, warm_spec)  # noqa: E402
+
+
+class Estimator(object):
+    "stands in for a scikit-learn estimator"
+    def __init__(self, **params):
+        self.warm_start = False
+        self._params = params
+
+    def get_params(self, deep=True):
+        "as scikit-learn does"
+        return dict(self._params, warm_start=self.warm_start)
+
+
+class Perceptron(Estimator):
+    "eg. `sklearn.linear_model.Perceptron`"
+    pass
+
+
+class LogisticRegression(Estimator):
+    "eg. `sklearn.linear_model.LogisticRegression`"
+    pass
+
+
+class RandomForestClassifier(Estimator):
+    "eg. `sklearn.ensemble.RandomForestClassifier`"
+    pass
+
+
+class Wrapper(object):
+    "eg. `attelo.learning.local.SklearnAttachClassifier`"
+    def __init__(self, learner):
+        self._learner = learner
+
+
+def test_linear_estimators():
+    "estimators picking up from their coefficients, wrapped or not"
+    est = Perceptron(n_iter=5)
+    assert estimator(est) is est
+    assert estimator(Wrapper(est)) is est
+    est = LogisticRegression(C=1.0, solver='lbfgs')
+    assert estimator(Wrapper(est)) is est
+
+
+def test_cold_estimators():
+    "estimators that merely have a warm_start parameter"
+    assert estimator(LogisticRegression(C=1.0, solver='liblinear')) is None
+    assert estimator(Wrapper(RandomForestClassifier())) is None
+
+
+def test_regularisation_paths():
+    """only the estimators converging to the same optimum are
+    warm-started along their regularisation"""
+    strong = warm_spec(Perceptron(n_iter=5, C=0.1), 'attach')
+    weak = warm_spec(Perceptron(n_iter=5, C=1.0), 'attach')
+    assert strong.params == {'n_iter': 5}
+    assert strong.family != weak.family
+    strong = warm_spec(LogisticRegression(C=0.1, solver='lbfgs'), 'attach')
+    weak = warm_spec(LogisticRegression(C=1.0, solver='lbfgs'), 'attach')
+    assert strong.params == {'C': 0.1}
+    assert strong.family == weak.family